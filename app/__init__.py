@@ -16,9 +16,8 @@ from app.utils.responses import error_response
 db = SQLAlchemy()
 jwt = JWTManager()
 
-limiter = Limiter(
-    key_func=get_remote_address, default_limits=[], storage_uri="memory://"
-)
+# Storage and strategy come from app config; see utils.rate_limit.configure_limiter.
+limiter = Limiter(key_func=get_remote_address, default_limits=[])
 
 
 def register_limiter_handlers(app: Flask):
@@ -81,12 +80,52 @@ def create_app():
     app.config["JWT_COOKIE_CSRF_PROTECT"] = False
     app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(minutes=15)
     app.config["JWT_REFRESH_TOKEN_EXPIRES"] = timedelta(days=7)
+    app.config["DEVICE_GATEWAY_KEY"] = os.environ.get("DEVICE_GATEWAY_KEY")
+    app.config["GUARDIAN_AUTH_MODE"] = os.environ.get("GUARDIAN_AUTH_MODE", "database")
+    app.config["QUERY_METRICS_ENABLED"] = (
+        os.environ.get("QUERY_METRICS", "1" if MODE else "0") == "1"
+    )
+    app.config["METRICS_ENABLED"] = os.environ.get("METRICS_ENABLED", "1") == "1"
+    app.config["METRICS_TOKEN"] = os.environ.get("METRICS_TOKEN")
+    # Without a token, /metrics and /api/_metrics are only open in development.
+    app.config["METRICS_REQUIRE_TOKEN"] = not MODE
+    app.config["MAIL_DISPATCH_MODE"] = os.environ.get("MAIL_DISPATCH_MODE", "async")
+    app.config["AUDIT_LOG_MODE"] = os.environ.get("AUDIT_LOG_MODE", "async")
+    app.config["AUDIT_FALLBACK_PATH"] = os.environ.get("AUDIT_FALLBACK_PATH")
+    app.config["VAPID_PRIVATE_KEY"] = os.environ.get("VAPID_PRIVATE_KEY")
+    app.config["VAPID_SUBJECT"] = os.environ.get("VAPID_SUBJECT")
+
+    from app.utils.rate_limit import configure_limiter
+
+    configure_limiter(app)
 
     db.init_app(app)
     jwt.init_app(app)
     limiter.init_app(app)
     register_limiter_handlers(app)
 
+    from app.utils.activity_rollup import init_activity_rollup
+    from app.utils.emergency import init_emergency_alerts
+    from app.utils.history_logger import init_audit_log
+    from app.utils.login_lockout import init_login_audit
+    from app.utils.mail_dispatcher import init_mail_dispatcher
+    from app.utils.metrics import init_metrics
+    from app.utils.otp_store import init_otp_reaper
+    from app.utils.query_metrics import init_query_metrics
+    from app.utils.reminder_scheduler import init_reminder_scheduler
+    from app.utils.web_push import init_web_push
+
+    init_metrics(app, db)
+    init_query_metrics(app)
+    init_mail_dispatcher(app)
+    init_login_audit(app)
+    init_audit_log(app)
+    init_otp_reaper(app)
+    init_web_push(app)
+    init_emergency_alerts(app)
+    init_reminder_scheduler(app)
+    init_activity_rollup(app)
+
     @app.before_request
     def handle_options():
         if request.method == "OPTIONS":
@@ -1,14 +1,19 @@
 from app import db
 from datetime import datetime, timezone
-import bcrypt
+from app.utils.password_hashing import hash_password, is_bcrypt_hash, verify_password
 
 
 class OTP(db.Model):
     __tablename__ = "otp_tbl"
-    __table_args__ = {"schema": "smart_cane_db"}
+    __table_args__ = (
+        db.Index("idx_otp_email_purpose_used", "email", "purpose", "is_used"),
+        db.Index("idx_otp_expires_at", "expires_at"),
+        {"schema": "smart_cane_db"},
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    email = db.Column(db.String(255), nullable=False, index=True)
+    email = db.Column(db.String(255), nullable=False)
+    # HMAC-SHA256 hex digest of the code, see utils.otp_store.hash_otp
     otp_code = db.Column(db.String(255), nullable=False)
     is_used = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.TIMESTAMP, default=lambda: datetime.now(timezone.utc))
@@ -62,11 +67,8 @@ class Admin(db.Model):
     )
 
     def check_password(self, plain_password: str) -> bool:
-       if self.password.startswith(("$2b$", "$2a$")):
-           return bcrypt.checkpw(
-               plain_password.encode("utf-8"),
-               self.password.encode("utf-8"),
-           )
+       if is_bcrypt_hash(self.password):
+           return verify_password(plain_password, self.password)
        # fallback for any legacy plain-text rows (remove once all are migrated)
        return self.password == plain_password
 
@@ -214,12 +216,10 @@ class Guardian(db.Model):
     )
 
     def set_password(self, password):
-        self.password = bcrypt.hashpw(
-            password.encode("utf-8"), bcrypt.gensalt()
-        ).decode("utf-8")
+        self.password = hash_password(password)
 
     def check_password(self, password):
-        return bcrypt.checkpw(password.encode("utf-8"), self.password.encode("utf-8"))
+        return verify_password(password, self.password)
 
 
 class Device(db.Model):
@@ -279,20 +279,38 @@ class DeviceGuardian(db.Model):
     )
 
 
-# class GPSLocation(db.Model):
-#     __tablename__ = "gps_location_tbl"
-#     __table_args__ = {"schema": "smart_cane_db"}
+class GPSLocation(db.Model):
+    """
+    Append-only track history. Rows are only ever inserted in batches by the
+    ingestion path and read back by (device_id, timestamp) range, which is
+    served by idx_gps_device_timestamp.
+    """
+
+    __tablename__ = "gps_location_tbl"
+
+    location_id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    device_id = db.Column(
+        db.Integer,
+        db.ForeignKey("smart_cane_db.device_tbl.device_id"),
+        nullable=False,
+    )
+    vip_id = db.Column(
+        db.Integer, db.ForeignKey("smart_cane_db.vip_tbl.vip_id"), nullable=True
+    )
+    latitude = db.Column(db.Numeric(10, 8), nullable=False)
+    longitude = db.Column(db.Numeric(11, 8), nullable=False)
+    sats = db.Column(db.Integer, nullable=True)
+    hdop = db.Column(db.Numeric(6, 2), nullable=True)
+    location = db.Column(db.Text, nullable=True)
+    timestamp = db.Column(db.DateTime, nullable=False)
 
-#     location_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-#     vip_id = db.Column(
-#         db.Integer, db.ForeignKey("smart_cane_db.vip_tbl.vip_id"), nullable=False
-#     )
-#     latitude = db.Column(db.Numeric(10, 8), nullable=False)
-#     longitude = db.Column(db.Numeric(11, 8), nullable=False)
-#     location = db.Column(db.Text, nullable=False)
-#     timestamp = db.Column(db.TIMESTAMP, default=lambda: datetime.now(timezone.utc))
+    __table_args__ = (
+        db.Index("idx_gps_device_timestamp", "device_id", "timestamp", "location_id"),
+        {"schema": "smart_cane_db"},
+    )
 
-#     alerts = db.relationship("EmergencyAlert", backref="location", lazy=True)
+    def __repr__(self):
+        return f"<GPSLocation {self.device_id} @ {self.timestamp}>"
 
 
 class DeviceLastLocation(db.Model):
@@ -390,7 +408,10 @@ class DeviceRoute(db.Model):
 
 class NoteReminder(db.Model):
     __tablename__ = "note_reminder_tbl"
-    __table_args__ = {"schema": "smart_cane_db"}
+    __table_args__ = (
+        db.Index("idx_note_reminder_updated_at", "updated_at"),
+        {"schema": "smart_cane_db"},
+    )
 
     note_reminder_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     guardian_id = db.Column(
@@ -412,21 +433,69 @@ class NoteReminder(db.Model):
     )
 
 
-# class EmergencyAlert(db.Model):
-#     __tablename__ = "emergency_alert_tbl"
-#     __table_args__ = {"schema": "smart_cane_db"}
+class EmergencyAlert(db.Model):
+    """
+    One row per emergency or fall incident, written together with the
+    device_logs_tbl entry of its first report. Repeats inside the dedupe
+    window only raise trigger_count and last_triggered_at. The location is
+    copied from the report because a cane without a GPS fix must still
+    raise an alert. status moves triggered -> notified -> acknowledged.
+    """
 
-#     alert_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-#     vip_id = db.Column(
-#         db.Integer, db.ForeignKey("smart_cane_db.vip_tbl.vip_id"), nullable=False
-#     )
-#     location_id = db.Column(
-#         db.Integer,
-#         db.ForeignKey("smart_cane_db.gps_location_tbl.location_id"),
-#         nullable=False,
-#     )
-#     triggered_at = db.Column(db.TIMESTAMP, default=lambda: datetime.now(timezone.utc))
-#     acknowledged = db.Column(db.Boolean, default=False)
+    __tablename__ = "emergency_alert_tbl"
+    __table_args__ = (
+        db.Index("idx_alert_device_triggered", "device_id", "triggered_at", "alert_id"),
+        {"schema": "smart_cane_db"},
+    )
+
+    alert_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    device_id = db.Column(
+        db.Integer,
+        db.ForeignKey("smart_cane_db.device_tbl.device_id"),
+        nullable=False,
+    )
+    vip_id = db.Column(
+        db.Integer, db.ForeignKey("smart_cane_db.vip_tbl.vip_id"), nullable=True
+    )
+    log_id = db.Column(
+        db.Integer,
+        db.ForeignKey("smart_cane_db.device_logs_tbl.log_id"),
+        nullable=True,
+    )
+    alert_type = db.Column(db.String(30), nullable=False)
+    message = db.Column(db.Text, nullable=True)
+    lat = db.Column(db.Numeric(10, 7), nullable=True)
+    lng = db.Column(db.Numeric(10, 7), nullable=True)
+    location_label = db.Column(db.String(255), nullable=True)
+    triggered_at = db.Column(db.DateTime, nullable=False)
+    status = db.Column(
+        db.Enum(
+            "triggered",
+            "notified",
+            "acknowledged",
+            name="emergency_alert_status",
+            schema="smart_cane_db",
+        ),
+        default="triggered",
+        nullable=False,
+    )
+    trigger_count = db.Column(db.Integer, default=1, nullable=False)
+    last_triggered_at = db.Column(db.DateTime, nullable=True)
+    notified_at = db.Column(db.DateTime, nullable=True)
+    acknowledged_at = db.Column(db.DateTime, nullable=True)
+    acknowledged_by_guardian_id = db.Column(
+        db.Integer,
+        db.ForeignKey("smart_cane_db.guardian_tbl.guardian_id", ondelete="SET NULL"),
+        nullable=True,
+    )
+    created_at = db.Column(
+        db.TIMESTAMP, default=lambda: datetime.now(timezone.utc), nullable=False
+    )
+
+    log = db.relationship("DeviceLog")
+
+    def __repr__(self):
+        return f"<EmergencyAlert {self.device_id} - {self.alert_type}>"
 
 
 class DeviceConfig(db.Model):
@@ -453,7 +522,17 @@ class DeviceConfig(db.Model):
 
 class AccountHistory(db.Model):
     __tablename__ = "account_history_tbl"
-    __table_args__ = {"schema": "smart_cane_db"}
+    __table_args__ = (
+        db.Index("idx_history_device_created", "device_id", "created_at", "history_id"),
+        db.Index(
+            "idx_history_guardian_device_created",
+            "guardian_id",
+            "device_id",
+            "created_at",
+            "history_id",
+        ),
+        {"schema": "smart_cane_db"},
+    )
 
     history_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     guardian_id = db.Column(
@@ -476,7 +555,11 @@ class AccountHistory(db.Model):
 
 class DeviceLog(db.Model):
     __tablename__ = "device_logs_tbl"
-    __table_args__ = {"schema": "smart_cane_db"}
+    __table_args__ = (
+        db.Index("idx_device_logs_device_created", "device_id", "created_at", "log_id"),
+        db.Index("idx_device_logs_created", "created_at", "log_id"),
+        {"schema": "smart_cane_db"},
+    )
 
     log_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
 
@@ -484,7 +567,6 @@ class DeviceLog(db.Model):
         db.Integer,
         db.ForeignKey("smart_cane_db.device_tbl.device_id"),
         nullable=False,
-        index=True,
     )
 
     guardian_id = db.Column(
@@ -505,13 +587,54 @@ class DeviceLog(db.Model):
         db.TIMESTAMP,
         default=lambda: datetime.now(timezone.utc),
         nullable=False,
-        index=True,
     )
 
     def __repr__(self):
         return f"<DeviceLog {self.device_id} - {self.activity_type}>"
 
 
+class DeviceActivityRollup(db.Model):
+    """
+    Per-device daily log counts by activity_type, kept current by the
+    activity rollup job. `day` is a local date in STATS_TIMEZONE.
+    """
+
+    __tablename__ = "device_activity_rollup_tbl"
+    __table_args__ = {"schema": "smart_cane_db"}
+
+    device_id = db.Column(
+        db.Integer,
+        db.ForeignKey("smart_cane_db.device_tbl.device_id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    day = db.Column(db.Date, primary_key=True)
+    activity_type = db.Column(db.String(50), primary_key=True)
+    count = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f"<DeviceActivityRollup {self.device_id} {self.day} {self.activity_type}>"
+
+
+class RollupState(db.Model):
+    """
+    High-water mark of a rollup job: the (created_at, log_id) of the last
+    source row it has counted. Jobs lock their row FOR UPDATE while they run.
+    """
+
+    __tablename__ = "rollup_state_tbl"
+    __table_args__ = {"schema": "smart_cane_db"}
+
+    name = db.Column(db.String(50), primary_key=True)
+    high_water_at = db.Column(db.DateTime, nullable=True)
+    high_water_log_id = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(
+        db.TIMESTAMP,
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+
+
 class PushSubscription(db.Model):
     __tablename__ = "push_subscription_tbl"
     __table_args__ = {"schema": "smart_cane_db"}
@@ -615,4 +738,55 @@ class GuardianConcern(db.Model):
         }
  
     def __repr__(self):
-        return f"<GuardianConcern {self.concern_id} [{self.status}] from {self.email}>"
\ No newline at end of file
+        return f"<GuardianConcern {self.concern_id} [{self.status}] from {self.email}>"
+
+class EmailOutbox(db.Model):
+    """
+    Durable queue of outbound mail. Rows are written by the send_* helpers
+    and delivered by the background mail dispatcher, which retries failed
+    sends with backoff until MAIL_MAX_ATTEMPTS is reached. Bodies are
+    cleared once a row is sent or failed, and finished rows are deleted
+    after EMAIL_OUTBOX_RETENTION_DAYS.
+    """
+
+    __tablename__ = "email_outbox_tbl"
+    __table_args__ = (
+        db.Index("idx_email_outbox_status_next", "status", "next_attempt_at"),
+        {"schema": "smart_cane_db"},
+    )
+
+    email_id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    recipient = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    html_body = db.Column(db.Text, nullable=True)
+    text_body = db.Column(db.Text, nullable=True)
+    template = db.Column(db.String(50), nullable=False)
+
+    status = db.Column(
+        db.Enum(
+            "pending",
+            "sending",
+            "sent",
+            "failed",
+            name="email_outbox_status",
+            schema="smart_cane_db",
+        ),
+        nullable=False,
+        default="pending",
+    )
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+
+    next_attempt_at = db.Column(
+        db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc)
+    )
+    locked_at = db.Column(db.DateTime, nullable=True)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(
+        db.TIMESTAMP,
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+    )
+
+    def __repr__(self):
+        return f"<EmailOutbox {self.email_id} [{self.status}] to {self.recipient}>"
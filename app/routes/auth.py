@@ -1,7 +1,5 @@
-from datetime import datetime, timedelta, timezone
-import random
-import string
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
+from datetime import datetime, timezone
 
 from itsdangerous import BadSignature, SignatureExpired
 from app.routes import device
@@ -14,27 +12,38 @@ from flask_jwt_extended import (
     get_jwt_identity,
     jwt_required,
 )
-from sqlalchemy import or_
 from app import db
 from app.models import (
     Device,
     DeviceGuardian,
     Guardian,
-    OTP,
     GuardianInvitation,
-    LoginAttempt,
 )
 from app.utils.history_logger import log_action
 from app.utils.history_logger import log_action
 from app.utils.responses import success_response, error_response
 from app.utils.email_service import send_otp_email
+from app.utils.password_hashing import hashing_capacity_required, needs_rehash
+from app.utils.otp_store import (
+    OTP_EXPIRED,
+    OTP_MISSING,
+    OTP_VALID,
+    check_otp_rate_limit,
+    issue_otp,
+    verify_otp_code,
+)
+from app.utils.login_lockout import (
+    clear_login_failures,
+    get_login_block_info,
+    record_login_failure,
+)
 from app import limiter
 from flask_jwt_extended import decode_token
 from flask_jwt_extended import set_access_cookies, set_refresh_cookies
 from flask_jwt_extended import get_jwt
 from app.utils.password_email_service import send_password_reset_email
 from app.utils.serializer import model_to_dict
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 from app.utils.password_email_service import send_password_reset_email
 from app.utils.serializer import model_to_dict
 
@@ -68,33 +77,6 @@ def _is_new_user(guardian):
     return age.days < NEW_USER_THRESHOLD_DAYS
 
 
-# correct
-def generate_otp(length=6):
-    """Generate a random numeric OTP"""
-    return "".join(random.choices(string.digits, k=length))
-
-
-def check_otp_rate_limit(email, purpose="general"):
-    """
-    Check if user has exceeded OTP request limits
-    """
-    # Count OTP requests in the last hour
-    one_hour_ago = datetime.now(timezone.utc) - timedelta(hours=1)
-    recent_otps = OTP.query.filter(
-        OTP.email == email, OTP.purpose == purpose, OTP.created_at >= one_hour_ago
-    ).count()
-
-    recent_unused_otps = OTP.query.filter(
-        OTP.email == email,
-        OTP.purpose == purpose,
-        OTP.created_at >= one_hour_ago,
-        OTP.is_used.is_(False),
-    ).count()
-
-    # Limit to 3 OTP requests per hour
-    return recent_unused_otps < 4
-
-
 @auth_bp.route("/send-otp", methods=["POST"])
 def send_otp():
     try:
@@ -109,20 +91,8 @@ def send_otp():
         if not check_otp_rate_limit(email, purpose):
             return error_response("Too many OTP requests. Please try again later.", 429)
 
-        # Generate OTP
-        otp_code = generate_otp()
-        expiration_time = datetime.now(timezone.utc) + timedelta(minutes=10)
-
-        # Store OTP in database
-        otp_record = OTP(
-            email=email,
-            otp_code=otp_code,
-            expires_at=expiration_time,
-            is_used=False,
-            purpose=purpose,
-        )
-
-        db.session.add(otp_record)
+        # Generate and store OTP (hashed)
+        otp_code = issue_otp(email, purpose, ttl_minutes=10)
         db.session.commit()
 
         # Send OTP via email
@@ -149,31 +119,20 @@ def verify_otp():
         if not email or not otp_code:
             return error_response("Email and OTP code are required", 400)
 
-        # Find the most recent valid OTP for this email
-        otp_record = (
-            OTP.query.filter_by(email=email, is_used=False, purpose=purpose)
-            .order_by(OTP.created_at.desc())
-            .first()
-        )
+        # Check the current OTP for this email; marks it used on success
+        otp_status = verify_otp_code(email, purpose, otp_code)
 
-        if not otp_record:
+        if otp_status == OTP_MISSING:
             return error_response(
                 "No OTP found for this email. Please request a new OTP.", 400
             )
 
-        # Check if OTP is expired
-        if datetime.now(timezone.utc) > otp_record.expires_at.replace(
-            tzinfo=timezone.utc
-        ):
+        if otp_status == OTP_EXPIRED:
             return error_response("OTP has expired. Please request a new OTP.", 400)
 
-        # Check if OTP matches
-        if otp_record.otp_code != otp_code:
+        if otp_status != OTP_VALID:
             return error_response("Invalid OTP code. Please try again.", 400)
 
-        # Mark OTP as used
-        otp_record.is_used = True
-        otp_record.used_at = datetime.now(timezone.utc)
         db.session.commit()
 
         return success_response(message="OTP verified successfully", status_code=200)
@@ -183,19 +142,6 @@ def verify_otp():
         return error_response("OTP verification failed", 500, str(e))
 
 
-def is_login_allowed(username=None, ip_address=None, max_attempts=3, window_minutes=15):
-    time_window = datetime.now(timezone.utc) - timedelta(minutes=window_minutes)
-    query = LoginAttempt.query.filter(LoginAttempt.created_at >= time_window)
-
-    if username:
-        query = query.filter_by(username=username)
-    if ip_address:
-        query = query.filter_by(ip_address=ip_address)
-
-    failed_attempts = query.count()
-    return failed_attempts < max_attempts
-
-
 @auth_bp.route("/check-credentials", methods=["POST"])
 @limiter.limit("5 per minute")
 def check_credentials():
@@ -240,6 +186,7 @@ def check_credentials():
 
 
 @auth_bp.route("/register", methods=["POST"])
+@hashing_capacity_required
 def register():
     try:
         data = request.get_json() or {}
@@ -382,60 +329,8 @@ def register():
         return error_response("Registration failed", 500, str(e))
 
 
-def get_login_block_info(username, ip_address, window_minutes=30, free_attempts=3):
-    LOCKOUTS = [60, 180, 600, 1800]
-    now = datetime.now(timezone.utc)
-    window_start = now - timedelta(minutes=window_minutes)
-
-    # Get recent attempts for username or IP within window
-    recent_attempts = (
-        LoginAttempt.query.filter(
-            or_(
-                LoginAttempt.username == username, LoginAttempt.ip_address == ip_address
-            ),
-            LoginAttempt.created_at >= window_start,
-        )
-        .order_by(LoginAttempt.created_at.asc())
-        .all()
-    )
-
-    attempts_count = len(recent_attempts)
-
-    if attempts_count <= free_attempts:
-        remaining_attempts = max(0, free_attempts - attempts_count)
-        return {
-            "allowed": True,
-            "remaining_attempts": remaining_attempts,
-            "retry_after": 0,
-        }
-
-    lockout_index = min(attempts_count - free_attempts - 1, len(LOCKOUTS) - 1)
-    lockout_seconds = LOCKOUTS[lockout_index]
-
-    last_attempt_time = recent_attempts[-1].created_at
-    if last_attempt_time.tzinfo is None:
-        last_attempt_time = last_attempt_time.replace(tzinfo=timezone.utc)
-
-    retry_after = max(
-        0,
-        int(
-            (
-                last_attempt_time + timedelta(seconds=lockout_seconds) - now
-            ).total_seconds()
-        ),
-    )
-
-    allowed = retry_after == 0
-    remaining_attempts = 0
-
-    return {
-        "allowed": allowed,
-        "remaining_attempts": remaining_attempts,
-        "retry_after": retry_after,
-    }
-
-
 @auth_bp.route("/login", methods=["POST"])
+@hashing_capacity_required
 def login():
     try:
         data = request.get_json() or {}
@@ -463,9 +358,7 @@ def login():
         credentials_valid = guardian is not None and guardian.check_password(password)
 
         if not credentials_valid:
-            attempt = LoginAttempt(username=lockout_username, ip_address=ip_addr)
-            db.session.add(attempt)
-            db.session.commit()
+            record_login_failure(lockout_username, ip_addr)
 
             # Progressive lockout after recording the failed attempt
             block_info = get_login_block_info(
@@ -483,13 +376,11 @@ def login():
             )
 
         # Clear failed attempts on success
-        LoginAttempt.query.filter(
-            or_(
-                LoginAttempt.username == guardian.username,
-                LoginAttempt.ip_address == ip_addr,
-            )
-        ).delete()
-        db.session.commit()
+        clear_login_failures(guardian.username, ip_addr)
+
+        # Upgrade hashes made with an older BCRYPT_ROUNDS; committed below
+        if needs_rehash(guardian.password):
+            guardian.set_password(password)
 
         guardian_device = DeviceGuardian.query.filter_by(
             guardian_id=guardian.guardian_id
@@ -697,18 +588,7 @@ def request_email_change(guardian):
     if not check_otp_rate_limit(new_email, "email_change"):
         return error_response("Too many OTP requests. Please try again later.", 429)
 
-    otp_code = generate_otp()
-    expiration_time = datetime.now(timezone.utc) + timedelta(minutes=10)
-
-    otp_record = OTP(
-        email=new_email,
-        otp_code=otp_code,
-        expires_at=expiration_time,
-        is_used=False,
-        purpose="email_change",
-    )
-
-    db.session.add(otp_record)
+    otp_code = issue_otp(new_email, "email_change", ttl_minutes=10)
     db.session.commit()
 
     email_sent = send_otp_email(recipient_email=new_email, otp_code=otp_code)
@@ -728,16 +608,14 @@ def verify_email_change(guardian):
     if not new_email or not otp_code:
         return error_response("New email and OTP code are required", 400)
 
-    otp_record = OTP.query.filter_by(
-        email=new_email, otp_code=otp_code, is_used=False, purpose="email_change"
-    ).first()
-
-    if not otp_record:
-        return error_response("Invalid OTP for email change", 400)
+    otp_status = verify_otp_code(new_email, "email_change", otp_code)
 
-    if datetime.now(timezone.utc) > otp_record.expires_at.replace(tzinfo=timezone.utc):
+    if otp_status == OTP_EXPIRED:
         return error_response("OTP has expired. Please request a new OTP.", 400)
 
+    if otp_status != OTP_VALID:
+        return error_response("Invalid OTP for email change", 400)
+
     existing_email = Guardian.query.filter_by(email=new_email).first()
     if existing_email and existing_email.guardian_id != guardian.guardian_id:
         return error_response("Email already exists. Please use another email", 400)
@@ -745,9 +623,6 @@ def verify_email_change(guardian):
     old_email = guardian.email
     guardian.email = new_email
 
-    otp_record.is_used = True
-    otp_record.used_at = datetime.now(timezone.utc)
-
     db.session.commit()
 
     return success_response(
@@ -774,18 +649,8 @@ def forgot_password_request():
         if not user:
             return error_response("Email not found", 404)
 
-        otp_code = str(random.randint(100000, 999999))
-        expires_at = datetime.now(timezone.utc) + timedelta(minutes=5)
-
-        # Save OTP to database
-        otp = OTP(
-            email=email,
-            otp_code=otp_code,
-            expires_at=expires_at,
-            purpose="password_reset",
-        )
-
-        db.session.add(otp)
+        # Save OTP (hashed)
+        otp_code = issue_otp(email, "password_reset", ttl_minutes=5)
         db.session.commit()
 
         send_password_reset_email(email, otp_code, user.first_name)
@@ -807,23 +672,14 @@ def verify_forgot_password_otp():
         if not email or not otp_code:
             return error_response("Email and OTP are required", 400)
 
-        otp = OTP.query.filter_by(
-            email=email, otp_code=otp_code, is_used=False, purpose="password_reset"
-        ).first()
-
-        if not otp:
-            return error_response("Invalid OTP", 400)
-
-        expires_at = otp.expires_at
+        otp_status = verify_otp_code(email, "password_reset", otp_code)
 
-        if expires_at.tzinfo is None:
-            expires_at = expires_at.replace(tzinfo=timezone.utc)
-
-        if datetime.now(timezone.utc) > expires_at:
+        if otp_status == OTP_EXPIRED:
             return error_response("OTP expired", 400)
 
-        otp.is_used = True
-        otp.used_at = datetime.now(timezone.utc)
+        if otp_status != OTP_VALID:
+            return error_response("Invalid OTP", 400)
+
         db.session.commit()
 
         return success_response(message="OTP verified", status_code=200)
@@ -834,6 +690,7 @@ def verify_forgot_password_otp():
 
 
 @auth_bp.route("/forgot-password/reset", methods=["POST"])
+@hashing_capacity_required
 def reset_forgot_password():
     data = request.get_json()
     email = data.get("email")
@@ -854,6 +711,7 @@ def reset_forgot_password():
 
 
 @auth_bp.route("/change-password", methods=["POST"])
+@hashing_capacity_required
 @jwt_required()
 def change_password():
     try:
@@ -1,13 +1,18 @@
 from flask import Blueprint, request, jsonify
 from app import db
 from app.models import GuardianConcern
+from app.utils.rate_limit import get_rate_limit_store
 from datetime import datetime, timezone
 
 contact_bp = Blueprint('contact', __name__)
 
-# Lightweight in-memory throttle to complement frontend cooldown.
-# Keyed by client IP + email, with progressive waiting windows.
-CONTACT_SUBMISSION_STATE = {}
+# Lightweight throttle to complement frontend cooldown, kept in the shared
+# rate-limit store so it holds across workers. Keyed by client IP + email,
+# with progressive waiting windows.
+CONTACT_RATE_PREFIX = 'contact'
+CONTACT_PENALTY_WINDOW_SECONDS = 86400
+# Only the last three submissions decide the wait.
+CONTACT_TRACKED_SUBMISSIONS = 3
 
 
 def _get_client_ip():
@@ -18,14 +23,12 @@ def _get_client_ip():
 
 
 def _check_rate_limit(rate_key, now_ts):
-    state = CONTACT_SUBMISSION_STATE.get(rate_key, {'count': 0, 'last_sent_ts': 0})
-    count = int(state.get('count', 0) or 0)
-    last_sent_ts = float(state.get('last_sent_ts', 0) or 0)
-
-    # Reset progressive penalties after 24 hours of inactivity.
-    if last_sent_ts and (now_ts - last_sent_ts) > 86400:
-        count = 0
-        last_sent_ts = 0
+    # Submissions older than 24 hours no longer count towards the penalty.
+    sent = get_rate_limit_store().recent(
+        f"{CONTACT_RATE_PREFIX}:{rate_key}", CONTACT_PENALTY_WINDOW_SECONDS, now=now_ts
+    )
+    count = len(sent)
+    last_sent_ts = sent[-1] if sent else 0
 
     wait_seconds = 0
     if count == 1:
@@ -43,10 +46,12 @@ def _check_rate_limit(rate_key, now_ts):
 
 
 def _register_successful_submission(rate_key, now_ts):
-    state = CONTACT_SUBMISSION_STATE.get(rate_key, {'count': 0, 'last_sent_ts': 0})
-    state['count'] = int(state.get('count', 0) or 0) + 1
-    state['last_sent_ts'] = now_ts
-    CONTACT_SUBMISSION_STATE[rate_key] = state
+    get_rate_limit_store().hit(
+        f"{CONTACT_RATE_PREFIX}:{rate_key}",
+        CONTACT_PENALTY_WINDOW_SECONDS,
+        now=now_ts,
+        keep=CONTACT_TRACKED_SUBMISSIONS,
+    )
 
 @contact_bp.route('', methods=['POST'])
 def submit_contact():
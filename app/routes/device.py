@@ -1,12 +1,16 @@
 import os
+import csv
+import io
 import secrets
 import json
-from flask import Blueprint, current_app, request
-from datetime import datetime, timedelta, timezone
+import time
+from flask import Blueprint, Response, current_app, request, stream_with_context
+from datetime import date, datetime, timedelta, timezone
 
 from flask_jwt_extended import jwt_required
 from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
-from sqlalchemy import func
+from sqlalchemy import event, func, insert
+from sqlalchemy.orm import object_session
 
 from app import db
 from app.models import (
@@ -17,47 +21,116 @@ from app.models import (
     DeviceLog,
     DeviceLastLocation,
     DeviceRoute,
+    EmergencyAlert,
+    GPSLocation,
 )
 from app.routes import guardian
-from app.utils.auth import guardian_required
-from app.utils.email_service import send_guardian_invite_email
-from app.utils.responses import success_response, error_response
+from app.utils.auth import (
+    device_gateway_required,
+    device_member_required,
+    find_membership_by_serial,
+    get_device_membership,
+    guardian_required,
+    invalidate_device_members,
+    load_device_memberships,
+)
+from app.utils.activity_rollup import STATS_TIMEZONE, device_activity_counts
+from app.utils.cache import create_cache, invalidate_on_commit
+from app.utils.emergency import (
+    ALERT_TRANSITIONS,
+    EMERGENCY_INGEST_SECONDS,
+    EMERGENCY_REPORTS,
+    EMERGENCY_TYPES,
+    alert_event,
+    get_emergency_contacts,
+    parse_emergency_report,
+    record_emergency,
+    transition_alert,
+)
+from app.utils.email_service import (
+    send_guardian_invite_email,
+    send_guardian_invite_emails,
+)
+from app.utils.responses import success_response, error_response, snake_to_camel_dict
 from app.models import VIP
 from app.utils.serializer import model_to_dict
 from app.utils.history_logger import log_action
+from app.utils.keyset import before_key, decode_cursor, encode_cursor, iter_keyset
+from app.utils.query_metrics import query_budget
+from app.utils.location_stream import (
+    DeltaTracker,
+    format_sse,
+    get_broker,
+    location_event,
+)
+from app.utils.track_simplify import simplify_track
+from app.utils.locations import (
+    LOCATION_BATCH_MAX,
+    append_track_points,
+    newest_fix_per_device,
+    parse_location_fix,
+    resolve_devices,
+    to_utc_naive,
+    touch_devices_last_active,
+    upsert_last_locations,
+)
 
 device = Blueprint("device", __name__)
 
 
 INVITE_TOKEN_SALT = "guardian-invite"
 INVITE_TOKEN_MAX_AGE = 60 * 60 * 24
+MAX_BULK_INVITES = 50
 
 ROUTE_CACHE_TTL_SECONDS = 30
-_route_cache = {}
-
-
-def _route_cache_get(device_id):
-    cached = _route_cache.get(device_id)
-    if not cached:
-        return None
-
-    age_seconds = (datetime.now(timezone.utc) - cached["cached_at"]).total_seconds()
-    if age_seconds > ROUTE_CACHE_TTL_SECONDS:
-        _route_cache.pop(device_id, None)
-        return None
-
-    return cached
-
+route_cache = create_cache(
+    "device_route", max_entries=4096, ttl_seconds=ROUTE_CACHE_TTL_SECONDS
+)
 
-def _route_cache_set(device_id, data):
-    _route_cache[device_id] = {"data": data, "cached_at": datetime.now(timezone.utc)}
+TRACK_PAGE_SIZE = 1000
+TRACK_MAX_POINTS = 100000
+TRACK_MAX_RANGE = timedelta(days=7)
+
+LOCATION_STREAM_KEEPALIVE_SECONDS = 15
+LOCATION_STREAM_MAX_SECONDS = 5 * 60
+
+DEVICE_STATS_DEFAULT_DAYS = 30
+DEVICE_STATS_MAX_DAYS = 366
+
+ALERT_PAGE_SIZE = 50
+ALERT_MAX_PAGE_SIZE = 200
+
+DEVICE_LOG_PAGE_SIZE = 50
+DEVICE_LOG_MAX_PAGE_SIZE = 200
+DEVICE_LOG_EXPORT_PAGE_SIZE = 1000
+DEVICE_LOG_EXPORT_MAX_RANGE = timedelta(days=90)
+DEVICE_LOG_EXPORT_FIELDS = [
+    "log_id",
+    "device_id",
+    "device_serial_number",
+    "guardian_id",
+    "activity_type",
+    "status",
+    "message",
+    "metadata_json",
+    "created_at",
+]
+
+TRACK_CACHE_TTL_SECONDS = 60 * 60
+TRACK_CACHE_TODAY_TTL_SECONDS = 30
+track_cache = create_cache(
+    "device_track", max_entries=256, ttl_seconds=TRACK_CACHE_TTL_SECONDS
+)
 
 
-def _route_cache_invalidate(device_id):
-    _route_cache.pop(device_id, None)
+@event.listens_for(DeviceRoute, "after_insert")
+@event.listens_for(DeviceRoute, "after_update")
+@event.listens_for(DeviceRoute, "after_delete")
+def _invalidate_route_cache(mapper, connection, target):
+    invalidate_on_commit(object_session(target), route_cache, target.device_id)
 
 
-def _serialize_route(route: DeviceRoute, device):
+def _serialize_route(route: DeviceRoute, device_serial_number):
     if not route:
         return None
 
@@ -78,7 +151,7 @@ def _serialize_route(route: DeviceRoute, device):
     return {
         "routeId": route.route_id,
         "deviceId": route.device_id,
-        "deviceSerialNumber": device.device_serial_number if device else None,
+        "deviceSerialNumber": device_serial_number,
         "guardianId": route.guardian_id,
         "destination": {
             "lat": _decimal_to_float(route.destination_lat),
@@ -97,6 +170,175 @@ def _serialize_route(route: DeviceRoute, device):
     }
 
 
+def _serialize_last_location(last_location):
+    return {
+        "lat": float(last_location.lat) if last_location.lat is not None else None,
+        "lng": float(last_location.lng) if last_location.lng is not None else None,
+        "sats": last_location.sats,
+        "fix_status": last_location.fix_status,
+        "hdop": (float(last_location.hdop) if last_location.hdop is not None else None),
+        "gps_status": last_location.gps_status,
+        "recorded_at": (
+            last_location.recorded_at.isoformat() if last_location.recorded_at else None
+        ),
+        "updated_at": (
+            last_location.updated_at.isoformat() if last_location.updated_at else None
+        ),
+    }
+
+
+def _parse_time_range(default_span):
+    """
+    Reads `from` / `to` query args as naive UTC datetimes. `to` defaults to
+    now and `from` to `default_span` before `to`.
+    """
+    to_raw = request.args.get("to")
+    from_raw = request.args.get("from")
+
+    end = to_utc_naive(to_raw, "to") if to_raw else to_utc_naive(None)
+    start = to_utc_naive(from_raw, "from") if from_raw else end - default_span
+
+    if start >= end:
+        raise ValueError("`from` must be earlier than `to`")
+
+    return start, end
+
+
+def _device_log_filters(device_id):
+    """
+    Filters shared by the paged and export forms of the device log:
+    `activity_type` and `status`, each comma separated.
+    """
+    filters = [DeviceLog.device_id == device_id]
+
+    for arg, column in (
+        ("activity_type", DeviceLog.activity_type),
+        ("status", DeviceLog.status),
+    ):
+        values = [v.strip() for v in request.args.get(arg, "").split(",") if v.strip()]
+        if values:
+            filters.append(column.in_(values))
+
+    return filters
+
+
+def _serialize_device_log(log, device_serial_number):
+    return {
+        "log_id": log.log_id,
+        "device_id": log.device_id,
+        "device_serial_number": device_serial_number,
+        "guardian_id": log.guardian_id,
+        "activity_type": log.activity_type,
+        "status": log.status,
+        "message": log.message,
+        "metadata_json": log.metadata_json,
+        "created_at": log.created_at.isoformat() if log.created_at else None,
+    }
+
+
+def _serialize_alert(alert):
+    def _iso(value):
+        return value.isoformat() if value else None
+
+    return {
+        "alert_id": alert.alert_id,
+        "device_id": alert.device_id,
+        "vip_id": alert.vip_id,
+        "log_id": alert.log_id,
+        "alert_type": alert.alert_type,
+        "message": alert.message,
+        "lat": float(alert.lat) if alert.lat is not None else None,
+        "lng": float(alert.lng) if alert.lng is not None else None,
+        "location_label": alert.location_label,
+        "status": alert.status,
+        "trigger_count": alert.trigger_count,
+        "triggered_at": _iso(alert.triggered_at),
+        "last_triggered_at": _iso(alert.last_triggered_at),
+        "notified_at": _iso(alert.notified_at),
+        "acknowledged_at": _iso(alert.acknowledged_at),
+        "acknowledged_by_guardian_id": alert.acknowledged_by_guardian_id,
+    }
+
+
+def _export_device_logs(membership, filters, export_format):
+    """
+    Streams every matching log oldest-first as NDJSON or CSV, one keyset
+    page at a time, so long ranges never sit in memory. The range defaults
+    to the last 7 days and may span up to 90.
+    """
+    start, end = _parse_time_range(timedelta(days=7))
+    if end - start > DEVICE_LOG_EXPORT_MAX_RANGE:
+        raise ValueError("Export range cannot exceed 90 days")
+
+    query = db.session.query(
+        DeviceLog.log_id,
+        DeviceLog.device_id,
+        DeviceLog.guardian_id,
+        DeviceLog.activity_type,
+        DeviceLog.status,
+        DeviceLog.message,
+        DeviceLog.metadata_json,
+        DeviceLog.created_at,
+    ).filter(
+        *filters,
+        DeviceLog.created_at >= start,
+        DeviceLog.created_at < end,
+    )
+
+    logs = iter_keyset(
+        query,
+        DeviceLog.created_at,
+        DeviceLog.log_id,
+        page_size=DEVICE_LOG_EXPORT_PAGE_SIZE,
+    )
+    serial = membership["device_serial_number"]
+
+    if export_format == "ndjson":
+
+        def generate():
+            for log in logs:
+                row = snake_to_camel_dict(_serialize_device_log(log, serial))
+                yield json.dumps(row) + "\n"
+
+        mimetype = "application/x-ndjson"
+    else:
+
+        def generate():
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(DEVICE_LOG_EXPORT_FIELDS)
+            for log in logs:
+                row = _serialize_device_log(log, serial)
+                if row["metadata_json"] is not None:
+                    row["metadata_json"] = json.dumps(row["metadata_json"])
+                writer.writerow([row[field] for field in DEVICE_LOG_EXPORT_FIELDS])
+                if buffer.tell() >= 64 * 1024:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+            yield buffer.getvalue()
+
+        mimetype = "text/csv"
+
+    filename = f"device-logs-{serial}-{start:%Y%m%d}-{end:%Y%m%d}.{export_format}"
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+def _serialize_track_point(point):
+    return {
+        "locationId": point.location_id,
+        "lat": float(point.latitude),
+        "lng": float(point.longitude),
+        "sats": point.sats,
+        "hdop": float(point.hdop) if point.hdop is not None else None,
+        "timestamp": point.timestamp.isoformat(),
+    }
+
+
 def generate_guardian_invite_token(payload: dict) -> str:
     serializer = URLSafeTimedSerializer(current_app.config["SECRET_KEY"])
     return serializer.dumps(payload, salt=INVITE_TOKEN_SALT)
@@ -299,6 +541,7 @@ def unpair_device(guardian, device_id):
         ).count()
 
         if primary_guardians_left == 0:
+            invalidate_device_members(device_id)
             DeviceGuardian.query.filter_by(device_id=device_id).delete()
             device.is_paired = False
             device.paired_at = None
@@ -335,35 +578,96 @@ def unpair_device(guardian, device_id):
 
 
 @device.route("/list", methods=["GET"])
+@query_budget(3)
 @guardian_required
 def get_devices(guardian):
     try:
         guardian_id = guardian.guardian_id
 
-        device_guardians = DeviceGuardian.query.filter_by(guardian_id=guardian_id).all()
+        include = {
+            part.strip()
+            for part in request.args.get("include", "").split(",")
+            if part.strip()
+        }
+        unknown = include - {"last_location", "pending_invites"}
+        if unknown:
+            return error_response(
+                f"Unsupported include: {', '.join(sorted(unknown))}", 400
+            )
+
+        # One round trip: the VIP always rides along, the last location and
+        # pending invite counts only when the dashboard asks for them.
+        columns = [DeviceGuardian, Device, VIP]
+        query = (
+            db.session.query(DeviceGuardian)
+            .join(Device, Device.device_id == DeviceGuardian.device_id)
+            .outerjoin(VIP, VIP.vip_id == Device.vip_id)
+        )
+
+        if "last_location" in include:
+            columns.append(DeviceLastLocation)
+            query = query.outerjoin(
+                DeviceLastLocation,
+                DeviceLastLocation.device_id == Device.device_id,
+            )
+
+        if "pending_invites" in include:
+            pending = (
+                db.session.query(
+                    GuardianInvitation.device_id.label("device_id"),
+                    func.count(GuardianInvitation.id).label("pending_count"),
+                )
+                .filter(
+                    GuardianInvitation.status == "pending",
+                    GuardianInvitation.device_id.in_(
+                        db.session.query(DeviceGuardian.device_id).filter(
+                            DeviceGuardian.guardian_id == guardian_id
+                        )
+                    ),
+                )
+                .group_by(GuardianInvitation.device_id)
+                .subquery()
+            )
+            columns.append(func.coalesce(pending.c.pending_count, 0))
+            query = query.outerjoin(pending, pending.c.device_id == Device.device_id)
+
+        rows = (
+            query.with_entities(*columns)
+            .filter(DeviceGuardian.guardian_id == guardian_id)
+            .order_by(DeviceGuardian.device_id)
+            .all()
+        )
+
         devices = []
-        for dg in device_guardians:
-            device = Device.query.get(dg.device_id)
-            if device:
-                vip = VIP.query.get(device.vip_id)
-                devices.append(
-                    {
-                        "device_id": device.device_id,
-                        "device_name": dg.device_name,
-                        "device_serial_number": device.device_serial_number,
-                        "last_active_at": (
-                            device.last_active_at.isoformat()
-                            if device.last_active_at
-                            else None
-                        ),
-                        "relationship": dg.relationship,
-                        "is_emergency_contact": dg.is_emergency_contact,
-                        "vip": (model_to_dict(vip) if vip else None),
-                        "paired_at": (
-                            device.paired_at.isoformat() if device.paired_at else None
-                        ),
-                    }
+        for row in rows:
+            dg, device, vip = row[0], row[1], row[2]
+            entry = {
+                "device_id": device.device_id,
+                "device_name": dg.device_name,
+                "device_serial_number": device.device_serial_number,
+                "last_active_at": (
+                    device.last_active_at.isoformat()
+                    if device.last_active_at
+                    else None
+                ),
+                "relationship": dg.relationship,
+                "is_emergency_contact": dg.is_emergency_contact,
+                "vip": (model_to_dict(vip) if vip else None),
+                "paired_at": (
+                    device.paired_at.isoformat() if device.paired_at else None
+                ),
+            }
+
+            extra = list(row[3:])
+            if "last_location" in include:
+                last_location = extra.pop(0)
+                entry["last_location"] = (
+                    _serialize_last_location(last_location) if last_location else None
                 )
+            if "pending_invites" in include:
+                entry["pending_invites_count"] = int(extra.pop(0))
+
+            devices.append(entry)
 
         return success_response(
             data={"devices": devices},
@@ -377,25 +681,16 @@ def get_devices(guardian):
 
 @device.route("/vip/<int:device_id>", methods=["POST"])
 @guardian_required
+@device_member_required(
+    roles=("primary", "secondary"),
+    message="Device not paired with this guardian",
+    status_code=404,
+    role_message="Only primary or secondary guardians can add VIP profile",
+)
 def assign_device_to_vip(guardian, device_id):
     try:
         data = request.get_json() or {}
 
-        if not device_id:
-            return error_response("device_id is required", 400)
-
-        device_guardian = DeviceGuardian.query.filter_by(
-            device_id=device_id, guardian_id=guardian.guardian_id
-        ).first()
-
-        if not device_guardian:
-            return error_response("Device not paired with this guardian", 404)
-
-        if device_guardian.role not in ["primary", "secondary"]:
-            return error_response(
-                "Only primary or secondary guardians can add VIP profile", 403
-            )
-
         device = Device.query.get(device_id)
 
         if device.vip_id:
@@ -545,14 +840,12 @@ def invite_guardian_to_device_link(guardian, device_id):
         if not device:
             return error_response("Device not found", 404)
 
-        device_guardian_link = DeviceGuardian.query.filter_by(
-            device_id=device_id, guardian_id=guardian.guardian_id
-        ).first()
+        device_guardian_link = get_device_membership(guardian.guardian_id, device_id)
 
         if not device_guardian_link:
             return error_response("You are not linked to this device", 403)
 
-        if device_guardian_link.role not in ["primary", "secondary"]:
+        if device_guardian_link["role"] not in ["primary", "secondary"]:
             return error_response(
                 "Only primary or secondary guardians can invite new guardians", 403
             )
@@ -632,6 +925,156 @@ def invite_guardian_to_device_link(guardian, device_id):
         return error_response("Failed to send guardian invite", 500, str(e))
 
 
+@device.route("/<int:device_id>/invite-guardians", methods=["POST"])
+@guardian_required
+@device_member_required(
+    roles=("primary", "secondary"),
+    message="You are not linked to this device",
+    role_message="Only primary or secondary guardians can invite new guardians",
+)
+def invite_guardians_to_device_link(guardian, device_id):
+    try:
+        data = request.get_json() or {}
+        emails = data.get("emails")
+
+        if not isinstance(emails, list) or not emails:
+            return error_response("emails must be a non-empty list", 400)
+
+        if len(emails) > MAX_BULK_INVITES:
+            return error_response(
+                f"At most {MAX_BULK_INVITES} guardians can be invited at once", 400
+            )
+
+        # One entry per submitted email, in request order
+        results = []
+        candidates = {}
+        own_email = (guardian.email or "").lower()
+
+        for raw_email in emails:
+            email = raw_email.strip() if isinstance(raw_email, str) else ""
+            result = {"email": email or raw_email, "status": None}
+            results.append(result)
+
+            if "@" not in email:
+                result["status"] = "invalid_email"
+            elif email.lower() == own_email:
+                result["status"] = "self"
+            elif email.lower() in candidates:
+                result["status"] = "duplicate"
+            else:
+                candidates[email.lower()] = result
+
+        if candidates:
+            submitted = [result["email"] for result in candidates.values()]
+
+            guardian_ids = {
+                email.lower(): guardian_id
+                for email, guardian_id in db.session.query(
+                    Guardian.email, Guardian.guardian_id
+                ).filter(Guardian.email.in_(submitted))
+            }
+
+            linked_ids = set()
+            if guardian_ids:
+                linked_ids = {
+                    guardian_id
+                    for (guardian_id,) in db.session.query(
+                        DeviceGuardian.guardian_id
+                    ).filter(
+                        DeviceGuardian.device_id == device_id,
+                        DeviceGuardian.guardian_id.in_(guardian_ids.values()),
+                    )
+                }
+
+            pending_emails = {
+                email.lower()
+                for (email,) in db.session.query(GuardianInvitation.email).filter(
+                    GuardianInvitation.device_id == device_id,
+                    GuardianInvitation.status == "pending",
+                    GuardianInvitation.email.in_(submitted),
+                )
+            }
+
+            for key, result in candidates.items():
+                if guardian_ids.get(key) in linked_ids:
+                    result["status"] = "already_linked"
+                elif key in pending_emails:
+                    result["status"] = "already_pending"
+
+        to_invite = [
+            result for result in candidates.values() if result["status"] is None
+        ]
+
+        if to_invite:
+            expires_at = datetime.now(timezone.utc) + timedelta(hours=24)
+            for result in to_invite:
+                result["token"] = generate_guardian_invite_token(
+                    {
+                        "email": result["email"],
+                        "device_id": device_id,
+                        "invited_by_guardian_id": guardian.guardian_id,
+                    }
+                )
+
+            db.session.execute(
+                insert(GuardianInvitation),
+                [
+                    {
+                        "token": result["token"],
+                        "email": result["email"],
+                        "device_id": device_id,
+                        "invited_by_guardian_id": guardian.guardian_id,
+                        "expires_at": expires_at,
+                    }
+                    for result in to_invite
+                ],
+            )
+
+            inviter_first_name = guardian.first_name
+            for result in to_invite:
+                log_action(
+                    guardian_id=guardian.guardian_id,
+                    action="INVITE",
+                    description=f"{guardian.first_name} {guardian.last_name} invited {result['email']} to monitor a device",
+                    device_id=device_id,
+                )
+
+            db.session.commit()
+
+            vip = (
+                db.session.query(VIP.first_name, VIP.last_name)
+                .join(Device, Device.vip_id == VIP.vip_id)
+                .filter(Device.device_id == device_id)
+                .first()
+            )
+            vip_name = f"{vip.first_name} {vip.last_name}" if vip else None
+
+            FRONTEND_URL = os.environ.get("FRONTEND_URL", "http://localhost:5173")
+            sent = send_guardian_invite_emails(
+                [
+                    (result["email"], f"{FRONTEND_URL}/guardian-invite/{result['token']}")
+                    for result in to_invite
+                ],
+                guardian_name=inviter_first_name,
+                vip_name=vip_name,
+            )
+
+            for result in to_invite:
+                del result["token"]
+                result["status"] = "invited" if sent.get(result["email"]) else "email_failed"
+
+        invited = sum(1 for result in results if result["status"] == "invited")
+
+        return success_response(
+            data={"invited": invited, "results": results},
+            message=f"{invited} of {len(results)} guardian invites sent",
+        )
+
+    except Exception as e:
+        db.session.rollback()
+        return error_response("Failed to send guardian invites", 500, str(e))
+
+
 from flask_jwt_extended import get_jwt_identity
 
 
@@ -783,25 +1226,11 @@ def accept_guardian_invite(token):
 
 @device.route("/<int:device_id>/guardians", methods=["GET"])
 @guardian_required
+@device_member_required(
+    message="You are not authorized to view guardians for this device"
+)
 def get_device_guardians(guardian, device_id):
     try:
-        if not device_id:
-            return error_response("device_id is required", 400)
-
-        device = Device.query.get(device_id)
-        if not device:
-            return error_response("Device not found", 404)
-
-        requester_link = DeviceGuardian.query.filter_by(
-            device_id=device_id,
-            guardian_id=guardian.guardian_id,
-        ).first()
-
-        if not requester_link:
-            return error_response(
-                "You are not authorized to view guardians for this device", 403
-            )
-
         device_guardians = (
             db.session.query(DeviceGuardian, Guardian)
             .join(Guardian, Guardian.guardian_id == DeviceGuardian.guardian_id)
@@ -844,10 +1273,7 @@ def get_device_guardians(guardian, device_id):
 @guardian_required
 def get_all_device_guardians(guardian):
     try:
-        device_links = DeviceGuardian.query.filter_by(
-            guardian_id=guardian.guardian_id
-        ).all()
-        device_ids = [dl.device_id for dl in device_links]
+        device_ids = list(load_device_memberships(guardian.guardian_id))
 
         if not device_ids:
             return success_response(
@@ -920,10 +1346,7 @@ def remove_guardian_from_device(current_guardian, device_id, guardian_id):
                 403,
             )
 
-        requester_link = DeviceGuardian.query.filter_by(
-            device_id=device_id,
-            guardian_id=current_guardian.guardian_id,
-        ).first()
+        requester_link = get_device_membership(current_guardian.guardian_id, device_id)
 
         if not requester_link:
             return error_response(
@@ -931,7 +1354,7 @@ def remove_guardian_from_device(current_guardian, device_id, guardian_id):
                 403,
             )
 
-        if requester_link.role == "guardian":
+        if requester_link["role"] == "guardian":
             return error_response(
                 "Guardians with role 'guardian' cannot remove other guardians", 403
             )
@@ -949,7 +1372,7 @@ def remove_guardian_from_device(current_guardian, device_id, guardian_id):
 
         if target_link.role == "primary":
             return error_response("Primary guardians cannot be removed by anyone", 403)
-        if requester_link.role == "secondary" and target_link.role == "secondary":
+        if requester_link["role"] == "secondary" and target_link.role == "secondary":
             return error_response(
                 "Secondary guardians cannot remove other secondary guardians", 403
             )
@@ -995,15 +1418,13 @@ def modify_device_guardian_role(current_guardian, device_id, guardian_id):
                 "Invalid role. Must be 'secondary', or 'guardian'.", 400
             )
 
-        requester_link = DeviceGuardian.query.filter_by(
-            device_id=device_id, guardian_id=current_guardian.guardian_id
-        ).first()
+        requester_link = get_device_membership(current_guardian.guardian_id, device_id)
         if not requester_link:
             return error_response(
                 "You are not authorized to modify guardians for this device", 403
             )
 
-        if requester_link.role not in ["primary", "secondary", "guardian"]:
+        if requester_link["role"] not in ["primary", "secondary", "guardian"]:
             return error_response(
                 "Only primary or secondary guardians can modify roles", 403
             )
@@ -1014,7 +1435,7 @@ def modify_device_guardian_role(current_guardian, device_id, guardian_id):
         if not target_link:
             return error_response("Target guardian not found for this device", 404)
 
-        if requester_link.role == "secondary" and target_link.role == "primary":
+        if requester_link["role"] == "secondary" and target_link.role == "primary":
             return error_response(
                 "Secondary guardian cannot modify the primary guardian", 403
             )
@@ -1057,10 +1478,7 @@ def update_guardian_relationship(guardian, device_id, guardian_id):
         if not new_relationship:
             return error_response("relationship is required", 400)
 
-        requester_link = DeviceGuardian.query.filter_by(
-            device_id=device_id,
-            guardian_id=guardian.guardian_id,
-        ).first()
+        requester_link = get_device_membership(guardian.guardian_id, device_id)
 
         if not requester_link:
             return error_response(
@@ -1076,13 +1494,13 @@ def update_guardian_relationship(guardian, device_id, guardian_id):
         if not target_link:
             return error_response("Guardian not linked to this device", 404)
 
-        if requester_link.role == "guardian":
+        if requester_link["role"] == "guardian":
             return error_response(
                 "Guardians cannot modify any relationships",
                 403,
             )
 
-        if requester_link.role == "secondary":
+        if requester_link["role"] == "secondary":
             if (
                 target_link.role in ["primary", "secondary"]
                 and guardian.guardian_id != guardian_id
@@ -1133,10 +1551,7 @@ def update_guardian_relationship(guardian, device_id, guardian_id):
 @guardian_required
 def toggle_emergency_guardian(current_guardian, device_id, guardian_id):
     try:
-        requester_link = DeviceGuardian.query.filter_by(
-            device_id=device_id,
-            guardian_id=current_guardian.guardian_id,
-        ).first()
+        requester_link = get_device_membership(current_guardian.guardian_id, device_id)
 
         if not requester_link:
             return error_response(
@@ -1152,7 +1567,7 @@ def toggle_emergency_guardian(current_guardian, device_id, guardian_id):
         if not target_link:
             return error_response("Guardian not linked to this device", 404)
 
-        if requester_link.role != "primary":
+        if requester_link["role"] != "primary":
             return error_response(
                 "Only primary guardians can modify emergency settings",
                 403,
@@ -1172,6 +1587,7 @@ def toggle_emergency_guardian(current_guardian, device_id, guardian_id):
                 message="Emergency guardian removed successfully",
             )
 
+        invalidate_device_members(device_id)
         DeviceGuardian.query.filter_by(
             device_id=device_id,
             is_emergency_contact=True,
@@ -1222,36 +1638,188 @@ def toggle_emergency_guardian(current_guardian, device_id, guardian_id):
 
 @device.route("/<int:device_id>/route", methods=["GET"])
 @guardian_required
+@device_member_required(message="You are not authorized to view routes for this device")
 def get_device_route(guardian, device_id):
     try:
-        device_obj = Device.query.get(device_id)
-        if not device_obj:
-            return error_response("Device not found", 404)
+        membership = get_device_membership(guardian.guardian_id, device_id)
 
-        device_guardian = DeviceGuardian.query.filter_by(
-            device_id=device_id, guardian_id=guardian.guardian_id
-        ).first()
+        payload = route_cache.get(device_id)
+        if payload is None:
+            route = DeviceRoute.query.filter_by(device_id=device_id).first()
+            payload = {
+                "route": _serialize_route(route, membership["device_serial_number"])
+            }
+            route_cache.set(device_id, payload)
 
-        if not device_guardian:
-            return error_response(
-                "You are not authorized to view routes for this device", 403
+        if payload["route"] is None:
+            return success_response(
+                data={"route": None}, message="No route set for this device"
+            )
+
+        return success_response(
+            data=payload, message="Device route retrieved successfully"
+        )
+
+    except Exception as e:
+        return error_response("Failed to retrieve device route", 500, str(e))
+
+
+@device.route("/<int:device_id>/track", methods=["GET"])
+@guardian_required
+@device_member_required(
+    message="You are not authorized to view the track for this device"
+)
+def get_device_track(guardian, device_id):
+    """
+    Streams fixes in (timestamp, locationId) order. At most TRACK_MAX_POINTS
+    are sent per response; `nextCursor` is then set and passed back as
+    `after` to continue. A client whose stream broke off can resume with
+    `after=<timestamp>,<locationId>` of the last point it received.
+    """
+    try:
+        try:
+            start, end = _parse_time_range(timedelta(days=1))
+            after = request.args.get("after")
+            cursor = decode_cursor(after) if after else None
+        except ValueError as e:
+            return error_response(str(e), 400)
+
+        if end - start > TRACK_MAX_RANGE:
+            return error_response("Track range cannot exceed 7 days", 400)
+
+        query = db.session.query(
+            GPSLocation.location_id,
+            GPSLocation.latitude,
+            GPSLocation.longitude,
+            GPSLocation.sats,
+            GPSLocation.hdop,
+            GPSLocation.timestamp,
+        ).filter(
+            GPSLocation.device_id == device_id,
+            GPSLocation.timestamp >= start,
+            GPSLocation.timestamp < end,
+        )
+
+        points = iter_keyset(
+            query,
+            GPSLocation.timestamp,
+            GPSLocation.location_id,
+            page_size=TRACK_PAGE_SIZE,
+            cursor=cursor,
+        )
+
+        # The body is the usual success envelope, written incrementally so a
+        # full day of 1 Hz fixes never has to be materialised in memory.
+        def generate():
+            yield (
+                '{"success": true, "message": "Device track retrieved successfully", '
+                f'"data": {{"deviceId": {device_id}, '
+                f'"from": {json.dumps(start.isoformat())}, '
+                f'"to": {json.dumps(end.isoformat())}, "points": ['
             )
+            separator = ""
+            sent = 0
+            next_cursor = None
+            for point in points:
+                if sent == TRACK_MAX_POINTS:
+                    next_cursor = encode_cursor(last.timestamp, last.location_id)
+                    break
+                yield separator + json.dumps(_serialize_track_point(point))
+                separator = ","
+                sent += 1
+                last = point
+            yield f'], "nextCursor": {json.dumps(next_cursor)}}}}}'
+
+        return Response(stream_with_context(generate()), mimetype="application/json")
+
+    except Exception as e:
+        db.session.rollback()
+        return error_response("Failed to retrieve device track", 500, str(e))
 
-        route = DeviceRoute.query.filter_by(device_id=device_id).first()
 
-        if not route:
+@device.route("/<int:device_id>/track/simplified", methods=["GET"])
+@guardian_required
+@device_member_required(
+    message="You are not authorized to view the track for this device"
+)
+def get_device_track_simplified(guardian, device_id):
+    try:
+        today = datetime.now(timezone.utc).date()
+        try:
+            day_raw = request.args.get("day")
+            day = datetime.strptime(day_raw, "%Y-%m-%d").date() if day_raw else today
+        except ValueError:
+            return error_response("day must be formatted as YYYY-MM-DD", 400)
+
+        tolerance_m = request.args.get("tolerance_m", default=5.0, type=float)
+        max_points = request.args.get("max_points", default=2000, type=int)
+
+        if tolerance_m is None or not (0 <= tolerance_m <= 1000):
+            return error_response("tolerance_m must be between 0 and 1000", 400)
+        if max_points is None or not (2 <= max_points <= 20000):
+            return error_response("max_points must be between 2 and 20000", 400)
+
+        cache_key = (device_id, day.isoformat(), tolerance_m, max_points)
+        cached = track_cache.get(cache_key)
+        if cached is not None:
             return success_response(
-                data={"route": None}, message="No route set for this device"
+                data=cached, message="Simplified track retrieved successfully"
             )
 
-        payload = _serialize_route(route, device_obj)
+        start = datetime.combine(day, datetime.min.time())
+        query = db.session.query(
+            GPSLocation.location_id,
+            GPSLocation.latitude,
+            GPSLocation.longitude,
+            GPSLocation.timestamp,
+        ).filter(
+            GPSLocation.device_id == device_id,
+            GPSLocation.timestamp >= start,
+            GPSLocation.timestamp < start + timedelta(days=1),
+        )
+
+        lat, lng, epoch_seconds, timestamps = [], [], [], []
+        for point in iter_keyset(
+            query,
+            GPSLocation.timestamp,
+            GPSLocation.location_id,
+            page_size=TRACK_PAGE_SIZE,
+        ):
+            lat.append(float(point.latitude))
+            lng.append(float(point.longitude))
+            epoch_seconds.append(
+                point.timestamp.replace(tzinfo=timezone.utc).timestamp()
+            )
+            timestamps.append(point.timestamp)
+
+        kept = simplify_track(lat, lng, epoch_seconds, tolerance_m, max_points)
+
+        data = {
+            "device_id": device_id,
+            "day": day.isoformat(),
+            "tolerance_m": tolerance_m,
+            "max_points": max_points,
+            "original_points": len(lat),
+            "simplified_points": len(kept),
+            "fields": ["lat", "lng", "timestamp"],
+            "points": [
+                [lat[i], lng[i], timestamps[i].isoformat()] for i in kept.tolist()
+            ],
+        }
+
+        track_cache.set(
+            cache_key,
+            data,
+            TRACK_CACHE_TODAY_TTL_SECONDS if day >= today else TRACK_CACHE_TTL_SECONDS,
+        )
 
         return success_response(
-            data={"route": payload}, message="Device route retrieved successfully"
+            data=data, message="Simplified track retrieved successfully"
         )
 
     except Exception as e:
-        return error_response("Failed to retrieve device route", 500, str(e))
+        db.session.rollback()
+        return error_response("Failed to retrieve simplified track", 500, str(e))
 
 
 @device.route("/last-location/<string:device_serial>", methods=["GET"])
@@ -1261,60 +1829,37 @@ def get_device_last_location(guardian, device_serial):
         if not device_serial:
             return error_response("device_serial is required", 400)
 
-        device = Device.query.filter_by(device_serial_number=device_serial).first()
-        if not device:
-            return error_response("Device not found", 404)
-
-        requester_link = DeviceGuardian.query.filter_by(
-            device_id=device.device_id,
-            guardian_id=guardian.guardian_id,
-        ).first()
-
-        if not requester_link:
+        membership = find_membership_by_serial(guardian.guardian_id, device_serial)
+        if not membership:
+            if not Device.query.filter_by(device_serial_number=device_serial).first():
+                return error_response("Device not found", 404)
             return error_response(
                 "You are not authorized to view location for this device",
                 403,
             )
 
         last_location = DeviceLastLocation.query.filter_by(
-            device_id=device.device_id
+            device_id=membership["device_id"]
         ).first()
 
         if not last_location:
             return success_response(
                 data={
-                    "device_serial_number": device.device_serial_number,
+                    "device_serial_number": membership["device_serial_number"],
                     "last_location": None,
                 },
                 message="No last location found for device",
             )
 
         data = {
-            "device_id": device.device_id,
-            "device_serial_number": device.device_serial_number,
-            "lat": float(last_location.lat) if last_location.lat is not None else None,
-            "lng": float(last_location.lng) if last_location.lng is not None else None,
-            "sats": last_location.sats,
-            "fix_status": last_location.fix_status,
-            "hdop": (
-                float(last_location.hdop) if last_location.hdop is not None else None
-            ),
-            "gps_status": last_location.gps_status,
-            "recorded_at": (
-                last_location.recorded_at.isoformat()
-                if last_location.recorded_at
-                else None
-            ),
-            "updated_at": (
-                last_location.updated_at.isoformat()
-                if last_location.updated_at
-                else None
-            ),
+            "device_id": membership["device_id"],
+            "device_serial_number": membership["device_serial_number"],
+            **_serialize_last_location(last_location),
         }
 
         return success_response(
             data={
-                "device_serial_number": device.device_serial_number,
+                "device_serial_number": membership["device_serial_number"],
                 "last_location": data,
             },
             message="Device last location retrieved successfully",
@@ -1325,14 +1870,397 @@ def get_device_last_location(guardian, device_serial):
         return error_response("Failed to retrieve device last location", 500, str(e))
 
 
+@device.route("/locations/batch", methods=["POST"])
+@device_gateway_required
+def ingest_location_batch():
+    try:
+        data = request.get_json(silent=True) or {}
+        items = data.get("locations")
+
+        if not isinstance(items, list) or not items:
+            return error_response("`locations` must be a non-empty list", 400)
+
+        if len(items) > LOCATION_BATCH_MAX:
+            return error_response(
+                f"A batch may contain at most {LOCATION_BATCH_MAX} locations", 413
+            )
+
+        rejected = []
+        parsed = []
+        for index, item in enumerate(items):
+            try:
+                parsed.append((index, parse_location_fix(item)))
+            except ValueError as e:
+                rejected.append({"index": index, "reason": str(e)})
+
+        devices = resolve_devices([fix["device_serial_number"] for _, fix in parsed])
+
+        fixes = []
+        for index, fix in parsed:
+            resolved = devices.get(fix["device_serial_number"])
+            if resolved is None:
+                rejected.append({"index": index, "reason": "unknown device"})
+                continue
+            fix["device_id"], fix["vip_id"] = resolved
+            fixes.append(fix)
+
+        newest = newest_fix_per_device(fixes)
+
+        append_track_points(fixes)
+        upsert_last_locations(newest)
+        touch_devices_last_active(newest)
+        db.session.commit()
+
+        broker = get_broker()
+        for device_id, fix in newest.items():
+            broker.publish(
+                device_id,
+                location_event(device_id, fix["device_serial_number"], fix),
+            )
+
+        return success_response(
+            data={
+                "accepted": len(fixes),
+                "devices_updated": len(newest),
+                "rejected": sorted(rejected, key=lambda r: r["index"]),
+            },
+            message="Location batch ingested",
+        )
+
+    except Exception as e:
+        db.session.rollback()
+        return error_response("Failed to ingest location batch", 500, str(e))
+
+
+@device.route("/emergency", methods=["POST"])
+@device_gateway_required
+def ingest_emergency():
+    """
+    Fast path for SOS and fall reports from the gateway. Answers once the
+    device log and alert are committed; guardians are notified afterwards
+    by the emergency notifier (stream, web push, then email). A repeat of
+    an open alert inside the dedupe window answers 200 with
+    `deduplicated: true` and writes and notifies nothing.
+    """
+    received_at = time.perf_counter()
+    try:
+        try:
+            report = parse_emergency_report(request.get_json(silent=True))
+        except ValueError as e:
+            return error_response(str(e), 400)
+
+        entry = get_emergency_contacts(report["device_serial_number"])
+        if entry is None:
+            return error_response("Device not found", 404)
+
+        deduper = current_app.extensions["emergency_deduper"]
+        dedupe_key = (entry["device_id"], EMERGENCY_TYPES[report["alert_type"]][0])
+        repeat = deduper.claim(dedupe_key, report["triggered_at"])
+        if repeat is not None:
+            alert_id, trigger_count = repeat
+            EMERGENCY_REPORTS.inc(outcome="deduplicated")
+            return success_response(
+                data={
+                    "alert_id": alert_id,
+                    "trigger_count": trigger_count,
+                    "deduplicated": True,
+                },
+                message="Emergency report added to the open alert",
+            )
+
+        try:
+            alert_id, log_id = record_emergency(report, entry)
+        except Exception:
+            deduper.release(dedupe_key)
+            raise
+        deduper.opened(dedupe_key, alert_id)
+        EMERGENCY_REPORTS.inc(outcome="alert")
+        EMERGENCY_INGEST_SECONDS.observe(time.perf_counter() - received_at)
+
+        event = alert_event(alert_id, log_id, report, entry)
+        current_app.extensions["emergency_notifier"].notify(event, entry, received_at)
+
+        return success_response(
+            data={
+                "alert_id": alert_id,
+                "log_id": log_id,
+                "trigger_count": 1,
+                "deduplicated": False,
+                "guardians_notified": len(entry["guardians"]),
+            },
+            message="Emergency alert recorded",
+            status_code=201,
+        )
+
+    except Exception as e:
+        db.session.rollback()
+        return error_response("Failed to record emergency alert", 500, str(e))
+
+
+@device.route("/<int:device_id>/stats", methods=["GET"])
+@guardian_required
+@device_member_required(message="You are not authorized to view stats for this device")
+def get_device_stats(guardian, device_id):
+    """
+    Daily log counts by activity type for one device, read from the
+    activity rollup. `from` and `to` are inclusive local dates
+    (YYYY-MM-DD) in STATS_TIMEZONE, defaulting to the last 30 days;
+    `activity_type` (comma separated) narrows the types. Every day in the
+    range is listed, with an empty counts list when nothing happened.
+    """
+    try:
+        try:
+            to_raw = request.args.get("to")
+            from_raw = request.args.get("from")
+            last_day = (
+                date.fromisoformat(to_raw)
+                if to_raw
+                else datetime.now(STATS_TIMEZONE).date()
+            )
+            first_day = (
+                date.fromisoformat(from_raw)
+                if from_raw
+                else last_day - timedelta(days=DEVICE_STATS_DEFAULT_DAYS - 1)
+            )
+        except ValueError:
+            return error_response("from and to must be dates formatted as YYYY-MM-DD", 400)
+
+        if first_day > last_day:
+            return error_response("from must not be after to", 400)
+        span = (last_day - first_day).days + 1
+        if span > DEVICE_STATS_MAX_DAYS:
+            return error_response(
+                f"Range must not exceed {DEVICE_STATS_MAX_DAYS} days", 400
+            )
+
+        activity_types = [
+            v.strip() for v in request.args.get("activity_type", "").split(",") if v.strip()
+        ]
+        counts = device_activity_counts(device_id, first_day, last_day, activity_types)
+
+        days = {first_day + timedelta(days=i): [] for i in range(span)}
+        totals = {}
+        for (day, activity_type), count in sorted(counts.items()):
+            if count:
+                days[day].append({"activity_type": activity_type, "count": count})
+                totals[activity_type] = totals.get(activity_type, 0) + count
+
+        # Counts are lists rather than dicts keyed by activity_type, which
+        # the camelCase conversion would rewrite.
+        return success_response(
+            data={
+                "device_id": device_id,
+                "from": first_day.isoformat(),
+                "to": last_day.isoformat(),
+                "timezone": STATS_TIMEZONE.key,
+                "days": [
+                    {"day": day.isoformat(), "counts": day_counts}
+                    for day, day_counts in days.items()
+                ],
+                "totals": [
+                    {"activity_type": activity_type, "count": count}
+                    for activity_type, count in sorted(totals.items())
+                ],
+            },
+            message="Device stats retrieved successfully",
+        )
+
+    except Exception as e:
+        db.session.rollback()
+        return error_response("Failed to retrieve device stats", 500, str(e))
+
+
+@device.route("/<int:device_id>/alerts", methods=["GET"])
+@guardian_required
+@device_member_required(message="You are not authorized to view alerts for this device")
+def get_device_alerts(guardian, device_id):
+    """
+    Newest-first alerts for one device. Filter with `status` (comma
+    separated); page with `before=<nextCursor>`.
+    """
+    try:
+        filters = [EmergencyAlert.device_id == device_id]
+
+        statuses = [v.strip() for v in request.args.get("status", "").split(",") if v.strip()]
+        unknown = set(statuses) - {"triggered", *ALERT_TRANSITIONS}
+        if unknown:
+            return error_response(f"Unknown status: {', '.join(sorted(unknown))}", 400)
+        if statuses:
+            filters.append(EmergencyAlert.status.in_(statuses))
+
+        before = request.args.get("before")
+        if before:
+            try:
+                cursor = decode_cursor(before)
+            except ValueError as e:
+                return error_response(str(e), 400)
+            filters.append(
+                before_key(EmergencyAlert.triggered_at, EmergencyAlert.alert_id, *cursor)
+            )
+
+        limit = request.args.get("limit", default=ALERT_PAGE_SIZE, type=int)
+        if limit is None or limit < 1:
+            return error_response("limit must be a positive integer", 400)
+        limit = min(limit, ALERT_MAX_PAGE_SIZE)
+
+        # Served by idx_alert_device_triggered.
+        alerts = (
+            EmergencyAlert.query.filter(*filters)
+            .order_by(EmergencyAlert.triggered_at.desc(), EmergencyAlert.alert_id.desc())
+            .limit(limit + 1)
+            .all()
+        )
+
+        next_cursor = None
+        if len(alerts) > limit:
+            alerts = alerts[:limit]
+            next_cursor = encode_cursor(alerts[-1].triggered_at, alerts[-1].alert_id)
+
+        return success_response(
+            data={
+                "alerts": [_serialize_alert(alert) for alert in alerts],
+                "next_cursor": next_cursor,
+            },
+            message="Alerts retrieved successfully",
+        )
+
+    except Exception as e:
+        db.session.rollback()
+        return error_response("Failed to retrieve alerts", 500, str(e))
+
+
+@device.route("/<int:device_id>/alerts/<int:alert_id>/acknowledge", methods=["POST"])
+@guardian_required
+@device_member_required(
+    message="You are not authorized to acknowledge alerts for this device"
+)
+def acknowledge_alert(guardian, device_id, alert_id):
+    """
+    Moves an alert to acknowledged and closes its dedupe window, so the
+    next report from the cane raises a new alert. Linked guardians'
+    streams get an "emergency_acknowledged" event.
+    """
+    try:
+        alert = EmergencyAlert.query.filter_by(
+            alert_id=alert_id, device_id=device_id
+        ).first()
+        if not alert:
+            return error_response("Alert not found", 404)
+        if alert.status == "acknowledged":
+            return error_response("Alert already acknowledged", 409)
+
+        acknowledged_at = datetime.now(timezone.utc).replace(tzinfo=None)
+        values = {
+            "acknowledged_at": acknowledged_at,
+            "acknowledged_by_guardian_id": guardian.guardian_id,
+        }
+        # The window stays open until the acknowledgement commits, so a lost
+        # race or a failed commit leaves the alert and its count as they were.
+        deduper = current_app.extensions["emergency_deduper"]
+        pending = deduper.pending(alert_id)
+        if pending is not None:
+            values["trigger_count"], values["last_triggered_at"] = pending
+
+        if not transition_alert(db.session, alert_id, "acknowledged", **values):
+            db.session.rollback()
+            return error_response("Alert already acknowledged", 409)
+
+        log_action(
+            guardian_id=guardian.guardian_id,
+            action="ACKNOWLEDGE_ALERT",
+            description=f"{guardian.first_name} {guardian.last_name} acknowledged {alert.alert_type} alert #{alert_id}",
+            device_id=device_id,
+        )
+        db.session.commit()
+        deduper.close(alert_id)
+
+        event = {
+            "alertId": alert_id,
+            "deviceId": device_id,
+            "status": "acknowledged",
+            "acknowledgedAt": acknowledged_at.isoformat(),
+            "acknowledgedByGuardianId": guardian.guardian_id,
+            "acknowledgedByName": f"{guardian.first_name} {guardian.last_name}",
+        }
+        get_broker().publish(device_id, {"event": "emergency_acknowledged", "data": event})
+
+        return success_response(data=event, message="Alert acknowledged")
+
+    except Exception as e:
+        db.session.rollback()
+        return error_response("Failed to acknowledge alert", 500, str(e))
+
+
+@device.route("/locations/stream", methods=["GET"])
+@guardian_required
+def stream_device_locations(guardian):
+    try:
+        rows = (
+            db.session.query(Device, DeviceLastLocation)
+            .join(DeviceGuardian, DeviceGuardian.device_id == Device.device_id)
+            .outerjoin(
+                DeviceLastLocation, DeviceLastLocation.device_id == Device.device_id
+            )
+            .filter(DeviceGuardian.guardian_id == guardian.guardian_id)
+            .all()
+        )
+
+        device_ids = [device_obj.device_id for device_obj, _ in rows]
+        snapshot = [
+            location_event(
+                device_obj.device_id, device_obj.device_serial_number, vars(last)
+            )
+            for device_obj, last in rows
+            if last is not None
+        ]
+
+        broker = get_broker()
+
+        # Streams end after LOCATION_STREAM_MAX_SECONDS so EventSource
+        # reconnects and re-authenticates before the access token expires.
+        def generate():
+            subscription = broker.subscribe(device_ids)
+            tracker = DeltaTracker()
+            try:
+                yield "retry: 3000\n\n"
+                for event in snapshot:
+                    yield format_sse("location", tracker.delta(event))
+
+                deadline = time.monotonic() + LOCATION_STREAM_MAX_SECONDS
+                while time.monotonic() < deadline:
+                    event = subscription.get(timeout=LOCATION_STREAM_KEEPALIVE_SECONDS)
+                    if event is None:
+                        yield ": keepalive\n\n"
+                        continue
+
+                    # Named events (emergency, emergency_acknowledged) pass
+                    # through; everything else is a location fix.
+                    if "event" in event:
+                        yield format_sse(event["event"], event["data"])
+                        continue
+
+                    delta = tracker.delta(event)
+                    if delta:
+                        yield format_sse("location", delta)
+            finally:
+                broker.unsubscribe(subscription)
+
+        return Response(
+            generate(),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    except Exception as e:
+        db.session.rollback()
+        return error_response("Failed to open location stream", 500, str(e))
+
+
 @device.route("/pending-invites", methods=["GET"])
 @guardian_required
 def get_pending_invites_counts(guardian):
     try:
-        linked_devices = DeviceGuardian.query.filter_by(
-            guardian_id=guardian.guardian_id
-        ).all()
-        device_ids = [link.device_id for link in linked_devices]
+        device_ids = list(load_device_memberships(guardian.guardian_id))
 
         if not device_ids:
             return success_response(
@@ -1375,54 +2303,78 @@ def get_pending_invites_counts(guardian):
 @device.route("/log/<string:device_serial>", methods=["GET"])
 @guardian_required
 def get_device_logs_by_serial(guardian, device_serial):
+    """
+    Newest-first logs for one device. Page with `before=<nextCursor>`;
+    filter with `activity_type`, `status` (comma separated), `from` and
+    `to`. `format=ndjson` or `format=csv` streams the whole range instead.
+    """
     try:
         if not device_serial:
             return error_response("device_serial is required", 400)
 
-        device = Device.query.filter_by(device_serial_number=device_serial).first()
-        if not device:
-            return error_response("Device not found", 404)
-
-        requester_link = DeviceGuardian.query.filter_by(
-            device_id=device.device_id,
-            guardian_id=guardian.guardian_id,
-        ).first()
-
-        if not requester_link:
+        membership = find_membership_by_serial(guardian.guardian_id, device_serial)
+        if not membership:
+            if not Device.query.filter_by(device_serial_number=device_serial).first():
+                return error_response("Device not found", 404)
             return error_response(
                 "You are not authorized to view logs for this device",
                 403,
             )
 
-        limit = request.args.get("limit", default=50, type=int)
+        export_format = request.args.get("format", "json")
+        if export_format not in ("json", "ndjson", "csv"):
+            return error_response("format must be json, ndjson or csv", 400)
+
+        try:
+            filters = _device_log_filters(membership["device_id"])
+            if export_format != "json":
+                return _export_device_logs(membership, filters, export_format)
+
+            from_raw = request.args.get("from")
+            to_raw = request.args.get("to")
+            if from_raw:
+                filters.append(DeviceLog.created_at >= to_utc_naive(from_raw, "from"))
+            if to_raw:
+                filters.append(DeviceLog.created_at < to_utc_naive(to_raw, "to"))
+
+            before = request.args.get("before")
+            if before:
+                filters.append(
+                    before_key(DeviceLog.created_at, DeviceLog.log_id, *decode_cursor(before))
+                )
+        except ValueError as e:
+            return error_response(str(e), 400)
+
+        limit = request.args.get("limit", default=DEVICE_LOG_PAGE_SIZE, type=int)
         if limit is None or limit < 1:
             return error_response("limit must be a positive integer", 400)
-        limit = min(limit, 200)
+        limit = min(limit, DEVICE_LOG_MAX_PAGE_SIZE)
 
+        # Newest-first range scan of idx_device_logs_device_created, which
+        # serves the device filter, the order and the cursor together.
         logs = (
-            DeviceLog.query.filter_by(device_id=device.device_id)
-            .order_by(DeviceLog.created_at.desc())
-            .limit(limit)
+            DeviceLog.query.filter(*filters)
+            .order_by(DeviceLog.created_at.desc(), DeviceLog.log_id.desc())
+            .limit(limit + 1)
             .all()
         )
 
+        next_cursor = None
+        if len(logs) > limit:
+            logs = logs[:limit]
+            next_cursor = encode_cursor(logs[-1].created_at, logs[-1].log_id)
+
         data = [
-            {
-                "log_id": log.log_id,
-                "device_id": log.device_id,
-                "device_serial_number": device.device_serial_number,
-                "guardian_id": log.guardian_id,
-                "activity_type": log.activity_type,
-                "status": log.status,
-                "message": log.message,
-                "metadata_json": log.metadata_json,
-                "created_at": log.created_at.isoformat() if log.created_at else None,
-            }
+            _serialize_device_log(log, membership["device_serial_number"])
             for log in logs
         ]
 
         return success_response(
-            data={"device_serial_number": device.device_serial_number, "logs": data},
+            data={
+                "device_serial_number": membership["device_serial_number"],
+                "logs": data,
+                "next_cursor": next_cursor,
+            },
             message="Device logs retrieved successfully",
         )
 
@@ -2,15 +2,15 @@ from sqlite3 import IntegrityError
 
 from flask import Blueprint, request, current_app
 from app import db
-from app.models import Guardian, VIP
+from app.models import Guardian, PushSubscription, VIP
 from app.utils.auth import guardian_required
 from app.utils.responses import success_response, error_response
+from app.utils.web_push import validate_push_endpoint
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
 import os
 from datetime import datetime, timezone
 import uuid
-from app.models import DeviceGuardian
 
 from app.utils.serializer import model_to_dict
 from app.models import AccountHistory
@@ -368,62 +368,158 @@ def update_guardian(guardian, guardian_id):
         return error_response("Failed to update guardian", 500, str(e))
 
 
-from sqlalchemy import or_, and_
+from sqlalchemy import and_, event, select, union_all
+from sqlalchemy.orm import object_session
+
+from app.utils.auth import load_device_memberships
+from app.utils.cache import create_cache, invalidate_on_commit
+from app.utils.keyset import before_key, decode_cursor, encode_cursor
+from app.utils.locations import to_utc_naive
+
+HISTORY_PAGE_SIZE = 100
+HISTORY_MAX_PAGE_SIZE = 200
+
+GUARDIAN_NAME_CACHE_TTL_SECONDS = 300
+guardian_name_cache = create_cache(
+    "guardian_name", max_entries=4096, ttl_seconds=GUARDIAN_NAME_CACHE_TTL_SECONDS
+)
+
+
+@event.listens_for(Guardian, "after_update")
+@event.listens_for(Guardian, "after_delete")
+def _invalidate_guardian_name(mapper, connection, target):
+    invalidate_on_commit(object_session(target), guardian_name_cache, target.guardian_id)
+
+
+def _guardian_names(guardian_ids):
+    """{guardian_id: "First Last"}, read through guardian_name_cache."""
+    names = {}
+    missing = []
+    for guardian_id in set(guardian_ids):
+        name = guardian_name_cache.get(guardian_id)
+        if name is None:
+            missing.append(guardian_id)
+        else:
+            names[guardian_id] = name
+
+    if missing:
+        for guardian_id, first_name, last_name in db.session.query(
+            Guardian.guardian_id, Guardian.first_name, Guardian.last_name
+        ).filter(Guardian.guardian_id.in_(missing)):
+            names[guardian_id] = f"{first_name} {last_name}"
+            guardian_name_cache.set(guardian_id, names[guardian_id])
+
+    return names
 
 
 @guardian_bp.route("/history", methods=["GET"])
 @guardian_required
 def get_account_history(guardian):
+    """
+    Newest-first history for the guardian's devices plus their own
+    device-less entries. Page with `before=<nextCursor>`; filter with
+    `action` (comma separated), `device_id`, `from` and `to`.
+    """
     try:
-        my_device_ids = [
-            dg.device_id
-            for dg in DeviceGuardian.query.filter_by(
-                guardian_id=guardian.guardian_id
-            ).all()
-        ]
-
-        records_query = db.session.query(AccountHistory, Guardian).join(
-            Guardian, Guardian.guardian_id == AccountHistory.guardian_id
-        )
-
-        if my_device_ids:
-            records_query = records_query.filter(
-                or_(
-                    AccountHistory.device_id.in_(my_device_ids),
-                    and_(
-                        AccountHistory.device_id.is_(None),
-                        AccountHistory.guardian_id == guardian.guardian_id,
-                    ),
+        try:
+            before = request.args.get("before")
+            cursor = decode_cursor(before) if before else None
+            limit = min(
+                max(int(request.args.get("limit", HISTORY_PAGE_SIZE)), 1),
+                HISTORY_MAX_PAGE_SIZE,
+            )
+            from_raw = request.args.get("from")
+            to_raw = request.args.get("to")
+            start = to_utc_naive(from_raw, "from") if from_raw else None
+            end = to_utc_naive(to_raw, "to") if to_raw else None
+            device_filter = request.args.get("device_id", type=int)
+        except ValueError as e:
+            return error_response(str(e), 400)
+
+        my_device_ids = list(load_device_memberships(guardian.guardian_id))
+
+        if device_filter is not None:
+            if device_filter not in my_device_ids:
+                return error_response(
+                    "You are not authorized to view history for this device", 403
                 )
+            my_device_ids = [device_filter]
+
+        filters = []
+        actions = [
+            action.strip().upper()
+            for action in request.args.get("action", "").split(",")
+            if action.strip()
+        ]
+        if actions:
+            filters.append(AccountHistory.action.in_(actions))
+        if start is not None:
+            filters.append(AccountHistory.created_at >= start)
+        if end is not None:
+            filters.append(AccountHistory.created_at < end)
+        if cursor is not None:
+            filters.append(
+                before_key(AccountHistory.created_at, AccountHistory.history_id, *cursor)
             )
-        else:
-            records_query = records_query.filter(
+
+        # One newest-first branch per device (idx_history_device_created) and
+        # one for the guardian's own device-less entries
+        # (idx_history_guardian_device_created). Each stops after a page, so
+        # the UNION never reads more than (devices + 1) pages of rows.
+        branch_conditions = [
+            AccountHistory.device_id == device_id for device_id in my_device_ids
+        ]
+        if device_filter is None:
+            branch_conditions.append(
                 and_(
-                    AccountHistory.device_id.is_(None),
                     AccountHistory.guardian_id == guardian.guardian_id,
+                    AccountHistory.device_id.is_(None),
                 )
             )
 
-        records = (
-            records_query.order_by(AccountHistory.created_at.desc()).limit(100).all()
-        )
+        branches = [
+            select(
+                select(AccountHistory)
+                .filter(condition, *filters)
+                .order_by(
+                    AccountHistory.created_at.desc(), AccountHistory.history_id.desc()
+                )
+                .limit(limit + 1)
+                .subquery()
+            )
+            for condition in branch_conditions
+        ]
+
+        page = union_all(*branches).subquery()
+        rows = db.session.execute(
+            select(page)
+            .order_by(page.c.created_at.desc(), page.c.history_id.desc())
+            .limit(limit + 1)
+        ).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].created_at, rows[-1].history_id)
+
+        names = _guardian_names(row.guardian_id for row in rows)
 
         history = [
             {
-                "history_id": entry.history_id,
-                "guardian_name": f"{g.first_name} {g.last_name}",
-                "action": entry.action,
-                "description": entry.description,
-                "device_id": entry.device_id,
+                "history_id": row.history_id,
+                "guardian_name": names.get(row.guardian_id),
+                "action": row.action,
+                "description": row.description,
+                "device_id": row.device_id,
                 "created_at": (
-                    entry.created_at.isoformat() if entry.created_at else None
+                    row.created_at.isoformat() if row.created_at else None
                 ),
             }
-            for entry, g in records
+            for row in rows
         ]
 
         return success_response(
-            data={"history": history},
+            data={"history": history, "next_cursor": next_cursor},
             message="History retrieved successfully",
         )
 
@@ -455,6 +551,11 @@ def save_push_subscription(guardian):
         if not endpoint or not p256dh or not auth:
             return error_response("Invalid push subscription payload", 400)
 
+        try:
+            validate_push_endpoint(endpoint)
+        except ValueError as e:
+            return error_response(str(e), 400)
+
         existing = PushSubscription.query.filter_by(endpoint=endpoint).first()
 
         if existing:
@@ -531,6 +632,19 @@ def delete_push_subscription(guardian):
         return error_response("Failed to delete push subscription", 500, str(e))
 
 
+@guardian_bp.route("/push-subscriptions/vapid-public-key", methods=["GET"])
+@guardian_required
+def get_vapid_public_key(guardian):
+    sender = current_app.extensions.get("web_push")
+    if sender is None:
+        return error_response("Push notifications are not configured", 503)
+
+    return success_response(
+        data={"public_key": sender.signer.public_key},
+        message="VAPID public key retrieved successfully",
+    )
+
+
 @guardian_bp.route("/push-subscriptions", methods=["GET"])
 @guardian_required
 def get_my_push_subscriptions(guardian):
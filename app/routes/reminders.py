@@ -4,6 +4,7 @@ from app.models import NoteReminder
 from app.utils.auth import guardian_required
 from app.utils.responses import success_response, error_response, paginated_response
 from app.utils.auth import guardian_with_device_required
+from app.utils.reminder_scheduler import parse_reminder_time
 
 reminders_bp = Blueprint("reminders", __name__)
 
@@ -11,7 +12,7 @@ reminders_bp = Blueprint("reminders", __name__)
 @reminders_bp.route("", methods=["POST"])
 @guardian_required
 @guardian_with_device_required
-def create_reminder(guardian, devices):
+def create_reminder(guardian):
     try:
         data = request.get_json()
 
@@ -20,11 +21,16 @@ def create_reminder(guardian, devices):
             if not data.get(field):
                 return error_response(f"Missing required field: {field}", 400)
 
+        try:
+            reminder_time = parse_reminder_time(data["reminder_time"])
+        except ValueError as e:
+            return error_response(str(e), 400)
+
         reminder = NoteReminder(
             guardian_id=guardian.guardian_id,
             vip_id=data["vip_id"],
             message=data["message"],
-            reminder_time=data["reminder_time"],
+            reminder_time=reminder_time,
             is_active=data.get("is_active", True),
         )
 
@@ -104,7 +110,10 @@ def update_reminder(guardian, reminder_id):
         if data.get("message"):
             reminder.message = data["message"]
         if data.get("reminder_time"):
-            reminder.reminder_time = data["reminder_time"]
+            try:
+                reminder.reminder_time = parse_reminder_time(data["reminder_time"])
+            except ValueError as e:
+                return error_response(str(e), 400)
         if "is_active" in data:
             reminder.is_active = data["is_active"]
 
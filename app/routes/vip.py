@@ -1,7 +1,7 @@
 from flask import Blueprint, request, current_app
 from app import db
 from app.models import VIP, DeviceGuardian, Device
-from app.utils.auth import guardian_required
+from app.utils.auth import device_member_required, guardian_required
 from app.utils.responses import success_response, error_response
 from datetime import datetime, timezone
 from werkzeug.utils import secure_filename
@@ -110,25 +110,16 @@ def upload_vip_image(guardian, vip_id):
 
 @vip_bp.route("/<int:device_id>", methods=["PUT"])
 @guardian_required
+@device_member_required(
+    roles=("primary", "secondary"),
+    message="Device not paired with this guardian",
+    status_code=404,
+    role_message="Only primary or secondary guardians can update VIP",
+)
 def update_vip(guardian, device_id):
     try:
         data = request.get_json() or {}
 
-        if not device_id:
-            return error_response("device_id is required", 400)
-
-        device_guardian = DeviceGuardian.query.filter_by(
-            device_id=device_id, guardian_id=guardian.guardian_id
-        ).first()
-
-        if not device_guardian:
-            return error_response("Device not paired with this guardian", 404)
-
-        if device_guardian.role not in ["primary", "secondary"]:
-            return error_response(
-                "Only primary or secondary guardians can update VIP", 403
-            )
-
         device = Device.query.get(device_id)
 
         vip = device.vip
@@ -182,23 +173,14 @@ def update_vip(guardian, device_id):
 
 @vip_bp.route("/<int:device_id>", methods=["DELETE"])
 @guardian_required
+@device_member_required(
+    roles=("primary", "secondary"),
+    message="Device not paired with this guardian",
+    status_code=404,
+    role_message="Only primary or secondary guardians can update VIP",
+)
 def delete_vip(guardian, device_id):
     try:
-        if not device_id:
-            return error_response("device_id is required", 400)
-
-        device_guardian = DeviceGuardian.query.filter_by(
-            device_id=device_id, guardian_id=guardian.guardian_id
-        ).first()
-
-        if not device_guardian:
-            return error_response("Device not paired with this guardian", 404)
-
-        if device_guardian.role not in ["primary", "secondary"]:
-            return error_response(
-                "Only primary or secondary guardians can update VIP", 403
-            )
-
         device = Device.query.get(device_id)
 
         if not device or not device.vip:
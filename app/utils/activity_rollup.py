@@ -0,0 +1,251 @@
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import DeviceActivityRollup, DeviceLog, RollupState
+from app.utils.keyset import after_key
+from app.utils.metrics import counter
+
+
+# Rollup days are local dates in this zone, so "today" on a guardian's
+# dashboard matches their wall clock.
+STATS_TIMEZONE = ZoneInfo(os.environ.get("STATS_TIMEZONE", "Asia/Manila"))
+ACTIVITY_ROLLUP_INTERVAL_SECONDS = int(os.environ.get("ACTIVITY_ROLLUP_INTERVAL", 60))
+ACTIVITY_ROLLUP_BATCH_SIZE = 5000
+# Logs younger than this are left for the next pass, so a transaction that
+# commits a little after its created_at was stamped is not skipped over.
+ACTIVITY_ROLLUP_SETTLE = timedelta(seconds=30)
+
+_STATE_NAME = "device_activity"
+
+ROLLUP_LOGS_COUNTED = counter(
+    "activity_rollup_logs_total",
+    "Device logs folded into device_activity_rollup_tbl.",
+)
+
+
+def local_day(created_at):
+    """The STATS_TIMEZONE date of a naive-UTC created_at."""
+    return created_at.replace(tzinfo=timezone.utc).astimezone(STATS_TIMEZONE).date()
+
+
+def day_bounds(first_day, last_day):
+    """
+    Naive-UTC [start, end) covering the local days first_day..last_day,
+    matching how created_at is stored.
+    """
+
+    def to_utc(day):
+        midnight = datetime.combine(day, datetime.min.time(), tzinfo=STATS_TIMEZONE)
+        return midnight.astimezone(timezone.utc).replace(tzinfo=None)
+
+    return to_utc(first_day), to_utc(last_day + timedelta(days=1))
+
+
+def _lock_state(session):
+    state = (
+        session.query(RollupState)
+        .filter(RollupState.name == _STATE_NAME)
+        .with_for_update()
+        .one_or_none()
+    )
+    if state is not None:
+        return state
+
+    # The inserted row stays locked until this transaction ends.
+    state = RollupState(name=_STATE_NAME, high_water_log_id=0)
+    try:
+        session.add(state)
+        session.flush()
+    except IntegrityError:
+        # Another worker created it first; wait for its lock instead.
+        session.rollback()
+        return _lock_state(session)
+    return state
+
+
+def _add_counts(session, counts):
+    """Adds to the stored counts with one multi-row upsert."""
+    table = DeviceActivityRollup.__table__
+    stmt = mysql_insert(table).values(
+        [
+            {
+                "device_id": device_id,
+                "day": day,
+                "activity_type": activity_type,
+                "count": count,
+            }
+            for (device_id, day, activity_type), count in counts.items()
+        ]
+    )
+    session.execute(
+        stmt.on_duplicate_key_update(count=table.c.count + stmt.inserted["count"])
+    )
+
+
+def roll_up_device_activity(now=None, batch_size=ACTIVITY_ROLLUP_BATCH_SIZE):
+    """
+    Folds device logs past the high-water mark into the rollup, one batch
+    per transaction. Each transaction holds the state row FOR UPDATE, so
+    workers running the job at once take turns and never count a log
+    twice. Returns the number of logs counted.
+    """
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+    cutoff = now - ACTIVITY_ROLLUP_SETTLE
+    total = 0
+
+    while True:
+        with Session(db.engine) as session:
+            state = _lock_state(session)
+
+            query = session.query(
+                DeviceLog.created_at,
+                DeviceLog.log_id,
+                DeviceLog.device_id,
+                DeviceLog.activity_type,
+            ).filter(DeviceLog.created_at < cutoff)
+            if state.high_water_at is not None:
+                query = query.filter(
+                    after_key(
+                        DeviceLog.created_at,
+                        DeviceLog.log_id,
+                        state.high_water_at,
+                        state.high_water_log_id,
+                    )
+                )
+            # Range scan of idx_device_logs_created.
+            rows = (
+                query.order_by(DeviceLog.created_at.asc(), DeviceLog.log_id.asc())
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                session.rollback()
+                return total
+
+            _add_counts(
+                session,
+                Counter(
+                    (device_id, local_day(created_at), activity_type)
+                    for created_at, _, device_id, activity_type in rows
+                ),
+            )
+            state.high_water_at, state.high_water_log_id = rows[-1][0], rows[-1][1]
+            session.commit()
+
+        total += len(rows)
+        ROLLUP_LOGS_COUNTED.inc(len(rows))
+        if len(rows) < batch_size:
+            return total
+
+
+def reset_device_activity_rollup():
+    """
+    Empties the rollup and its high-water mark so the next pass recounts
+    every log. Run it after backdated logs are inserted (seed scripts,
+    imports), which land behind the mark and would otherwise be missed.
+    """
+    with Session(db.engine) as session:
+        _lock_state(session)
+        session.query(DeviceActivityRollup).delete(synchronize_session=False)
+        session.query(RollupState).filter(RollupState.name == _STATE_NAME).delete(
+            synchronize_session=False
+        )
+        session.commit()
+
+
+def device_activity_counts(device_id, first_day, last_day, activity_types=None):
+    """
+    {(day, activity_type): count} for one device over local days
+    first_day..last_day. Reads the rollup rows for the range, then counts
+    the logs past the high-water mark directly; that tail is only the last
+    pass interval or so of this device's logs.
+    """
+    filters = [
+        DeviceActivityRollup.device_id == device_id,
+        DeviceActivityRollup.day >= first_day,
+        DeviceActivityRollup.day <= last_day,
+    ]
+    if activity_types:
+        filters.append(DeviceActivityRollup.activity_type.in_(activity_types))
+
+    counts = Counter(
+        {
+            (day, activity_type): count
+            for day, activity_type, count in db.session.query(
+                DeviceActivityRollup.day,
+                DeviceActivityRollup.activity_type,
+                DeviceActivityRollup.count,
+            ).filter(*filters)
+        }
+    )
+
+    # Both reads share the request transaction's snapshot, so a pass
+    # committing in between cannot make a log count twice or not at all.
+    state = db.session.get(RollupState, _STATE_NAME)
+    start, end = day_bounds(first_day, last_day)
+    tail = db.session.query(DeviceLog.created_at, DeviceLog.activity_type).filter(
+        DeviceLog.device_id == device_id,
+        DeviceLog.created_at >= start,
+        DeviceLog.created_at < end,
+    )
+    if state is not None and state.high_water_at is not None:
+        if state.high_water_at >= end:
+            return counts
+        tail = tail.filter(
+            after_key(
+                DeviceLog.created_at,
+                DeviceLog.log_id,
+                state.high_water_at,
+                state.high_water_log_id,
+            )
+        )
+    if activity_types:
+        tail = tail.filter(DeviceLog.activity_type.in_(activity_types))
+
+    # Range scan of idx_device_logs_device_created.
+    for created_at, activity_type in tail:
+        counts[(local_day(created_at), activity_type)] += 1
+    return counts
+
+
+def init_activity_rollup(app):
+    """
+    Runs roll_up_device_activity every ACTIVITY_ROLLUP_INTERVAL seconds from
+    a daemon thread started on the first request. Set
+    ACTIVITY_ROLLUP_INTERVAL=0 to leave it to an external job.
+    """
+    if ACTIVITY_ROLLUP_INTERVAL_SECONDS <= 0:
+        return
+
+    state = {"started": False}
+    lock = threading.Lock()
+
+    def roll_up_forever():
+        while True:
+            try:
+                with app.app_context():
+                    roll_up_device_activity()
+            except Exception as e:
+                print(f"[activity_rollup] Rollup pass failed: {e}")
+            time.sleep(ACTIVITY_ROLLUP_INTERVAL_SECONDS)
+
+    @app.before_request
+    def start_activity_rollup():
+        if state["started"]:
+            return
+        with lock:
+            if state["started"]:
+                return
+            state["started"] = True
+        threading.Thread(
+            target=roll_up_forever, name="activity-rollup", daemon=True
+        ).start()
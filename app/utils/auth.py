@@ -1,18 +1,153 @@
+import hmac
+import os
 from functools import wraps
-from flask import jsonify, request
-from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
-from app.models import Guardian, DeviceGuardian
+from flask import current_app, g, has_app_context, jsonify, request
+from flask_jwt_extended import get_jwt, get_jwt_identity, verify_jwt_in_request
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+from app import db
+from app.models import Device, Guardian, DeviceGuardian
+from app.utils.cache import create_cache, invalidate_on_commit
 from app.utils.responses import error_response
 
 
+# Cross-request caching of membership maps is opt-in; 0 keeps the map
+# scoped to a single request.
+MEMBERSHIP_CACHE_TTL_SECONDS = int(os.environ.get("DEVICE_MEMBERSHIP_CACHE_TTL", 0))
+membership_cache = create_cache(
+    "device_membership",
+    max_entries=10000,
+    ttl_seconds=max(MEMBERSHIP_CACHE_TTL_SECONDS, 1),
+)
+
+# Column snapshots of recently seen guardians, used by the claims auth
+# mode. Shared through Redis when configured, so an edit or delete
+# committed by one worker invalidates the entry for all of them.
+IDENTITY_CACHE_TTL_SECONDS = int(os.environ.get("GUARDIAN_IDENTITY_CACHE_TTL", 30))
+identity_cache = create_cache(
+    "guardian_identity",
+    max_entries=10000,
+    ttl_seconds=max(IDENTITY_CACHE_TTL_SECONDS, 1),
+)
+
+_CLAIM_FIELDS = ("username", "role")
+_SNAPSHOT_EXCLUDE = {"password"}
+
+
+class GuardianProxy:
+    """
+    Stand-in for a Guardian built from access-token claims. guardian_id,
+    username and role come straight from the token; other columns are served
+    from identity_cache, and anything else (relationships, methods,
+    assignments) loads the Guardian row once and delegates to it.
+    guardian_required calls exists() first, so a deleted guardian is
+    answered with a 404 instead of failing inside the handler.
+    """
+
+    def __init__(self, guardian_id, claims):
+        object.__setattr__(self, "_guardian_id", guardian_id)
+        object.__setattr__(
+            self,
+            "_claims",
+            {field: claims[field] for field in _CLAIM_FIELDS if field in claims},
+        )
+        object.__setattr__(self, "_instance", None)
+        object.__setattr__(self, "_snapshot", None)
+
+    @property
+    def guardian_id(self):
+        return self._guardian_id
+
+    def exists(self):
+        """True when a cached snapshot or the guardian row is found."""
+        if IDENTITY_CACHE_TTL_SECONDS > 0:
+            object.__setattr__(self, "_snapshot", identity_cache.get(self._guardian_id))
+            if self._snapshot is not None:
+                return True
+        try:
+            self._load()
+        except LookupError:
+            return False
+        return True
+
+    def _load(self):
+        if self._instance is None:
+            instance = Guardian.query.get(self._guardian_id)
+            if instance is None:
+                raise LookupError("Guardian not found")
+            object.__setattr__(self, "_instance", instance)
+            if IDENTITY_CACHE_TTL_SECONDS > 0:
+                identity_cache.set(self._guardian_id, _guardian_snapshot(instance))
+        return self._instance
+
+    def __getattr__(self, name):
+        if name.startswith("__") or self._instance is not None:
+            return getattr(self._load(), name)
+
+        if name in self._claims:
+            return self._claims[name]
+
+        if self._snapshot is not None and name in self._snapshot:
+            return self._snapshot[name]
+
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+
+    def __repr__(self):
+        return f"<GuardianProxy {self._guardian_id}>"
+
+
+def _guardian_snapshot(guardian):
+    # Only JSON-native values, so the snapshot survives the Redis backend
+    # unchanged; timestamps are read from the row when asked for.
+    snapshot = {}
+    for column in Guardian.__table__.columns:
+        value = getattr(guardian, column.key)
+        if column.key not in _SNAPSHOT_EXCLUDE and (
+            value is None or isinstance(value, (str, int, float, bool))
+        ):
+            snapshot[column.key] = value
+    return snapshot
+
+
+@event.listens_for(Guardian, "after_update")
+@event.listens_for(Guardian, "after_delete")
+def _invalidate_identity_cache(mapper, connection, target):
+    invalidate_on_commit(object_session(target), identity_cache, target.guardian_id)
+
+
+def _load_guardian_from_claims():
+    claims = get_jwt()
+    guardian_id = claims.get("guardian_id")
+    if guardian_id is None:
+        return None
+    return GuardianProxy(int(guardian_id), claims)
+
+
 def guardian_required(f):
+    """
+    Resolves the logged-in guardian and passes it as the first argument.
+    With GUARDIAN_AUTH_MODE=claims the guardian is a GuardianProxy built
+    from the token, so most requests never read guardian_tbl; the default
+    "database" mode loads the Guardian row up front.
+    """
+
     @wraps(f)
     def decorated_function(*args, **kwargs):
         try:
             verify_jwt_in_request()
 
-            current_guardian_id = get_jwt_identity()
-            guardian = Guardian.query.get(current_guardian_id)
+            guardian = None
+            if current_app.config.get("GUARDIAN_AUTH_MODE") == "claims":
+                guardian = _load_guardian_from_claims()
+                if guardian is not None and not guardian.exists():
+                    return error_response("Guardian not found", 404)
+
+            if guardian is None:
+                current_guardian_id = get_jwt_identity()
+                guardian = Guardian.query.get(current_guardian_id)
 
             if not guardian:
                 return error_response("Guardian not found", 404)
@@ -29,13 +164,154 @@ def guardian_required(f):
 def guardian_with_device_required(f):
     @wraps(f)
     def decorated_function(guardian, *args, **kwargs):
-        exists = DeviceGuardian.query.filter_by(
-            guardian_id=guardian.guardian_id
-        ).first()
-
-        if not exists:
+        if not load_device_memberships(guardian.guardian_id):
             return jsonify({"success": False, "message": "No devices paired."}), 403
 
         return f(guardian, *args, **kwargs)
 
     return decorated_function
+
+
+def device_gateway_required(f):
+    """
+    Protects ingestion endpoints called by the device gateway rather than a
+    logged-in guardian. The gateway sends the shared DEVICE_GATEWAY_KEY in
+    the X-Device-Key header.
+    """
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        expected_key = current_app.config.get("DEVICE_GATEWAY_KEY")
+        provided_key = request.headers.get("X-Device-Key", "")
+
+        if not expected_key:
+            return error_response("Device gateway key is not configured", 503)
+
+        if not hmac.compare_digest(provided_key, expected_key):
+            return error_response("Invalid device gateway key", 401)
+
+        return f(*args, **kwargs)
+
+    return decorated_function
+
+
+def load_device_memberships(guardian_id):
+    """
+    Returns {device_id: {"role", "is_emergency_contact",
+    "device_serial_number"}} for every device the guardian is linked to.
+    Loaded with one query per request (or served from membership_cache when
+    DEVICE_MEMBERSHIP_CACHE_TTL is set) and memoised on flask.g.
+    """
+    per_request = g.setdefault("_device_memberships", {})
+    if guardian_id in per_request:
+        return per_request[guardian_id]
+
+    rows = None
+    if MEMBERSHIP_CACHE_TTL_SECONDS > 0:
+        rows = membership_cache.get(guardian_id)
+
+    if rows is None:
+        rows = [
+            {
+                "device_id": device_id,
+                "role": role,
+                "is_emergency_contact": bool(is_emergency_contact),
+                "device_serial_number": device_serial_number,
+            }
+            for device_id, role, is_emergency_contact, device_serial_number in (
+                db.session.query(
+                    DeviceGuardian.device_id,
+                    DeviceGuardian.role,
+                    DeviceGuardian.is_emergency_contact,
+                    Device.device_serial_number,
+                )
+                .join(Device, Device.device_id == DeviceGuardian.device_id)
+                .filter(DeviceGuardian.guardian_id == guardian_id)
+                .all()
+            )
+        ]
+        if MEMBERSHIP_CACHE_TTL_SECONDS > 0:
+            membership_cache.set(guardian_id, rows)
+
+    memberships = {row["device_id"]: row for row in rows}
+    per_request[guardian_id] = memberships
+    return memberships
+
+
+def get_device_membership(guardian_id, device_id):
+    return load_device_memberships(guardian_id).get(device_id)
+
+
+def find_membership_by_serial(guardian_id, device_serial):
+    for membership in load_device_memberships(guardian_id).values():
+        if membership["device_serial_number"] == device_serial:
+            return membership
+    return None
+
+
+def invalidate_device_memberships(guardian_id):
+    if has_app_context():
+        g.get("_device_memberships", {}).pop(guardian_id, None)
+    invalidate_on_commit(db.session(), membership_cache, guardian_id)
+
+
+def invalidate_device_members(device_id):
+    """
+    For bulk UPDATE/DELETE statements on device_guardian_tbl, which bypass
+    the ORM events below: drops the cached map of every guardian linked to
+    the device.
+    """
+    guardian_ids = [
+        guardian_id
+        for (guardian_id,) in db.session.query(DeviceGuardian.guardian_id)
+        .filter(DeviceGuardian.device_id == device_id)
+        .all()
+    ]
+    for guardian_id in guardian_ids:
+        invalidate_device_memberships(guardian_id)
+
+
+@event.listens_for(DeviceGuardian, "after_insert")
+@event.listens_for(DeviceGuardian, "after_update")
+@event.listens_for(DeviceGuardian, "after_delete")
+def _invalidate_membership_cache(mapper, connection, target):
+    if has_app_context():
+        g.get("_device_memberships", {}).pop(target.guardian_id, None)
+    invalidate_on_commit(object_session(target), membership_cache, target.guardian_id)
+
+
+def device_member_required(
+    roles=None,
+    message="You are not authorized to access this device",
+    status_code=403,
+    role_message=None,
+):
+    """
+    Stacks under guardian_required on routes taking a `device_id` view arg.
+    Answers 404 when the device does not exist, `status_code` when the
+    guardian is not linked to it, and 403 when their role is not in `roles`.
+    """
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(guardian, *args, **kwargs):
+            device_id = kwargs.get("device_id")
+            membership = get_device_membership(guardian.guardian_id, device_id)
+
+            if membership is None:
+                if not Device.query.get(device_id):
+                    return error_response("Device not found", 404)
+                return error_response(message, status_code)
+
+            if roles and membership["role"] not in roles:
+                return error_response(
+                    role_message
+                    or f"Only {' or '.join(roles)} guardians can perform this action",
+                    403,
+                )
+
+            return f(guardian, *args, **kwargs)
+
+        return decorated_function
+
+    return decorator
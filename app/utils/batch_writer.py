@@ -0,0 +1,184 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import date, datetime
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app import db
+from app.utils.metrics import counter
+
+
+# Spilled and dropped rows are always counted in BATCH_WRITER_ROWS, but
+# logged at most once per this many seconds per outcome, so a burst that
+# fills the buffer does not print a line per request.
+BATCH_WRITER_REPORT_SECONDS = 60
+
+BATCH_WRITER_ROWS = counter(
+    "batch_writer_rows_total",
+    "Rows handled by background batch writers, by writer and outcome.",
+    ("writer", "outcome"),
+)
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+class BatchInsertWriter:
+    """
+    Buffers row dicts for `model` and writes them from a daemon thread, one
+    multi-row INSERT per batch of up to `batch_size` rows or every
+    `flush_seconds`, whichever comes first. Batches the database rejects,
+    and rows that do not fit in the buffer, are appended to
+    `fallback_path` as JSON lines when one is set and dropped otherwise.
+    With `sync=True` every submit is written before returning.
+    """
+
+    def __init__(
+        self,
+        app,
+        model,
+        name,
+        batch_size=200,
+        flush_seconds=2,
+        queue_size=10000,
+        fallback_path=None,
+        sync=False,
+    ):
+        self.app = app
+        self.model = model
+        self.name = name
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.fallback_path = fallback_path
+        self.sync = sync
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._fallback_lock = threading.Lock()
+        self._report_lock = threading.Lock()
+        # outcome -> (monotonic time of the last log line, rows not yet logged)
+        self._reports = {}
+        self._started = False
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._run, name=self.name, daemon=True).start()
+        atexit.register(self.flush)
+
+    def submit(self, rows):
+        if not rows:
+            return
+
+        if self.sync:
+            self._write_or_spill(list(rows))
+            return
+
+        self.start()
+        overflow = []
+        for row in rows:
+            try:
+                self._queue.put_nowait(row)
+            except queue.Full:
+                overflow.append(row)
+        if overflow:
+            self._spill(overflow, "buffer full")
+
+    def flush(self):
+        """Writes whatever is buffered right now on the calling thread."""
+        rows = []
+        while True:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        for start in range(0, len(rows), self.batch_size):
+            with self.app.app_context():
+                self._write_or_spill(rows[start : start + self.batch_size])
+
+    def _drain(self):
+        rows = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_seconds
+        while len(rows) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                rows.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return rows
+
+    def _run(self):
+        while True:
+            rows = self._drain()
+            with self.app.app_context():
+                self._write_or_spill(rows)
+
+    def _write_or_spill(self, rows):
+        try:
+            self.write(rows)
+            BATCH_WRITER_ROWS.inc(len(rows), writer=self.name, outcome="written")
+        except Exception as e:
+            self._spill(rows, e)
+
+    def write(self, rows):
+        with Session(db.engine) as session:
+            session.execute(insert(self.model), rows)
+            session.commit()
+
+    def _report(self, outcome, count, describe):
+        """
+        Logs `describe(rows)` for this outcome unless it was logged within
+        BATCH_WRITER_REPORT_SECONDS; rows in between are summed into the
+        next line.
+        """
+        now = time.monotonic()
+        with self._report_lock:
+            reported_at, pending = self._reports.get(outcome, (None, 0))
+            pending += count
+            if reported_at is not None and now - reported_at < BATCH_WRITER_REPORT_SECONDS:
+                self._reports[outcome] = (reported_at, pending)
+                return
+            self._reports[outcome] = (now, 0)
+        print(describe(pending))
+
+    def _spill(self, rows, error):
+        if not self.fallback_path:
+            BATCH_WRITER_ROWS.inc(len(rows), writer=self.name, outcome="dropped")
+            self._report(
+                "dropped", len(rows), lambda n: f"[{self.name}] Dropped {n} rows: {error}"
+            )
+            return
+
+        try:
+            directory = os.path.dirname(self.fallback_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self._fallback_lock, open(self.fallback_path, "a", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(json.dumps(row, default=_json_default) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            BATCH_WRITER_ROWS.inc(len(rows), writer=self.name, outcome="spilled")
+            self._report(
+                "spilled",
+                len(rows),
+                lambda n: f"[{self.name}] Wrote {n} rows to {self.fallback_path}: {error}",
+            )
+        except Exception as e:
+            BATCH_WRITER_ROWS.inc(len(rows), writer=self.name, outcome="dropped")
+            self._report(
+                "lost",
+                len(rows),
+                lambda n: f"[{self.name}] Lost {n} rows ({error}); fallback failed: {e}",
+            )
@@ -0,0 +1,188 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+_PENDING_INVALIDATIONS = "cache_invalidations"
+
+_caches = {}
+_redis_client = None
+
+
+def _key_to_str(key):
+    if isinstance(key, tuple):
+        return ":".join(str(part) for part in key)
+    return str(key)
+
+
+class MemoryCache:
+    """
+    Per-process LRU cache with a size cap and per-entry TTL. Safe to share
+    between request threads.
+    """
+
+    def __init__(self, name, max_entries=1024, ttl_seconds=30):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl_seconds=None):
+        expires_at = time.monotonic() + (ttl_seconds or self.ttl_seconds)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        return {"hits": self.hits, "misses": self.misses, "size": size}
+
+
+class RedisCache:
+    """
+    Cache shared by every worker through a Redis-protocol server. Values
+    must be JSON serialisable. Any redis-py compatible client works,
+    including fakeredis.FakeRedis() for local runs.
+    """
+
+    def __init__(self, name, client, ttl_seconds=30):
+        self.name = name
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+    def _redis_key(self, key):
+        return f"cache:{self.name}:{_key_to_str(key)}"
+
+    def get(self, key):
+        raw = self.client.get(self._redis_key(key))
+        if raw is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return json.loads(raw)
+
+    def set(self, key, value, ttl_seconds=None):
+        self.client.set(
+            self._redis_key(key),
+            json.dumps(value),
+            ex=int(ttl_seconds or self.ttl_seconds),
+        )
+
+    def delete(self, key):
+        self.client.delete(self._redis_key(key))
+
+    def clear(self):
+        for redis_key in self.client.scan_iter(match=f"cache:{self.name}:*"):
+            self.client.delete(redis_key)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": None}
+
+
+def get_redis_client():
+    """
+    Returns the client installed with set_redis_client, else a shared client
+    for REDIS_URL, or None when neither is configured. redis-py is only
+    needed when REDIS_URL is set.
+    """
+    global _redis_client
+
+    if _redis_client is not None:
+        return _redis_client
+
+    redis_url = os.environ.get("REDIS_URL")
+    if not redis_url:
+        return None
+
+    import redis
+
+    _redis_client = redis.Redis.from_url(redis_url)
+    return _redis_client
+
+
+def set_redis_client(client):
+    """
+    Points shared backends at an explicit client, e.g. a fakeredis instance.
+    Caches and stores pick their backend when they are built, so install it
+    before create_app() imports the modules that build them.
+    """
+    global _redis_client
+    _redis_client = client
+
+
+def create_cache(name, max_entries=1024, ttl_seconds=30, shared=True):
+    """
+    Builds a named cache: Redis-backed when REDIS_URL is configured and the
+    cache is `shared`, otherwise an in-process LRU. Every cache is kept in
+    a registry so its hit/miss counters can be reported.
+    """
+    client = get_redis_client() if shared else None
+
+    if client is not None:
+        cache = RedisCache(name, client, ttl_seconds=ttl_seconds)
+    else:
+        cache = MemoryCache(name, max_entries=max_entries, ttl_seconds=ttl_seconds)
+
+    _caches[name] = cache
+    return cache
+
+
+def all_caches():
+    return dict(_caches)
+
+
+def invalidate_on_commit(session, cache, key):
+    """
+    Drops `key` now and again once the session commits, so a reader that
+    repopulated the entry from pre-commit data cannot leave it stale.
+    """
+    cache.delete(key)
+    if session is not None:
+        session.info.setdefault(_PENDING_INVALIDATIONS, []).append((cache, key))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending_invalidations(session):
+    for cache, key in session.info.pop(_PENDING_INVALIDATIONS, []):
+        cache.delete(key)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_invalidations(session):
+    session.info.pop(_PENDING_INVALIDATIONS, None)
@@ -1,8 +1,7 @@
-import smtplib
 import os
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.utils import formataddr
+
+from app.utils.email_templates import render_email
+from app.utils.mail_dispatcher import queue_email, queue_emails
 
 
 def send_otp_email(recipient_email, otp_code, guardian_name=None):
@@ -11,108 +10,28 @@ def send_otp_email(recipient_email, otp_code, guardian_name=None):
     """
     try:
         # Email configuration from environment variables
-        smtp_server = os.environ.get("MAIL_SERVER", "smtp.gmail.com")
-        smtp_port = int(os.environ.get("MAIL_PORT", 587))
         email_username = os.environ.get("MAIL_USERNAME", "")
         email_password = os.environ.get("MAIL_PASSWORD", "")
-        sender_name = os.environ.get("MAIL_SENDER_NAME", "iCane Smart Cane")
 
         # If credentials are missing, fail explicitly so API can surface a real error.
         if not email_username or not email_password:
             print("OTP EMAIL failed: MAIL_USERNAME/MAIL_PASSWORD not configured")
             return False
 
-        # Create message
-        msg = MIMEMultipart("alternative")
-        msg["Subject"] = "Verify Your Email - iCane Smart Cane"
-        msg["From"] = formataddr((sender_name, email_username))
-        msg["To"] = recipient_email
-
-        # HTML email content
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="utf-8">
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background: #1C253C; color: white; padding: 20px; text-align: center; }}
-                .content {{ background: #f9f9f9; padding: 30px; }}
-                .otp-code {{ 
-                    font-size: 32px; 
-                    font-weight: bold; 
-                    text-align: center; 
-                    color: #1C253C;
-                    letter-spacing: 5px;
-                    margin: 20px 0;
-                    padding: 15px;
-                    background: white;
-                    border-radius: 8px;
-                    border: 2px dashed #1C253C;
-                }}
-                .footer {{ 
-                    background: #ddd; 
-                    padding: 15px; 
-                    text-align: center; 
-                    font-size: 12px; 
-                    color: #666;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>iCane: Smart Cane</h1>
-                </div>
-                <div class="content">
-                    <h2>Email Verification</h2>
-                    <p>Hello {guardian_name or 'User'},</p>
-                    <p>Please use the following verification code to complete your registration:</p>
-                    
-                    <div class="otp-code">{otp_code}</div>
-                    
-                    <p>This verification code will expire in <strong>10 minutes</strong>.</p>
-                    
-                    <p>If you didn't request this code, please ignore this email.</p>
-                    
-                    <p>Best regards,<br>iCane Smart Cane Team</p>
-                </div>
-                <div class="footer">
-                    <p>&copy; 2024 iCane Smart Cane. All rights reserved.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-
-        # Plain text fallback
-        text_content = f"""
-        iCane: Smart Cane - Email Verification
-        
-        Hello {guardian_name or 'User'},
-        
-        Your verification code is: {otp_code}
-        
-        This code will expire in 10 minutes.
-        
-        If you didn't request this code, please ignore this email.
-        
-        Best regards,
-        iCane Smart Cane Team
-        """
-
-        # Attach both HTML and plain text versions
-        msg.attach(MIMEText(text_content, "plain"))
-        msg.attach(MIMEText(html_content, "html"))
-
-        # Send email
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()  # Secure the connection
-            server.login(email_username, email_password)
-            server.send_message(msg)
-
-        print(f" OTP email sent successfully to {recipient_email}")
+        rendered = render_email("otp", guardian_name=guardian_name, otp_code=otp_code)
+
+        # Delivered by the background mail dispatcher
+        queued = queue_email(
+            recipient=recipient_email,
+            subject=rendered.subject,
+            html_body=rendered.html,
+            text_body=rendered.text,
+            template="otp",
+        )
+        if not queued:
+            return False
+
+        print(f" OTP email queued for {recipient_email}")
         return True
 
     except Exception as e:
@@ -147,97 +66,114 @@ def send_guardian_invite_email(
     """
     try:
         # Email configuration from environment variables
-        smtp_server = os.environ.get("MAIL_SERVER", "smtp.gmail.com")
-        smtp_port = int(os.environ.get("MAIL_PORT", 587))
         email_username = os.environ.get("MAIL_USERNAME", "")
         email_password = os.environ.get("MAIL_PASSWORD", "")
-        sender_name = os.environ.get("MAIL_SENDER_NAME", "iCane Smart Cane")
 
         # If credentials are missing, fail explicitly so API can surface a real error.
         if not email_username or not email_password:
             print("GUARDIAN INVITE failed: MAIL_USERNAME/MAIL_PASSWORD not configured")
             return False
 
-        # Create message
-        msg = MIMEMultipart("alternative")
-        msg["Subject"] = f"VIP Guardian Invitation - {vip_name or ''}".strip()
-        msg["From"] = formataddr((sender_name, email_username))
-        msg["To"] = recipient_email
-
-        # HTML content
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="utf-8">
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background: #1C253C; color: white; padding: 20px; text-align: center; }}
-                .content {{ background: #f9f9f9; padding: 30px; border-radius: 8px; }}
-                .button {{
-                    display: inline-block;
-                    padding: 12px 20px;
-                    margin: 20px 0;
-                    background-color: #2ECC71;
-                    color: white;
-                    font-weight: bold;
-                    text-decoration: none;
-                    border-radius: 6px;
-                }}
-                .footer {{ background: #ddd; padding: 15px; text-align: center; font-size: 12px; color: #666; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>iCane: Smart Cane</h1>
-                </div>
-                <div class="content">
-                    <h2>Hello {guardian_name or 'Guardian'},</h2>
-                    <p>You have been invited to become a guardian for VIP {vip_name or '—'}.</p>
-                    <p>Click the button below to accept the invitation:</p>
-                    <a href="{invite_link}" class="button">Accept Invitation</a>
-                    <p>If the button doesn't work, copy and paste this link into your browser:</p>
-                    <p><a href="{invite_link}">{invite_link}</a></p>
-                    <p>If you did not expect this invitation, you can safely ignore this email.</p>
-                    <p>Best regards,<br>iCane Smart Cane Team</p>
-                </div>
-                <div class="footer">
-                    <p>&copy; 2026 iCane Smart Cane. All rights reserved.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-
-        # Plain text fallback
-        text_content = f"""
-        Hello {guardian_name or 'Guardian'},
-
-        You have been invited to become a guardian for VIP {vip_name or '—'}.
-
-        Accept the invitation by clicking this link: {invite_link}
-
-        If you did not expect this invitation, you can ignore this email.
-
-        Best regards,
-        {sender_name or 'iCane Smart Cane Team'}
-        """
-
-        # Attach both
-        msg.attach(MIMEText(text_content, "plain"))
-        msg.attach(MIMEText(html_content, "html"))
-
-        # Send email via SMTP
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(email_username, email_password)
-            server.send_message(msg)
-
-        print(f"Guardian invite email sent successfully to {recipient_email}")
+        rendered = render_email(
+            "guardian_invite",
+            guardian_name=guardian_name,
+            vip_name=vip_name,
+            invite_link=invite_link,
+        )
+
+        # Delivered by the background mail dispatcher
+        queued = queue_email(
+            recipient=recipient_email,
+            subject=rendered.subject,
+            html_body=rendered.html,
+            text_body=rendered.text,
+            template="guardian_invite",
+        )
+        if not queued:
+            return False
+
+        print(f"Guardian invite email queued for {recipient_email}")
         return True
 
     except Exception as e:
         print(f"[EMAIL ERROR] Failed to send guardian invite to {recipient_email}: {e}")
         return False
+
+
+def send_guardian_invite_emails(invites, guardian_name=None, vip_name=None):
+    """
+    Send several VIP Guardian invitations as one outbox batch, delivered
+    over a single SMTP session. `invites` is a list of
+    (recipient_email, invite_link) pairs. Returns {recipient_email: bool}.
+    """
+    recipients = [recipient_email for recipient_email, _ in invites]
+    try:
+        email_username = os.environ.get("MAIL_USERNAME", "")
+        email_password = os.environ.get("MAIL_PASSWORD", "")
+
+        if not email_username or not email_password:
+            print("GUARDIAN INVITE failed: MAIL_USERNAME/MAIL_PASSWORD not configured")
+            return dict.fromkeys(recipients, False)
+
+        messages = []
+        for recipient_email, invite_link in invites:
+            rendered = render_email(
+                "guardian_invite",
+                guardian_name=guardian_name,
+                vip_name=vip_name,
+                invite_link=invite_link,
+            )
+            messages.append(
+                {
+                    "recipient": recipient_email,
+                    "subject": rendered.subject,
+                    "html_body": rendered.html,
+                    "text_body": rendered.text,
+                    "template": "guardian_invite",
+                }
+            )
+
+        results = dict(zip(recipients, queue_emails(messages)))
+        print(f"Guardian invite emails queued for {len(messages)} recipients")
+        return results
+
+    except Exception as e:
+        print(f"[EMAIL ERROR] Failed to send guardian invites to {recipients}: {e}")
+        return dict.fromkeys(recipients, False)
+
+
+def send_emergency_alert_emails(contacts, alert):
+    """
+    Queue an emergency alert email for each emergency contact as one outbox
+    batch. `contacts` is a list of {"email", "name"} dicts and `alert` holds
+    the template fields. Returns {recipient_email: bool}.
+    """
+    recipients = [contact["email"] for contact in contacts]
+    try:
+        email_username = os.environ.get("MAIL_USERNAME", "")
+        email_password = os.environ.get("MAIL_PASSWORD", "")
+
+        if not email_username or not email_password:
+            print("EMERGENCY ALERT EMAIL failed: MAIL_USERNAME/MAIL_PASSWORD not configured")
+            return dict.fromkeys(recipients, False)
+
+        messages = []
+        for contact in contacts:
+            rendered = render_email(
+                "emergency_alert", guardian_name=contact["name"], **alert
+            )
+            messages.append(
+                {
+                    "recipient": contact["email"],
+                    "subject": rendered.subject,
+                    "html_body": rendered.html,
+                    "text_body": rendered.text,
+                    "template": "emergency_alert",
+                }
+            )
+
+        return dict(zip(recipients, queue_emails(messages)))
+
+    except Exception as e:
+        print(f"[EMAIL ERROR] Failed to send emergency alert to {recipients}: {e}")
+        return dict.fromkeys(recipients, False)
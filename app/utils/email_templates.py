@@ -0,0 +1,416 @@
+"""
+Email templates compiled once from a single block-based source into both
+an HTML and a plain-text body. Compilation renders every static part (the
+layout, CSS and literal copy) up front and leaves only a list of literal
+segments and field names, so sending an email is a join over a handful of
+strings.
+"""
+
+import html
+import re
+from collections import namedtuple
+
+
+RenderedEmail = namedtuple("RenderedEmail", ["subject", "html", "text"])
+
+_FIELD = re.compile(r"\$\{(\w+)\}")
+_BOLD = re.compile(r"\*\*(.+?)\*\*")
+_CONTENT_SLOT = "<!--content-->"
+
+_CLASSIC_CSS = """
+        body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
+        .container { max-width: 600px; margin: 0 auto; padding: 20px; }
+        .header { background: #1C253C; color: white; padding: 20px; text-align: center; }
+        .content { background: #f9f9f9; padding: 30px; }
+        .otp-code {
+            font-size: 32px;
+            font-weight: bold;
+            text-align: center;
+            color: #1C253C;
+            letter-spacing: 5px;
+            margin: 20px 0;
+            padding: 15px;
+            background: white;
+            border-radius: 8px;
+            border: 2px dashed #1C253C;
+        }
+        .button {
+            display: inline-block;
+            padding: 12px 20px;
+            margin: 20px 0;
+            background-color: #2ECC71;
+            color: white;
+            font-weight: bold;
+            text-decoration: none;
+            border-radius: 6px;
+        }
+        .warning {
+            color: #ff6b6b;
+            background: #fff5f5;
+            padding: 10px;
+            border-radius: 5px;
+            border-left: 4px solid #ff6b6b;
+            margin: 15px 0;
+        }
+        .footer { background: #ddd; padding: 15px; text-align: center; font-size: 12px; color: #666; }
+"""
+
+_GUARDIAN_CSS = """
+        body {
+            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+            line-height: 1.6;
+            color: #333;
+            margin: 0;
+            padding: 0;
+            background-color: #f5f7fa;
+        }
+        .container { max-width: 600px; margin: 0 auto; background-color: #ffffff; }
+        .header {
+            background: linear-gradient(135deg, #11285A 0%, #1a3a7a 100%);
+            padding: 30px;
+            text-align: center;
+            border-radius: 10px 10px 0 0;
+        }
+        .header h1 { color: white; margin: 0; font-size: 24px; font-weight: 600; }
+        .content { padding: 40px 30px; }
+        .otp-code {
+            font-size: 42px;
+            font-weight: 700;
+            color: #11285A;
+            letter-spacing: 8px;
+            margin: 30px 0;
+            padding: 25px;
+            text-align: center;
+            font-family: 'Courier New', monospace;
+            background: linear-gradient(135deg, #f8f9fa 0%, #e9ecef 100%);
+            border-radius: 12px;
+            border: 2px solid #e0e7ff;
+        }
+        .instructions { color: #666; font-size: 14px; line-height: 1.5; margin-bottom: 25px; }
+        .warning {
+            background-color: #fff3cd;
+            border: 1px solid #ffeaa7;
+            border-radius: 8px;
+            padding: 15px;
+            margin: 20px 0;
+            color: #856404;
+            font-size: 13px;
+        }
+        .footer {
+            background-color: #f8f9fa;
+            padding: 25px 30px;
+            text-align: center;
+            border-top: 1px solid #e9ecef;
+            border-radius: 0 0 10px 10px;
+            color: #6c757d;
+            font-size: 12px;
+        }
+"""
+
+THEMES = {
+    "classic": {
+        "css": _CLASSIC_CSS,
+        "brand": "iCane: Smart Cane",
+        "footer_html": "<p>&copy; 2026 iCane Smart Cane. All rights reserved.</p>",
+        "footer_text": [],
+    },
+    "guardian": {
+        "css": _GUARDIAN_CSS,
+        "brand": "Smart Cane Guardian",
+        "footer_html": (
+            "<p><strong>Smart Cane</strong></p>"
+            "<p>Enhancing mobility and safety for visually impaired individuals</p>"
+            "<p>Need help? Contact our support team at iCane2026@gmail.com</p>"
+            "<p>This is an automated message, please do not reply to this email.</p>"
+            "<p>&copy; 2026 Smart Cane. All rights reserved.</p>"
+        ),
+        "footer_text": [
+            "Need help? Contact our support team at iCane2026@gmail.com",
+            "This is an automated message, please do not reply to this email.",
+            "© 2026 Smart Cane. All rights reserved.",
+        ],
+    },
+}
+
+
+def _edit_otp_blocks(action_text):
+    return [
+        ("paragraph", "Hello **${guardian_name}**,"),
+        (
+            "paragraph",
+            f"You have requested to {action_text} for your Smart Cane Guardian account.",
+        ),
+        ("paragraph", "To complete this request, please use the verification code below:"),
+        ("code", "Verification Code", "${otp_code}"),
+        ("paragraph", "This code will expire in **5 minutes**."),
+        (
+            "steps",
+            "How to use this code:",
+            [
+                "Go back to your Smart Cane Guardian app",
+                "Enter the 6-digit code shown above",
+                'Click "Verify" to complete the process',
+            ],
+        ),
+        (
+            "notice",
+            "Important Security Notice",
+            [
+                "Never share this code with anyone",
+                "If you didn't request this change, please secure your account",
+                "This code will expire in 5 minutes for security reasons",
+            ],
+        ),
+    ]
+
+
+# Each template is one source for both bodies. Copy may use ${field}
+# placeholders and **bold**; values are HTML-escaped when rendered. "title"
+# and "html_only" blocks are left out of the text body.
+TEMPLATE_SOURCES = {
+    "otp": {
+        "theme": "classic",
+        "subject": "Verify Your Email - iCane Smart Cane",
+        "title": "Email Verification",
+        "defaults": {"guardian_name": "User"},
+        "blocks": [
+            ("title", "Email Verification"),
+            ("paragraph", "Hello ${guardian_name},"),
+            (
+                "paragraph",
+                "Please use the following verification code to complete your registration:",
+            ),
+            ("code", "Your verification code is", "${otp_code}"),
+            ("paragraph", "This verification code will expire in **10 minutes**."),
+            ("paragraph", "If you didn't request this code, please ignore this email."),
+            ("signoff",),
+        ],
+    },
+    "password_reset": {
+        "theme": "classic",
+        "subject": "Password Reset - iCane Smart Cane",
+        "title": "Password Reset",
+        "defaults": {"guardian_name": "User"},
+        "blocks": [
+            ("title", "Password Reset Request"),
+            ("paragraph", "Hello ${guardian_name},"),
+            (
+                "paragraph",
+                "You have requested to reset your password. "
+                "Please use the following verification code:",
+            ),
+            ("code", "Your verification code is", "${otp_code}"),
+            ("paragraph", "This verification code will expire in **5 minutes**."),
+            (
+                "notice",
+                "Important",
+                [
+                    "If you didn't request a password reset, please ignore this "
+                    "email and ensure your account is secure."
+                ],
+            ),
+            ("signoff",),
+        ],
+    },
+    "guardian_invite": {
+        "theme": "classic",
+        "subject": "VIP Guardian Invitation - ${vip_name}",
+        "subject_defaults": {"vip_name": ""},
+        "title": "Guardian Invitation",
+        "defaults": {"guardian_name": "Guardian", "vip_name": "—"},
+        "blocks": [
+            ("heading", "Hello ${guardian_name},"),
+            (
+                "paragraph",
+                "You have been invited to become a guardian for VIP ${vip_name}.",
+            ),
+            ("button", "Accept Invitation", "${invite_link}"),
+            (
+                "html_only",
+                "<p>If the button doesn't work, copy and paste this link into "
+                'your browser:</p>\n<p><a href="${invite_link}">${invite_link}</a></p>',
+            ),
+            (
+                "paragraph",
+                "If you did not expect this invitation, you can safely ignore this email.",
+            ),
+            ("signoff",),
+        ],
+    },
+    "emergency_alert": {
+        "theme": "classic",
+        "subject": "${alert_label} - ${vip_name}",
+        "subject_defaults": {"vip_name": "iCane"},
+        "title": "Emergency Alert",
+        "defaults": {"guardian_name": "Guardian", "vip_name": "your VIP"},
+        "blocks": [
+            ("title", "${alert_label}"),
+            ("paragraph", "Hello ${guardian_name},"),
+            (
+                "paragraph",
+                "The iCane **${device_serial_number}** used by ${vip_name} "
+                "reported: ${message}",
+            ),
+            ("paragraph", "Reported at: **${triggered_at}**"),
+            ("paragraph", "Last known location: **${location}**"),
+            (
+                "notice",
+                "Act now",
+                ["Please check on ${vip_name} or contact them immediately."],
+            ),
+            ("signoff",),
+        ],
+    },
+    "email_change_otp": {
+        "theme": "guardian",
+        "subject": "Verify Your New Email Address - iCane",
+        "title": "Email Verification",
+        "defaults": {"guardian_name": "Guardian"},
+        "blocks": _edit_otp_blocks("change your email address"),
+    },
+    "profile_update_otp": {
+        "theme": "guardian",
+        "subject": "Verify Your Profile Update - iCane",
+        "title": "Email Verification",
+        "defaults": {"guardian_name": "Guardian"},
+        "blocks": _edit_otp_blocks("update your profile"),
+    },
+}
+
+
+def _inline_html(copy):
+    return _BOLD.sub(r"<strong>\1</strong>", html.escape(copy, quote=False))
+
+
+def _inline_text(copy):
+    return _BOLD.sub(r"\1", copy)
+
+
+def _block_html(block):
+    kind = block[0]
+    if kind in ("title", "heading"):
+        return f"<h2>{_inline_html(block[1])}</h2>"
+    if kind == "paragraph":
+        return f"<p>{_inline_html(block[1])}</p>"
+    if kind == "code":
+        return f'<div class="otp-code">{block[2]}</div>'
+    if kind == "button":
+        return f'<p><a href="{block[2]}" class="button">{_inline_html(block[1])}</a></p>'
+    if kind == "steps":
+        items = "".join(f"<li>{_inline_html(item)}</li>" for item in block[2])
+        return (
+            f'<div class="instructions"><p><strong>{_inline_html(block[1])}</strong></p>'
+            f"<ol>{items}</ol></div>"
+        )
+    if kind == "notice":
+        lines = "<br>".join(_inline_html(line) for line in block[2])
+        return (
+            f'<div class="warning"><p><strong>{_inline_html(block[1])}:</strong> '
+            f"{lines}</p></div>"
+        )
+    if kind == "signoff":
+        return "<p>Best regards,<br>iCane Smart Cane Team</p>"
+    if kind == "html_only":
+        return block[1]
+    raise ValueError(f"Unknown email block type: {kind}")
+
+
+def _block_text(block):
+    kind = block[0]
+    if kind in ("heading", "paragraph"):
+        return _inline_text(block[1])
+    if kind == "code":
+        return f"{block[1]}: {block[2]}"
+    if kind == "button":
+        return f"{_inline_text(block[1])}: {block[2]}"
+    if kind == "steps":
+        steps = [f"{index}. {_inline_text(item)}" for index, item in enumerate(block[2], 1)]
+        return "\n".join([_inline_text(block[1])] + steps)
+    if kind == "notice":
+        lines = [f"• {_inline_text(line)}" for line in block[2]]
+        return "\n".join([f"{_inline_text(block[1])}:"] + lines)
+    if kind == "signoff":
+        return "Best regards,\niCane Smart Cane Team"
+    if kind in ("title", "html_only"):
+        # The text body opens with the template title already.
+        return None
+    raise ValueError(f"Unknown email block type: {kind}")
+
+
+def _html_shell(theme):
+    return (
+        "<!DOCTYPE html>\n<html>\n<head>\n"
+        '    <meta charset="utf-8">\n'
+        f"    <style>{theme['css']}    </style>\n"
+        "</head>\n<body>\n"
+        '    <div class="container">\n'
+        f'        <div class="header"><h1>{theme["brand"]}</h1></div>\n'
+        f'        <div class="content">\n{_CONTENT_SLOT}\n        </div>\n'
+        f'        <div class="footer">{theme["footer_html"]}</div>\n'
+        "    </div>\n</body>\n</html>\n"
+    )
+
+
+def _split(source):
+    """Splits a compiled body into (literals, fields) around ${field} slots."""
+    parts = _FIELD.split(source)
+    return tuple(parts[0::2]), tuple(parts[1::2])
+
+
+def _fill(segments, values):
+    literals, fields = segments
+    out = [literals[0]]
+    for field, literal in zip(fields, literals[1:]):
+        out.append(values[field])
+        out.append(literal)
+    return "".join(out)
+
+
+class CompiledTemplate:
+    def __init__(self, name, source):
+        theme = THEMES[source["theme"]]
+        blocks = source["blocks"]
+
+        html_body = _html_shell(theme).replace(
+            _CONTENT_SLOT,
+            "\n".join(f"            {_block_html(block)}" for block in blocks),
+        )
+        text_parts = [f"{theme['brand']} - {source['title']}"]
+        text_parts += [part for part in map(_block_text, blocks) if part]
+        text_parts += theme["footer_text"]
+
+        self.name = name
+        self.defaults = dict(source.get("defaults", {}))
+        self.subject_defaults = {**self.defaults, **source.get("subject_defaults", {})}
+        self._subject = _split(source["subject"])
+        self._html = _split(html_body)
+        self._text = _split("\n\n".join(text_parts) + "\n")
+        self.fields = frozenset(self._subject[1] + self._html[1] + self._text[1])
+
+    def _values(self, defaults, values):
+        merged = dict(defaults)
+        merged.update((key, value) for key, value in values.items() if value is not None)
+        missing = self.fields - merged.keys()
+        if missing:
+            raise KeyError(
+                f"Email template {self.name} is missing {', '.join(sorted(missing))}"
+            )
+        return {field: str(merged[field]) for field in self.fields}
+
+    def render(self, **values):
+        plain = self._values(self.defaults, values)
+        escaped = {field: html.escape(value) for field, value in plain.items()}
+        subject_values = self._values(self.subject_defaults, values)
+        return RenderedEmail(
+            subject=_fill(self._subject, subject_values).strip(" -"),
+            html=_fill(self._html, escaped),
+            text=_fill(self._text, plain),
+        )
+
+
+TEMPLATES = {name: CompiledTemplate(name, source) for name, source in TEMPLATE_SOURCES.items()}
+
+
+def render_email(name, **values):
+    """Renders template `name`; returns RenderedEmail(subject, html, text)."""
+    return TEMPLATES[name].render(**values)
@@ -0,0 +1,672 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from sqlalchemy import event, inspect, update
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import (
+    VIP,
+    Device,
+    DeviceGuardian,
+    DeviceLog,
+    EmergencyAlert,
+    Guardian,
+)
+from app.utils.cache import create_cache
+from app.utils.email_service import send_emergency_alert_emails
+from app.utils.location_stream import get_broker
+from app.utils.locations import parse_location_fix
+from app.utils.metrics import counter, histogram
+
+
+# activity_type -> (push event type, headline, default message). These are
+# the event types the hardware and seed_emergency_logs.py already use.
+EMERGENCY_TYPES = {
+    "EMERGENCY": (
+        "emergency",
+        "Emergency Alert",
+        "SOS button was pressed. Immediate assistance required.",
+    ),
+    "SOS": ("emergency", "SOS Alert", "SOS alert triggered from iCane device."),
+    "LIVE_EMERGENCY": (
+        "emergency",
+        "Emergency Alert",
+        "Emergency alert received via live WebSocket stream.",
+    ),
+    "FALL": ("fall", "Fall Detected", "Fall detected by accelerometer sensor."),
+    "FALL_DETECTED": (
+        "fall",
+        "Fall Detected",
+        "Sudden impact detected. Possible fall event.",
+    ),
+    "LIVE_FALL": (
+        "fall",
+        "Fall Detected",
+        "Live fall detection triggered from hardware sensor.",
+    ),
+}
+
+EMERGENCY_FANOUT_WORKERS = int(os.environ.get("EMERGENCY_FANOUT_WORKERS", 4))
+# The index is rebuilt every CONTACT_INDEX_REFRESH_SECONDS and cleared when
+# this process commits a change to a device link, guardian or VIP; the TTL
+# only bounds how long another worker's change can go unseen without Redis.
+CONTACT_INDEX_REFRESH_SECONDS = 300
+CONTACT_INDEX_TTL_SECONDS = 2 * CONTACT_INDEX_REFRESH_SECONDS
+# Repeats of the same kind of alert from one device within this many seconds
+# of the previous report fold into the open alert instead of raising a new one.
+EMERGENCY_DEDUPE_WINDOW_SECONDS = int(os.environ.get("EMERGENCY_DEDUPE_WINDOW_SECONDS", 120))
+EMERGENCY_DEDUPE_FLUSH_SECONDS = 5
+# A repeat that arrives while the first report is still being committed
+# waits this long for its alert_id before being treated as a new alert.
+EMERGENCY_DEDUPE_PENDING_WAIT_SECONDS = 2
+
+# to_status -> statuses it may be reached from.
+ALERT_TRANSITIONS = {
+    "notified": ("triggered",),
+    "acknowledged": ("triggered", "notified"),
+}
+
+_CONTACT_INDEX_STALE = "emergency_contacts_stale"
+
+contact_index = create_cache(
+    "emergency_contacts", max_entries=50000, ttl_seconds=CONTACT_INDEX_TTL_SECONDS
+)
+# alert_id -> True for recently acknowledged alerts, so with Redis every
+# worker closes its window on the next repeat instead of the next flush.
+acknowledged_alerts = create_cache(
+    "emergency_acknowledged",
+    max_entries=10000,
+    ttl_seconds=max(EMERGENCY_DEDUPE_WINDOW_SECONDS, EMERGENCY_DEDUPE_FLUSH_SECONDS),
+)
+
+EMERGENCY_INGEST_SECONDS = histogram(
+    "emergency_ingest_seconds",
+    "Time from receiving an emergency report to committing its alert.",
+)
+EMERGENCY_REPORTS = counter(
+    "emergency_reports_total",
+    "Emergency reports received, by outcome (alert, deduplicated).",
+    ("outcome",),
+)
+EMERGENCY_FANOUT_SECONDS = histogram(
+    "emergency_fanout_seconds",
+    "Time from receiving an emergency report to finishing each notification channel.",
+    ("channel",),
+)
+
+
+def parse_emergency_report(data):
+    """
+    Validates a gateway emergency report. Coordinates and recorded_at follow
+    the location batch rules. Raises ValueError with a client-facing message.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Invalid JSON payload")
+
+    alert_type = str(data.get("type") or "").strip().upper()
+    if alert_type not in EMERGENCY_TYPES:
+        raise ValueError(f"type must be one of {', '.join(EMERGENCY_TYPES)}")
+
+    fix = parse_location_fix(data)
+    return {
+        "device_serial_number": fix["device_serial_number"],
+        "alert_type": alert_type,
+        "message": data.get("message") or EMERGENCY_TYPES[alert_type][2],
+        "lat": fix["lat"],
+        "lng": fix["lng"],
+        "location_label": (data.get("location") or None),
+        "triggered_at": fix["recorded_at"],
+    }
+
+
+def _load_contact_entries(serials=None):
+    """
+    {serial: entry} for the given devices (all devices when None), each
+    entry holding the device, its VIP and every linked guardian, read with
+    one joined query.
+    """
+    query = (
+        db.session.query(
+            Device.device_serial_number,
+            Device.device_id,
+            Device.vip_id,
+            VIP.first_name,
+            VIP.last_name,
+            DeviceGuardian.guardian_id,
+            DeviceGuardian.role,
+            DeviceGuardian.is_emergency_contact,
+            Guardian.email,
+            Guardian.first_name,
+            Guardian.last_name,
+        )
+        .outerjoin(VIP, VIP.vip_id == Device.vip_id)
+        .outerjoin(DeviceGuardian, DeviceGuardian.device_id == Device.device_id)
+        .outerjoin(Guardian, Guardian.guardian_id == DeviceGuardian.guardian_id)
+    )
+    if serials is not None:
+        query = query.filter(Device.device_serial_number.in_(list(serials)))
+
+    entries = {}
+    for row in query:
+        entry = entries.get(row[0])
+        if entry is None:
+            entry = entries[row[0]] = {
+                "device_id": row[1],
+                "vip_id": row[2],
+                "vip_name": " ".join(part for part in (row[3], row[4]) if part) or None,
+                "guardians": [],
+            }
+        if row[5] is not None:
+            entry["guardians"].append(
+                {
+                    "guardian_id": row[5],
+                    "role": row[6],
+                    "is_emergency_contact": bool(row[7]),
+                    "email": row[8],
+                    "name": " ".join(part for part in (row[9], row[10]) if part) or None,
+                }
+            )
+    return entries
+
+
+def get_emergency_contacts(device_serial_number):
+    """
+    The contact index entry for a device, or None for an unknown serial.
+    Served from the warm index; a miss costs one query.
+    """
+    entry = contact_index.get(device_serial_number)
+    if entry is None:
+        entry = _load_contact_entries([device_serial_number]).get(device_serial_number)
+        if entry is not None:
+            contact_index.set(device_serial_number, entry)
+    return entry
+
+
+def warm_contact_index():
+    entries = _load_contact_entries()
+    for serial, entry in entries.items():
+        contact_index.set(serial, entry)
+    return len(entries)
+
+
+def email_recipients(entry):
+    """Emergency contacts, or the primary guardian when none is flagged."""
+    guardians = [g for g in entry["guardians"] if g["email"]]
+    contacts = [g for g in guardians if g["is_emergency_contact"]]
+    return contacts or [g for g in guardians if g["role"] == "primary"]
+
+
+def record_emergency(report, entry):
+    """
+    Writes the device log and the alert in one transaction. Returns
+    (alert_id, log_id), read before the commit expires the objects.
+    """
+    log = DeviceLog(
+        device_id=entry["device_id"],
+        activity_type=report["alert_type"],
+        status="triggered",
+        message=report["message"],
+        metadata_json={
+            "payload": {
+                "lat": float(report["lat"]) if report["lat"] is not None else None,
+                "lng": float(report["lng"]) if report["lng"] is not None else None,
+                "location": report["location_label"],
+                "locationLabel": report["location_label"],
+                "source": "device",
+            }
+        },
+    )
+    alert = EmergencyAlert(
+        device_id=entry["device_id"],
+        vip_id=entry["vip_id"],
+        log=log,
+        alert_type=report["alert_type"],
+        message=report["message"],
+        lat=report["lat"],
+        lng=report["lng"],
+        location_label=report["location_label"],
+        triggered_at=report["triggered_at"],
+    )
+    db.session.add(alert)
+    db.session.flush()
+    ids = (alert.alert_id, log.log_id)
+    db.session.commit()
+    return ids
+
+
+def alert_event(alert_id, log_id, report, entry):
+    """camelCase payload shared by the stream, push and API responses."""
+    return {
+        "alertId": alert_id,
+        "logId": log_id,
+        "deviceId": entry["device_id"],
+        "deviceSerialNumber": report["device_serial_number"],
+        "vipId": entry["vip_id"],
+        "vipName": entry["vip_name"],
+        "alertType": report["alert_type"],
+        "title": EMERGENCY_TYPES[report["alert_type"]][1],
+        "message": report["message"],
+        "lat": float(report["lat"]) if report["lat"] is not None else None,
+        "lng": float(report["lng"]) if report["lng"] is not None else None,
+        "locationLabel": report["location_label"],
+        "triggeredAt": report["triggered_at"].isoformat(),
+    }
+
+
+def transition_alert(session, alert_id, to_status, **values):
+    """
+    Moves an alert to `to_status` with one conditional UPDATE, so two
+    guardians acknowledging at once, or a late "notified" racing an
+    acknowledgement, can never move it backwards. Returns True when the row
+    changed; the caller commits.
+    """
+    changed = (
+        session.query(EmergencyAlert)
+        .filter(
+            EmergencyAlert.alert_id == alert_id,
+            EmergencyAlert.status.in_(ALERT_TRANSITIONS[to_status]),
+        )
+        .update({"status": to_status, **values}, synchronize_session=False)
+    )
+    return changed == 1
+
+
+class AlertDeduper:
+    """
+    In-memory dedupe window keyed by (device_id, push event type), so a cane
+    retriggering SOS every few seconds raises one alert with a counter
+    rather than one alert, device log and guardian fan-out per press. The
+    window slides: it stays open while repeats keep arriving within
+    `window` seconds of each other, and closes when the alert is
+    acknowledged.
+
+    Repeats only touch memory. Their count and last trigger time are
+    written by flush() in one batched UPDATE per interval. The window is
+    per process, so with several workers a burst split across them raises
+    at most one alert per worker. An acknowledgement made on another worker
+    closes the window at the next repeat when the acknowledged_alerts marker
+    is shared through Redis, and otherwise at the next flush, which reads
+    the status of every alert with an open window.
+    """
+
+    def __init__(self, window=EMERGENCY_DEDUPE_WINDOW_SECONDS):
+        self.window = window
+        self._open = {}
+        self._keys_by_alert = {}
+        self._unwritten = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _row(entry):
+        return {
+            "alert_id": entry["alert_id"],
+            "trigger_count": entry["count"],
+            "last_triggered_at": entry["last_triggered_at"],
+        }
+
+    def _retire(self, key, entry):
+        # Called with the lock held.
+        del self._open[key]
+        if entry["alert_id"] is not None:
+            self._keys_by_alert.pop(entry["alert_id"], None)
+            if entry["dirty"]:
+                self._unwritten.append(self._row(entry))
+
+    def _forget(self, alert_id):
+        """Ends an alert's window, keeping its unwritten count for flush()."""
+        with self._lock:
+            key = self._keys_by_alert.get(alert_id)
+            entry = self._open.get(key) if key is not None else None
+            if entry is not None and entry["alert_id"] == alert_id:
+                self._retire(key, entry)
+
+    def claim(self, key, triggered_at, now=None):
+        """
+        Returns None when the report opens a new alert; the caller then
+        records it and calls opened() or release(). Otherwise folds the
+        report into the open alert and returns (alert_id, trigger_count).
+        """
+        with self._lock:
+            entry = self._open.get(key)
+            alert_id = entry["alert_id"] if entry is not None else None
+        if alert_id is not None and acknowledged_alerts.get(alert_id):
+            self._forget(alert_id)
+
+        while True:
+            now = now if now is not None else time.monotonic()
+            with self._lock:
+                entry = self._open.get(key)
+                if entry is not None and now - entry["seen_at"] > self.window:
+                    self._retire(key, entry)
+                    entry = None
+                if entry is None:
+                    self._open[key] = {
+                        "alert_id": None,
+                        "ready": threading.Event(),
+                        "seen_at": now,
+                        "count": 1,
+                        "last_triggered_at": triggered_at,
+                        "dirty": False,
+                    }
+                    return None
+
+                if entry["alert_id"] is not None:
+                    entry["seen_at"] = now
+                    entry["count"] += 1
+                    entry["last_triggered_at"] = max(
+                        entry["last_triggered_at"], triggered_at
+                    )
+                    entry["dirty"] = True
+                    return entry["alert_id"], entry["count"]
+
+                ready = entry["ready"]
+
+            # The first report is still being committed.
+            if not ready.wait(EMERGENCY_DEDUPE_PENDING_WAIT_SECONDS):
+                with self._lock:
+                    if self._open.get(key) is entry:
+                        del self._open[key]
+            now = None
+
+    def opened(self, key, alert_id):
+        """
+        Starts the window of a recorded alert. Does nothing when the claim
+        is gone (a waiting repeat gave up on it) or another alert already
+        holds the window.
+        """
+        with self._lock:
+            entry = self._open.get(key)
+            if entry is None or entry["alert_id"] is not None:
+                return
+            entry["alert_id"] = alert_id
+            self._keys_by_alert[alert_id] = key
+        entry["ready"].set()
+
+    def release(self, key):
+        """Drops a claim whose alert could not be recorded."""
+        with self._lock:
+            entry = self._open.pop(key, None)
+        if entry is not None:
+            entry["ready"].set()
+
+    def pending(self, alert_id):
+        """
+        The unflushed (trigger_count, last_triggered_at) of an open alert,
+        or None when nothing is pending for it. The window stays open.
+        """
+        with self._lock:
+            key = self._keys_by_alert.get(alert_id)
+            entry = self._open.get(key) if key is not None else None
+            if entry is None or entry["alert_id"] != alert_id or not entry["dirty"]:
+                return None
+            return entry["count"], entry["last_triggered_at"]
+
+    def close(self, alert_id):
+        """
+        Ends the window of an alert whose acknowledgement has committed, so
+        the next report raises a new one, here and, through the
+        acknowledged_alerts marker, on other workers. Repeats that arrived
+        since pending() was read stay queued for flush().
+        """
+        self._forget(alert_id)
+        acknowledged_alerts.set(alert_id, True)
+
+    def take_dirty(self, now=None):
+        """
+        Returns UPDATE rows for alerts with unwritten repeats and forgets
+        windows that have expired.
+        """
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            rows, self._unwritten = self._unwritten, []
+            for key, entry in list(self._open.items()):
+                if entry["alert_id"] is None:
+                    continue
+                if now - entry["seen_at"] > self.window:
+                    self._retire(key, entry)
+                elif entry["dirty"]:
+                    rows.append(self._row(entry))
+                    entry["dirty"] = False
+            rows.extend(self._unwritten)
+            self._unwritten = []
+        return rows
+
+    def flush(self):
+        """
+        Writes pending repeat counts in one batched UPDATE by primary key,
+        then closes the windows of alerts acknowledged elsewhere. Rows that
+        fail to write are kept for the next flush.
+        """
+        rows = self.take_dirty()
+        with self._lock:
+            open_ids = list(self._keys_by_alert)
+        if not rows and not open_ids:
+            return 0
+        try:
+            with Session(db.engine) as session:
+                if rows:
+                    session.execute(update(EmergencyAlert), rows)
+                acknowledged = []
+                if open_ids:
+                    acknowledged = [
+                        alert_id
+                        for (alert_id,) in session.query(EmergencyAlert.alert_id).filter(
+                            EmergencyAlert.alert_id.in_(open_ids),
+                            EmergencyAlert.status == "acknowledged",
+                        )
+                    ]
+                session.commit()
+        except Exception:
+            with self._lock:
+                self._unwritten.extend(rows)
+            raise
+        for alert_id in acknowledged:
+            self._forget(alert_id)
+        return len(rows)
+
+
+class EmergencyNotifier:
+    """
+    Fans an alert out to guardians once it is committed. Stream subscribers
+    get it inline (an in-process queue put); web push and email run on a
+    small pool of their own so the gateway's request returns as soon as the
+    alert is durable, and a slow SMTP server never delays a push. Those two
+    channels read the recipients afresh rather than from the index entry
+    the alert was raised with, which may predate another worker unlinking
+    a guardian.
+    """
+
+    def __init__(self, app, workers=EMERGENCY_FANOUT_WORKERS):
+        self.app = app
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="emergency-fanout"
+        )
+
+    def notify(self, event, entry, received_at):
+        """
+        The alert moves to "notified" once the push fan-out has finished,
+        whatever its outcome, since the stream has already carried it by then.
+        """
+        get_broker().publish(entry["device_id"], {"event": "emergency", "data": event})
+        EMERGENCY_FANOUT_SECONDS.observe(time.perf_counter() - received_at, channel="stream")
+
+        push = self._executor.submit(self._run, "push", self._push, event, received_at)
+        push.add_done_callback(lambda _: self._mark_notified(event["alertId"]))
+        return [
+            push,
+            self._executor.submit(self._run, "email", self._email, event, received_at),
+        ]
+
+    def _mark_notified(self, alert_id):
+        try:
+            with self.app.app_context(), Session(db.engine) as session:
+                transition_alert(
+                    session,
+                    alert_id,
+                    "notified",
+                    notified_at=datetime.now(timezone.utc).replace(tzinfo=None),
+                )
+                session.commit()
+        except Exception as e:
+            print(f"[emergency] Marking alert {alert_id} notified failed: {e}")
+
+    def _run(self, channel, fn, event, received_at):
+        try:
+            return fn(event)
+        except Exception as e:
+            print(f"[emergency] {channel} fan-out for alert {event['alertId']} failed: {e}")
+        finally:
+            EMERGENCY_FANOUT_SECONDS.observe(
+                time.perf_counter() - received_at, channel=channel
+            )
+
+    def _current_entry(self, event):
+        """The device's contacts as committed now; also refreshes the index."""
+        serial = event["deviceSerialNumber"]
+        with self.app.app_context():
+            entry = _load_contact_entries([serial]).get(serial)
+        if entry is not None:
+            contact_index.set(serial, entry)
+        return entry
+
+    def _push(self, event):
+        sender = self.app.extensions.get("web_push")
+        if sender is None:
+            return None
+        entry = self._current_entry(event)
+        guardian_ids = [g["guardian_id"] for g in entry["guardians"]] if entry else []
+        if not guardian_ids:
+            return None
+
+        who = event["vipName"] or event["deviceSerialNumber"]
+        payload = dict(event, body=f"{who}: {event['message']}")
+        return sender.send_guardian_event(
+            guardian_ids, EMERGENCY_TYPES[event["alertType"]][0], payload
+        )
+
+    def _email(self, event):
+        entry = self._current_entry(event)
+        recipients = email_recipients(entry) if entry else []
+        if not recipients:
+            return None
+
+        if event["lat"] is not None and event["lng"] is not None:
+            location = event["locationLabel"] or f"{event['lat']}, {event['lng']}"
+        else:
+            location = event["locationLabel"] or "Unknown"
+
+        with self.app.app_context():
+            return send_emergency_alert_emails(
+                recipients,
+                {
+                    "alert_label": event["title"],
+                    "vip_name": event["vipName"],
+                    "device_serial_number": event["deviceSerialNumber"],
+                    "message": event["message"],
+                    "triggered_at": event["triggeredAt"].replace("T", " ") + " UTC",
+                    "location": location,
+                },
+            )
+
+
+def _mark_contact_index_stale(session):
+    if session is not None:
+        session.info[_CONTACT_INDEX_STALE] = True
+
+
+@event.listens_for(DeviceGuardian, "after_insert")
+@event.listens_for(DeviceGuardian, "after_update")
+@event.listens_for(DeviceGuardian, "after_delete")
+@event.listens_for(Device, "after_update")
+@event.listens_for(Device, "after_delete")
+@event.listens_for(Guardian, "after_delete")
+def _contact_link_changed(mapper, connection, target):
+    _mark_contact_index_stale(Session.object_session(target))
+
+
+@event.listens_for(Guardian, "after_update")
+@event.listens_for(VIP, "after_update")
+def _contact_details_changed(mapper, connection, target):
+    state = inspect(target)
+    if any(
+        state.attrs[name].history.has_changes()
+        for name in ("email", "first_name", "last_name")
+        if name in state.attrs
+    ):
+        _mark_contact_index_stale(Session.object_session(target))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _contact_bulk_statement(orm_execute_state):
+    # Bulk UPDATE/DELETE statements skip the mapper events above.
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) and (
+        orm_execute_state.bind_mapper is not None
+        and orm_execute_state.bind_mapper.class_ in (DeviceGuardian, Device, Guardian, VIP)
+    ):
+        _mark_contact_index_stale(orm_execute_state.session)
+
+
+@event.listens_for(Session, "after_commit")
+def _clear_stale_contact_index(session):
+    if session.info.pop(_CONTACT_INDEX_STALE, False):
+        contact_index.clear()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_contact_index_flag(session, previous_transaction):
+    session.info.pop(_CONTACT_INDEX_STALE, None)
+
+
+def init_emergency_alerts(app):
+    """
+    Attaches the notifier and the dedupe window, and from the first request
+    keeps the contact index warm, so an alert never waits on the guardian
+    lookup, and flushes repeat counts.
+    """
+    notifier = EmergencyNotifier(app)
+    app.extensions["emergency_notifier"] = notifier
+    deduper = AlertDeduper()
+    app.extensions["emergency_deduper"] = deduper
+
+    state = {"started": False}
+    lock = threading.Lock()
+
+    def warm_forever():
+        while True:
+            try:
+                with app.app_context():
+                    warm_contact_index()
+                    db.session.remove()
+            except Exception as e:
+                print(f"[emergency] Contact index refresh failed: {e}")
+            time.sleep(CONTACT_INDEX_REFRESH_SECONDS)
+
+    def flush_forever():
+        while True:
+            time.sleep(EMERGENCY_DEDUPE_FLUSH_SECONDS)
+            try:
+                with app.app_context():
+                    deduper.flush()
+            except Exception as e:
+                print(f"[emergency] Flushing repeat counts failed: {e}")
+
+    @app.before_request
+    def start_contact_index_refresh():
+        if state["started"]:
+            return
+        with lock:
+            if state["started"]:
+                return
+            state["started"] = True
+        threading.Thread(
+            target=warm_forever, name="emergency-contacts", daemon=True
+        ).start()
+        threading.Thread(
+            target=flush_forever, name="emergency-dedupe", daemon=True
+        ).start()
+
+    return notifier
@@ -1,8 +1,18 @@
+import os
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
 from app import db
 from app.models import AccountHistory
+from app.utils.batch_writer import BatchInsertWriter
 from datetime import datetime, timezone
 
 
+_PENDING_ENTRIES = "audit_entries"
+
+
 def log_action(guardian_id, action, description, device_id=None):
     """
     Logs a guardian action to account_history_tbl.
@@ -10,16 +20,63 @@ def log_action(guardian_id, action, description, device_id=None):
     action: 'CREATE', 'UPDATE', 'DELETE', 'PAIR', 'UNPAIR',
             'INVITE', 'REMOVE_GUARDIAN', 'UPDATE_ROLE', etc.
     description: Human-readable string e.g. "Juan Dela Cruz updated VIP profile for Maria Santos"
+
+    The entry is staged on the current session and handed to the audit
+    writer once that session commits, so it is kept only if the change it
+    describes is, and it never adds an INSERT to the caller's transaction.
     """
     try:
-        entry = AccountHistory(
-            guardian_id=guardian_id,
-            action=action,
-            description=description,
-            device_id=device_id,  # NEW
-            created_at=datetime.now(timezone.utc),
+        # Tie the entry to a transaction so a rollback issued before any
+        # SQL ran still discards it.
+        session = db.session()
+        if not session.in_transaction():
+            session.begin()
+        session.info.setdefault(_PENDING_ENTRIES, []).append(
+            {
+                "guardian_id": guardian_id,
+                "action": action,
+                "description": description,
+                "device_id": device_id,
+                "created_at": datetime.now(timezone.utc),
+            }
         )
-        db.session.add(entry)
     except Exception as e:
-        db.session.rollback()
         print(f"[history_logger] Failed to log action: {e}")
+
+
+@event.listens_for(Session, "after_commit")
+def _submit_committed_entries(session):
+    entries = session.info.pop(_PENDING_ENTRIES, None)
+    if not entries:
+        return
+
+    if has_app_context() and "audit_writer" in current_app.extensions:
+        current_app.extensions["audit_writer"].submit(entries)
+    else:
+        print(f"[history_logger] No audit writer; dropped {len(entries)} entries")
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_rolled_back_entries(session, previous_transaction):
+    session.info.pop(_PENDING_ENTRIES, None)
+
+
+def init_audit_log(app):
+    """
+    Attaches the account-history writer. AUDIT_LOG_MODE=sync writes each
+    commit's entries before returning (useful under tests); batches the
+    database rejects go to AUDIT_FALLBACK_PATH as JSON lines.
+    """
+    backend_root = os.path.abspath(os.path.join(app.root_path, ".."))
+    writer = BatchInsertWriter(
+        app,
+        AccountHistory,
+        "audit-log",
+        batch_size=200,
+        flush_seconds=1,
+        fallback_path=app.config.get("AUDIT_FALLBACK_PATH")
+        or os.path.join(backend_root, "logs", "audit_fallback.jsonl"),
+        sync=app.config.get("AUDIT_LOG_MODE") == "sync",
+    )
+    app.extensions["audit_writer"] = writer
+    return writer
@@ -0,0 +1,69 @@
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(timestamp, row_id):
+    """Builds an opaque `<iso timestamp>,<id>` cursor for keyset pagination."""
+    return f"{timestamp.isoformat()},{row_id}"
+
+
+def decode_cursor(raw):
+    """
+    Parses a cursor produced by encode_cursor. Raises ValueError on
+    malformed input so routes can answer with a 400.
+    """
+    try:
+        timestamp_raw, row_id_raw = raw.rsplit(",", 1)
+        return datetime.fromisoformat(timestamp_raw), int(row_id_raw)
+    except (AttributeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+
+def after_key(sort_column, id_column, timestamp, row_id):
+    """
+    Ascending keyset predicate. Spelled out as OR/AND rather than a row
+    constructor so MySQL can range-scan the composite index.
+    """
+    return or_(
+        sort_column > timestamp,
+        and_(sort_column == timestamp, id_column > row_id),
+    )
+
+
+def before_key(sort_column, id_column, timestamp, row_id):
+    """Descending counterpart of after_key."""
+    return or_(
+        sort_column < timestamp,
+        and_(sort_column == timestamp, id_column < row_id),
+    )
+
+
+def iter_keyset(query, sort_column, id_column, page_size=1000, cursor=None):
+    """
+    Yields rows from an ascending (sort_column, id_column) keyset scan one
+    page at a time, so arbitrarily long ranges never sit in memory at once.
+    `query` must select objects or rows exposing both key attributes.
+    """
+    while True:
+        page_query = query
+        if cursor is not None:
+            page_query = page_query.filter(after_key(sort_column, id_column, *cursor))
+
+        rows = (
+            page_query.order_by(sort_column.asc(), id_column.asc())
+            .limit(page_size)
+            .all()
+        )
+
+        if not rows:
+            return
+
+        for row in rows:
+            yield row
+
+        if len(rows) < page_size:
+            return
+
+        last = rows[-1]
+        cursor = (getattr(last, sort_column.key), getattr(last, id_column.key))
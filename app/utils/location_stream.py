@@ -0,0 +1,149 @@
+import json
+import queue
+import threading
+from collections import defaultdict
+
+
+SUBSCRIPTION_QUEUE_SIZE = 256
+
+
+def _as_float(value):
+    return float(value) if value is not None else None
+
+
+def location_event(device_id, device_serial_number, values):
+    """
+    Builds the camelCase payload pushed to stream subscribers from either a
+    parsed ingestion fix or a DeviceLastLocation row (via vars()).
+    """
+    recorded_at = values.get("recorded_at")
+    return {
+        "deviceId": device_id,
+        "deviceSerialNumber": device_serial_number,
+        "lat": _as_float(values.get("lat")),
+        "lng": _as_float(values.get("lng")),
+        "sats": values.get("sats"),
+        "fixStatus": values.get("fix_status"),
+        "hdop": _as_float(values.get("hdop")),
+        "gpsStatus": values.get("gps_status"),
+        "recordedAt": recorded_at.isoformat() if recorded_at else None,
+    }
+
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class Subscription:
+    def __init__(self, device_ids):
+        self.device_ids = frozenset(device_ids)
+        self._queue = queue.Queue(maxsize=SUBSCRIPTION_QUEUE_SIZE)
+
+    def put(self, event):
+        # A stalled client must never block publishers; drop its oldest
+        # event instead; the next fix for that device supersedes it anyway.
+        while True:
+            try:
+                self._queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class InProcessBroker:
+    """
+    Device-keyed pub/sub living inside one worker process. Publishers and
+    subscribers must share the process, so deployments with several
+    workers should swap in a broker with the same interface via set_broker.
+    Events are location payloads, or {"event": <name>, "data": ...}
+    wrappers (emergency, emergency_acknowledged) that streams forward as-is.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, device_ids):
+        subscription = Subscription(device_ids)
+        with self._lock:
+            for device_id in subscription.device_ids:
+                self._subscribers[device_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for device_id in subscription.device_ids:
+                subscribers = self._subscribers.get(device_id)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[device_id]
+
+    def publish(self, device_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(device_id, ()))
+        for subscription in subscribers:
+            subscription.put(event)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len({s for subs in self._subscribers.values() for s in subs})
+
+
+_broker = InProcessBroker()
+
+
+def get_broker():
+    return _broker
+
+
+def set_broker(broker):
+    global _broker
+    _broker = broker
+
+
+class DeltaTracker:
+    """
+    Remembers what a single stream has already sent per device so only
+    changed fields go over the wire, and drops fixes older than the last
+    one delivered.
+    """
+
+    def __init__(self):
+        self._last_sent = {}
+
+    def delta(self, event):
+        device_id = event["deviceId"]
+        previous = self._last_sent.get(device_id)
+
+        if previous is None:
+            self._last_sent[device_id] = dict(event)
+            return event
+
+        if (
+            event["recordedAt"]
+            and previous["recordedAt"]
+            and event["recordedAt"] < previous["recordedAt"]
+        ):
+            return None
+
+        changed = {
+            key: value
+            for key, value in event.items()
+            if key != "deviceId" and previous.get(key) != value
+        }
+        if not changed:
+            return None
+
+        previous.update(changed)
+        return {"deviceId": device_id, **changed}
@@ -0,0 +1,206 @@
+from datetime import datetime, timezone
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import case, func, insert, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+from app import db
+from app.models import Device, DeviceLastLocation, GPSLocation
+
+
+LOCATION_BATCH_MAX = 1000
+TRACK_INSERT_CHUNK = 500
+
+_LAST_LOCATION_FIELDS = ["lat", "lng", "sats", "fix_status", "hdop", "gps_status"]
+
+
+def _to_decimal(value, field):
+    if value is None:
+        return None
+    try:
+        number = Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        raise ValueError(f"{field} must be numeric")
+    # NaN and Infinity parse but cannot be compared or stored.
+    if not number.is_finite():
+        raise ValueError(f"{field} must be numeric")
+    return number
+
+
+def _to_int(value, field, default=None):
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"{field} must be an integer")
+
+
+def to_utc_naive(value, field="recorded_at"):
+    """
+    Accepts an ISO-8601 string or epoch seconds and returns a naive UTC
+    datetime, matching how DATETIME columns are stored in this schema.
+    """
+    if value is None:
+        return datetime.now(timezone.utc).replace(tzinfo=None)
+
+    if isinstance(value, (int, float)):
+        # Out-of-range and non-finite epochs raise OverflowError or OSError
+        # (or ValueError for NaN) depending on the platform.
+        try:
+            return datetime.fromtimestamp(value, tz=timezone.utc).replace(tzinfo=None)
+        except (OverflowError, OSError, ValueError):
+            raise ValueError(f"{field} is out of range")
+
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            raise ValueError(f"{field} must be ISO-8601 or epoch seconds")
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed
+
+    raise ValueError(f"{field} must be ISO-8601 or epoch seconds")
+
+
+def parse_location_fix(item):
+    """
+    Validates one fix from a gateway batch. Raises ValueError with a
+    message suitable for the per-item rejection list.
+    """
+    if not isinstance(item, dict):
+        raise ValueError("fix must be an object")
+
+    serial = item.get("device_serial_number")
+    if not serial:
+        raise ValueError("device_serial_number is required")
+
+    lat = _to_decimal(item.get("lat"), "lat")
+    lng = _to_decimal(item.get("lng"), "lng")
+
+    if lat is not None and not (-90 <= lat <= 90):
+        raise ValueError("lat out of range")
+    if lng is not None and not (-180 <= lng <= 180):
+        raise ValueError("lng out of range")
+
+    return {
+        "device_serial_number": serial,
+        "lat": lat,
+        "lng": lng,
+        "sats": _to_int(item.get("sats"), "sats"),
+        "fix_status": _to_int(item.get("fix_status"), "fix_status", 0),
+        "hdop": _to_decimal(item.get("hdop"), "hdop"),
+        "gps_status": _to_int(item.get("gps_status"), "gps_status", 0),
+        "recorded_at": to_utc_naive(item.get("recorded_at")),
+    }
+
+
+def resolve_devices(serials):
+    """Maps serial numbers to (device_id, vip_id) with a single IN query."""
+    if not serials:
+        return {}
+
+    rows = (
+        db.session.query(Device.device_serial_number, Device.device_id, Device.vip_id)
+        .filter(Device.device_serial_number.in_(set(serials)))
+        .all()
+    )
+    return {serial: (device_id, vip_id) for serial, device_id, vip_id in rows}
+
+
+def newest_fix_per_device(fixes):
+    """Collapses a batch to the most recent fix for each device_id."""
+    newest = {}
+    for fix in fixes:
+        current = newest.get(fix["device_id"])
+        if current is None or fix["recorded_at"] >= current["recorded_at"]:
+            newest[fix["device_id"]] = fix
+    return newest
+
+
+def upsert_last_locations(newest):
+    """
+    Writes one row per device into device_last_location_tbl using a single
+    multi-row INSERT ... ON DUPLICATE KEY UPDATE. An existing row is only
+    overwritten when the incoming fix is at least as recent as the stored one.
+    """
+    if not newest:
+        return
+
+    table = DeviceLastLocation.__table__
+    now = datetime.now(timezone.utc)
+    rows = [
+        {
+            "device_id": device_id,
+            **{field: fix[field] for field in _LAST_LOCATION_FIELDS},
+            "recorded_at": fix["recorded_at"],
+            "updated_at": now,
+        }
+        for device_id, fix in newest.items()
+    ]
+
+    stmt = mysql_insert(table).values(rows)
+    is_newer = stmt.inserted.recorded_at >= table.c.recorded_at
+
+    # MySQL applies these assignments left to right, so recorded_at must be
+    # updated last for the is_newer comparison to see the stored value.
+    assignments = [
+        (field, case((is_newer, stmt.inserted[field]), else_=table.c[field]))
+        for field in _LAST_LOCATION_FIELDS + ["updated_at"]
+    ]
+    assignments.append(
+        ("recorded_at", func.greatest(table.c.recorded_at, stmt.inserted.recorded_at))
+    )
+
+    db.session.execute(stmt.on_duplicate_key_update(assignments))
+
+
+def touch_devices_last_active(newest):
+    """Bumps Device.last_active_at for every device in one UPDATE."""
+    if not newest:
+        return
+
+    table = Device.__table__
+    new_value = case(
+        {device_id: fix["recorded_at"] for device_id, fix in newest.items()},
+        value=table.c.device_id,
+    )
+
+    db.session.execute(
+        update(table)
+        .where(table.c.device_id.in_(list(newest.keys())))
+        .values(
+            last_active_at=func.greatest(
+                func.coalesce(table.c.last_active_at, new_value), new_value
+            )
+        )
+    )
+
+
+def append_track_points(fixes):
+    """
+    Appends every accepted fix to gps_location_tbl. Rows go out as
+    executemany batches, which the MySQL driver folds into multi-row
+    INSERTs, so a full gateway batch costs a couple of statements.
+    """
+    fixes = [fix for fix in fixes if fix["lat"] is not None and fix["lng"] is not None]
+    if not fixes:
+        return
+
+    table = GPSLocation.__table__
+    rows = [
+        {
+            "device_id": fix["device_id"],
+            "vip_id": fix.get("vip_id"),
+            "latitude": fix["lat"],
+            "longitude": fix["lng"],
+            "sats": fix["sats"],
+            "hdop": fix["hdop"],
+            "timestamp": fix["recorded_at"],
+        }
+        for fix in fixes
+    ]
+
+    for start in range(0, len(rows), TRACK_INSERT_CHUNK):
+        db.session.execute(insert(table), rows[start : start + TRACK_INSERT_CHUNK])
@@ -0,0 +1,120 @@
+import time
+from datetime import datetime, timezone
+
+from app.models import LoginAttempt
+from app.utils.batch_writer import BatchInsertWriter
+from app.utils.rate_limit import get_rate_limit_store
+
+
+LOCKOUT_WINDOW_SECONDS = 30 * 60
+FREE_ATTEMPTS = 3
+LOCKOUTS = [60, 180, 600, 1800]
+# Enough history to reach the longest lockout; older failures never matter.
+TRACKED_FAILURES = FREE_ATTEMPTS + len(LOCKOUTS) + 1
+
+AUDIT_BATCH_SIZE = 200
+AUDIT_FLUSH_SECONDS = 2
+AUDIT_QUEUE_SIZE = 10000
+
+
+def _keys(username, ip_address):
+    keys = []
+    if username:
+        keys.append(f"login:user:{username}")
+    if ip_address:
+        keys.append(f"login:ip:{ip_address}")
+    return keys
+
+
+def _failures(username, ip_address, window_seconds, now):
+    """
+    Failed attempts for the username or the IP inside the window. The two
+    counters cannot tell which failures they share, so the larger one
+    stands in for the union.
+    """
+    store = get_rate_limit_store()
+    timestamps = [
+        store.recent(key, window_seconds, now=now) for key in _keys(username, ip_address)
+    ]
+    count = max((len(ts) for ts in timestamps), default=0)
+    last = max((ts[-1] for ts in timestamps if ts), default=None)
+    return count, last
+
+
+def record_login_failure(username, ip_address):
+    """Counts a failed login against the username and the IP, and audits it."""
+    now = time.time()
+    store = get_rate_limit_store()
+    for key in _keys(username, ip_address):
+        store.hit(key, LOCKOUT_WINDOW_SECONDS, now=now, keep=TRACKED_FAILURES)
+
+    writer = _audit_writer
+    if writer is not None:
+        writer.submit(
+            [
+                {
+                    "username": username,
+                    "ip_address": ip_address,
+                    "created_at": datetime.fromtimestamp(now, timezone.utc),
+                }
+            ]
+        )
+
+
+def clear_login_failures(username, ip_address):
+    store = get_rate_limit_store()
+    for key in _keys(username, ip_address):
+        store.clear(key)
+
+
+def get_login_block_info(
+    username, ip_address, window_minutes=30, free_attempts=FREE_ATTEMPTS
+):
+    now = time.time()
+    attempts_count, last_attempt = _failures(
+        username, ip_address, window_minutes * 60, now
+    )
+
+    if attempts_count <= free_attempts:
+        return {
+            "allowed": True,
+            "remaining_attempts": max(0, free_attempts - attempts_count),
+            "retry_after": 0,
+        }
+
+    lockout_index = min(attempts_count - free_attempts - 1, len(LOCKOUTS) - 1)
+    retry_after = max(0, int(last_attempt + LOCKOUTS[lockout_index] - now))
+
+    return {
+        "allowed": retry_after == 0,
+        "remaining_attempts": 0,
+        "retry_after": retry_after,
+    }
+
+
+def is_login_allowed(username=None, ip_address=None, max_attempts=3, window_minutes=15):
+    attempts_count, _ = _failures(username, ip_address, window_minutes * 60, time.time())
+    return attempts_count < max_attempts
+
+
+_audit_writer = None
+
+
+def init_login_audit(app):
+    """
+    Failed logins are written to login_attempts_tbl in the background, one
+    multi-row INSERT per batch. The table is an audit trail only; lockout
+    decisions never read it, and rows are dropped rather than slowing the
+    login path down when the buffer is full.
+    """
+    global _audit_writer
+    _audit_writer = BatchInsertWriter(
+        app,
+        LoginAttempt,
+        "login-audit",
+        batch_size=AUDIT_BATCH_SIZE,
+        flush_seconds=AUDIT_FLUSH_SECONDS,
+        queue_size=AUDIT_QUEUE_SIZE,
+    )
+    app.extensions["login_audit"] = _audit_writer
+    return _audit_writer
@@ -0,0 +1,438 @@
+import os
+import queue
+import smtplib
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import formataddr
+
+from flask import current_app
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import EmailOutbox
+from app.utils.metrics import SMTP_SEND_SECONDS, counter
+
+
+MAIL_MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+POLL_INTERVAL_SECONDS = 15
+POLL_BATCH_SIZE = 100
+# A row left in "sending" this long belongs to a worker that died mid-send.
+STALE_LOCK_AFTER = timedelta(minutes=10)
+# Bodies are dropped as soon as a row is sent or given up on, since they can
+# carry OTP and reset codes; the remaining metadata is kept this long.
+OUTBOX_RETENTION = timedelta(days=int(os.environ.get("EMAIL_OUTBOX_RETENTION_DAYS", 7)))
+OUTBOX_REAP_INTERVAL_SECONDS = 3600
+OUTBOX_REAP_BATCH_SIZE = 1000
+
+EMAIL_OUTBOX_RESULTS = counter(
+    "email_outbox_deliveries_total",
+    "Outbox delivery attempts by template and result.",
+    ("template", "result"),
+)
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def mail_settings():
+    return {
+        "server": os.environ.get("MAIL_SERVER", "smtp.gmail.com"),
+        "port": int(os.environ.get("MAIL_PORT", 587)),
+        "username": os.environ.get("MAIL_USERNAME", ""),
+        "password": os.environ.get("MAIL_PASSWORD", ""),
+        "sender_name": os.environ.get("MAIL_SENDER_NAME", "iCane Smart Cane"),
+        "use_tls": os.environ.get("MAIL_USE_TLS", "1") == "1",
+        "timeout": float(os.environ.get("MAIL_TIMEOUT", 30)),
+    }
+
+
+def retry_delay(attempts):
+    """Exponential backoff: 30s, 60s, 120s, ... capped at an hour."""
+    return min(RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0), RETRY_MAX_SECONDS)
+
+
+class SMTPConnectionPool:
+    """
+    Keeps up to `size` authenticated SMTP connections open between sends so
+    the TCP, STARTTLS and AUTH round trips are paid once per connection
+    rather than once per message. Connections idle longer than
+    `max_idle_seconds` are probed with NOOP before reuse.
+    """
+
+    def __init__(self, settings, size=2, max_idle_seconds=60):
+        self.settings = settings
+        self.size = size
+        self.max_idle_seconds = max_idle_seconds
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _open(self):
+        settings = self.settings
+        connection = smtplib.SMTP(
+            settings["server"], settings["port"], timeout=settings["timeout"]
+        )
+        try:
+            if settings["use_tls"]:
+                connection.starttls()
+            if settings["username"] and connection.has_extn("auth"):
+                connection.login(settings["username"], settings["password"])
+        except Exception:
+            connection.close()
+            raise
+        return connection
+
+    @staticmethod
+    def discard(connection):
+        try:
+            connection.quit()
+        except Exception:
+            connection.close()
+
+    def checkout(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                connection, last_used = self._idle.pop()
+
+            if time.monotonic() - last_used < self.max_idle_seconds:
+                return connection
+            try:
+                if connection.noop()[0] == 250:
+                    return connection
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.discard(connection)
+
+        return self._open()
+
+    def checkin(self, connection):
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append((connection, time.monotonic()))
+                return
+        self.discard(connection)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            self.discard(connection)
+
+
+class SMTPSession:
+    """
+    Holds one pooled connection across a run of messages so a batch is
+    sent over a single SMTP session. A failed send discards the connection
+    and the next message checks out a fresh one.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._connection = None
+
+    def send(self, message):
+        if self._connection is None:
+            self._connection = self.pool.checkout()
+        try:
+            self._connection.send_message(message)
+        except Exception:
+            # The session state is unknown after a failed command; never
+            # hand this connection to the next message.
+            self.pool.discard(self._connection)
+            self._connection = None
+            raise
+
+    def release(self):
+        if self._connection is not None:
+            self.pool.checkin(self._connection)
+            self._connection = None
+
+
+def build_message(row, settings):
+    message = MIMEMultipart("alternative")
+    message["Subject"] = row.subject
+    message["From"] = formataddr((settings["sender_name"], settings["username"]))
+    message["To"] = row.recipient
+    if row.text_body:
+        message.attach(MIMEText(row.text_body, "plain"))
+    message.attach(MIMEText(row.html_body, "html"))
+    return message
+
+
+class MailDispatcher:
+    """
+    Delivers email_outbox_tbl rows from background threads. New rows are
+    handed over directly through an in-memory queue, one batch per queue
+    item so a batch goes out over one SMTP session; a poller picks up
+    retries that have come due, rows left over from a previous process and
+    rows stuck in "sending" by a crashed worker. Each row is claimed with a
+    conditional UPDATE, so several processes can share one outbox.
+    """
+
+    def __init__(self, app, workers=2):
+        self.app = app
+        self.workers = workers
+        self.settings = mail_settings()
+        self.pool = SMTPConnectionPool(self.settings, size=workers)
+        self._queue = queue.Queue()
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+
+        for index in range(self.workers):
+            threading.Thread(
+                target=self._work, name=f"mail-worker-{index}", daemon=True
+            ).start()
+        threading.Thread(target=self._poll, name="mail-poller", daemon=True).start()
+
+    def submit(self, *email_ids):
+        self.start()
+        with self._lock:
+            batch = tuple(
+                email_id for email_id in email_ids if email_id not in self._queued
+            )
+            self._queued.update(batch)
+        if batch:
+            self._queue.put(batch)
+
+    def _work(self):
+        while True:
+            email_ids = self._queue.get()
+            with self._lock:
+                self._queued.difference_update(email_ids)
+            try:
+                with self.app.app_context():
+                    self.deliver_many(email_ids)
+            except Exception as e:
+                print(f"Mail dispatcher failed on outbox rows {email_ids}: {e}")
+
+    def _poll(self):
+        next_reap = 0
+        while True:
+            try:
+                with self.app.app_context():
+                    for email_id in self.due_email_ids():
+                        self.submit(email_id)
+                    if time.monotonic() >= next_reap:
+                        next_reap = time.monotonic() + OUTBOX_REAP_INTERVAL_SECONDS
+                        reaped = reap_finished_emails()
+                        if reaped:
+                            print(f"Mail dispatcher reaped {reaped} finished outbox rows")
+            except Exception as e:
+                print(f"Mail dispatcher poll failed: {e}")
+            time.sleep(POLL_INTERVAL_SECONDS)
+
+    def due_email_ids(self):
+        now = _utcnow()
+        with Session(db.engine) as session:
+            session.execute(
+                update(EmailOutbox)
+                .where(
+                    EmailOutbox.status == "sending",
+                    EmailOutbox.locked_at < now - STALE_LOCK_AFTER,
+                )
+                .values(status="pending", locked_at=None)
+            )
+            session.commit()
+
+            return [
+                email_id
+                for (email_id,) in session.query(EmailOutbox.email_id)
+                .filter(
+                    EmailOutbox.status == "pending",
+                    EmailOutbox.next_attempt_at <= now,
+                )
+                .order_by(EmailOutbox.next_attempt_at)
+                .limit(POLL_BATCH_SIZE)
+            ]
+
+    def deliver_many(self, email_ids):
+        """Delivers rows in order over one SMTP session; returns their results."""
+        smtp_session = SMTPSession(self.pool)
+        try:
+            return [self.deliver(email_id, smtp_session) for email_id in email_ids]
+        finally:
+            smtp_session.release()
+
+    def deliver(self, email_id, smtp_session=None):
+        """
+        Claims and sends one outbox row. Returns True once it is sent. Uses
+        its own session so it never commits a caller's unit of work.
+        """
+        if smtp_session is None:
+            return self.deliver_many([email_id])[0]
+
+        with Session(db.engine) as session:
+            claimed = session.execute(
+                update(EmailOutbox)
+                .where(
+                    EmailOutbox.email_id == email_id,
+                    EmailOutbox.status == "pending",
+                )
+                .values(
+                    status="sending",
+                    locked_at=_utcnow(),
+                    attempts=EmailOutbox.attempts + 1,
+                )
+            ).rowcount
+            session.commit()
+            if not claimed:
+                return False
+
+            row = session.get(EmailOutbox, email_id)
+
+            try:
+                message = build_message(row, self.settings)
+                with SMTP_SEND_SECONDS.time(template=row.template):
+                    smtp_session.send(message)
+            except Exception as e:
+                row.last_error = str(e)[:2000]
+                row.locked_at = None
+                if row.attempts >= MAIL_MAX_ATTEMPTS:
+                    row.status = "failed"
+                    row.html_body = None
+                    row.text_body = None
+                    EMAIL_OUTBOX_RESULTS.inc(template=row.template, result="failed")
+                    print(f"Giving up on email {email_id} to {row.recipient}: {e}")
+                else:
+                    row.status = "pending"
+                    row.next_attempt_at = _utcnow() + timedelta(
+                        seconds=retry_delay(row.attempts)
+                    )
+                    EMAIL_OUTBOX_RESULTS.inc(template=row.template, result="retry")
+                    print(f"Email {email_id} to {row.recipient} will be retried: {e}")
+                session.commit()
+                return False
+
+            row.status = "sent"
+            row.sent_at = _utcnow()
+            row.locked_at = None
+            row.last_error = None
+            row.html_body = None
+            row.text_body = None
+            session.commit()
+            EMAIL_OUTBOX_RESULTS.inc(template=row.template, result="sent")
+            return True
+
+
+def reap_finished_emails(batch_size=OUTBOX_REAP_BATCH_SIZE):
+    """
+    Deletes sent and failed rows older than OUTBOX_RETENTION in chunks of
+    `batch_size`, one short transaction each. next_attempt_at is the time of
+    a finished row's last attempt, so idx_email_outbox_status_next serves
+    the scan. Returns the rows deleted.
+    """
+    cutoff = _utcnow() - OUTBOX_RETENTION
+    deleted = 0
+
+    with Session(db.engine) as session:
+        while True:
+            ids = [
+                email_id
+                for (email_id,) in session.query(EmailOutbox.email_id)
+                .filter(
+                    EmailOutbox.status.in_(("sent", "failed")),
+                    EmailOutbox.next_attempt_at < cutoff,
+                )
+                .limit(batch_size)
+            ]
+            if not ids:
+                break
+
+            session.query(EmailOutbox).filter(EmailOutbox.email_id.in_(ids)).delete(
+                synchronize_session=False
+            )
+            session.commit()
+            deleted += len(ids)
+
+            if len(ids) < batch_size:
+                break
+
+    return deleted
+
+
+def init_mail_dispatcher(app):
+    """
+    Attaches a dispatcher to the app. Worker threads start on the first
+    queued email or the first request, whichever comes first, so rows left
+    pending by a previous process are picked up soon after startup.
+    """
+    dispatcher = MailDispatcher(app, workers=int(os.environ.get("MAIL_WORKERS", 2)))
+    app.extensions["mail_dispatcher"] = dispatcher
+
+    if app.config.get("MAIL_DISPATCH_MODE") == "async":
+
+        @app.before_request
+        def start_mail_dispatcher():
+            dispatcher.start()
+
+    return dispatcher
+
+
+def queue_emails(messages):
+    """
+    Writes messages to the outbox in one transaction and hands them to the
+    dispatcher as a single batch. Each message is a dict of queue_email
+    arguments. With MAIL_DISPATCH_MODE=sync the batch is delivered before
+    returning. Returns one result per message: True when it was queued
+    (async) or sent (sync).
+    """
+    now = _utcnow()
+    with Session(db.engine) as session:
+        rows = [
+            EmailOutbox(
+                recipient=message["recipient"],
+                subject=message["subject"],
+                html_body=message["html_body"],
+                text_body=message.get("text_body"),
+                template=message["template"],
+                status="pending",
+                attempts=0,
+                next_attempt_at=now,
+            )
+            for message in messages
+        ]
+        session.add_all(rows)
+        session.flush()
+        email_ids = [row.email_id for row in rows]
+        session.commit()
+
+    dispatcher = current_app.extensions["mail_dispatcher"]
+    if current_app.config.get("MAIL_DISPATCH_MODE") == "sync":
+        return dispatcher.deliver_many(email_ids)
+
+    dispatcher.submit(*email_ids)
+    return [True] * len(email_ids)
+
+
+def queue_email(recipient, subject, html_body, template, text_body=None):
+    """
+    Writes a message to the outbox in its own transaction and hands it to
+    the dispatcher. Returns True when the message was queued (async) or
+    sent (sync).
+    """
+    return queue_emails(
+        [
+            {
+                "recipient": recipient,
+                "subject": subject,
+                "html_body": html_body,
+                "text_body": text_body,
+                "template": template,
+            }
+        ]
+    )[0]
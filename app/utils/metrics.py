@@ -0,0 +1,377 @@
+import hmac
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, current_app, g, request
+
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    inner = ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in pairs)
+    return "{" + inner + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def _samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=None):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets or DEFAULT_LATENCY_BUCKETS))
+        # key -> [per-bucket counts..., sum, count]
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self):
+        with self._lock:
+            values = sorted((key, list(state)) for key, state in self._values.items())
+
+        lines = []
+        for key, state in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                labels = _format_labels(
+                    self.labelnames, key, ("le", _format_value(bound))
+                )
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key, ("le", "+Inf"))
+            lines.append(f"{self.name}_bucket{labels} {state[-1]}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{labels} {state[-1]}")
+        return lines
+
+
+class Registry:
+    """
+    Holds every metric of the process and renders them in the Prometheus
+    text exposition format. Collectors are callables run at scrape time
+    that return already formatted lines, for values owned elsewhere (cache
+    counters, pool state).
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def add_collector(self, name, collector):
+        with self._lock:
+            self._collectors[name] = collector
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors.values())
+
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collector in collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def counter(name, documentation, labelnames=()):
+    return registry.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=()):
+    return registry.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=None):
+    return registry.register(Histogram(name, documentation, labelnames, buckets))
+
+
+REQUEST_LATENCY = histogram(
+    "http_request_duration_seconds",
+    "Time spent producing a response, by blueprint and endpoint.",
+    ("blueprint", "endpoint", "method"),
+)
+REQUEST_COUNT = counter(
+    "http_requests_total",
+    "Completed requests by endpoint and status code.",
+    ("blueprint", "endpoint", "method", "status"),
+)
+REQUESTS_IN_FLIGHT = gauge(
+    "http_requests_in_flight",
+    "Requests currently being handled.",
+    ("blueprint", "endpoint"),
+)
+DB_POOL_CHECKOUT_WAIT = histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a connection from the SQLAlchemy pool.",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+SMTP_SEND_SECONDS = histogram(
+    "smtp_send_duration_seconds",
+    "Time spent connecting to the SMTP server and sending one message.",
+    ("template",),
+)
+
+
+def _cache_collector():
+    from app.utils.cache import all_caches
+
+    caches = sorted(all_caches().items())
+    lines = [
+        "# HELP cache_requests_total Cache lookups by cache and result.",
+        "# TYPE cache_requests_total counter",
+    ]
+    for name, cache in caches:
+        stats = cache.stats()
+        for result in ("hits", "misses"):
+            labels = _format_labels(("cache", "result"), (name, result))
+            lines.append(f"cache_requests_total{labels} {stats[result]}")
+
+    lines += [
+        "# HELP cache_hit_ratio Share of cache lookups served from the cache.",
+        "# TYPE cache_hit_ratio gauge",
+    ]
+    for name, cache in caches:
+        stats = cache.stats()
+        lookups = stats["hits"] + stats["misses"]
+        ratio = stats["hits"] / lookups if lookups else 0
+        labels = _format_labels(("cache",), (name,))
+        lines.append(f"cache_hit_ratio{labels} {_format_value(ratio)}")
+    return lines
+
+
+registry.add_collector("cache", _cache_collector)
+
+
+def _request_labels():
+    endpoint = request.endpoint or "unmatched"
+    return request.blueprint or "app", endpoint
+
+
+def _instrument_pool(pool):
+    """
+    Times every checkout from `pool`. Engine.connect looks pool.connect up
+    on the instance, so shadowing it there covers every connection the app
+    takes. A pool replaced by engine.dispose() is instrumented again on the
+    next request.
+    """
+    if getattr(pool, "_checkout_timed", False):
+        return
+
+    connect = pool.connect
+
+    def timed_connect():
+        started = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+
+    pool.connect = timed_connect
+    pool._checkout_timed = True
+
+
+def metrics_request_authorized():
+    """
+    True when the request may read operational metrics: it carries the
+    METRICS_TOKEN bearer token, or no token is set and the app runs in
+    development. Outside development the endpoints stay closed until a
+    token is configured.
+    """
+    token = current_app.config.get("METRICS_TOKEN")
+    if not token:
+        return not current_app.config.get("METRICS_REQUIRE_TOKEN", True)
+    provided = request.headers.get("Authorization", "")
+    return hmac.compare_digest(provided, f"Bearer {token}")
+
+
+def init_metrics(app, db):
+    """
+    Records latency, status and in-flight requests for every endpoint and
+    serves the registry at /metrics to scrapers that pass
+    metrics_request_authorized().
+    """
+    if not app.config.get("METRICS_ENABLED", True):
+        return
+
+    def pool_collector():
+        pool = db.engine.pool
+        if not hasattr(pool, "checkedout"):
+            return []
+        return [
+            "# HELP db_pool_connections_checked_out Connections currently in use.",
+            "# TYPE db_pool_connections_checked_out gauge",
+            f"db_pool_connections_checked_out {pool.checkedout()}",
+        ]
+
+    registry.add_collector("db_pool", pool_collector)
+
+    @app.before_request
+    def start_request_timer():
+        _instrument_pool(db.engine.pool)
+
+        blueprint, endpoint = _request_labels()
+        g._metrics_started_at = time.perf_counter()
+        g._metrics_labels = (blueprint, endpoint)
+        REQUESTS_IN_FLIGHT.inc(blueprint=blueprint, endpoint=endpoint)
+
+    @app.after_request
+    def record_request(response):
+        started = g.get("_metrics_started_at")
+        if started is None:
+            return response
+
+        blueprint, endpoint = g._metrics_labels
+        REQUEST_LATENCY.observe(
+            time.perf_counter() - started,
+            blueprint=blueprint,
+            endpoint=endpoint,
+            method=request.method,
+        )
+        REQUEST_COUNT.inc(
+            blueprint=blueprint,
+            endpoint=endpoint,
+            method=request.method,
+            status=response.status_code,
+        )
+        return response
+
+    @app.teardown_request
+    def finish_request(exc):
+        labels = g.pop("_metrics_labels", None)
+        if labels is not None:
+            blueprint, endpoint = labels
+            REQUESTS_IN_FLIGHT.dec(blueprint=blueprint, endpoint=endpoint)
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        if not metrics_request_authorized():
+            return Response("unauthorized\n", status=401, mimetype="text/plain")
+
+        return Response(
+            registry.render(), mimetype="text/plain; version=0.0.4; charset=utf-8"
+        )
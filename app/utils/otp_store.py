@@ -0,0 +1,275 @@
+import hashlib
+import hmac
+import os
+import secrets
+import string
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import OTP
+from app.utils.cache import create_cache, get_redis_client
+from app.utils.rate_limit import get_rate_limit_store
+
+
+# "database" keeps codes in otp_tbl; "cache" keeps them only in the OTP
+# cache (Redis when REDIS_URL is set), where they expire on their own.
+OTP_STORE_BACKEND = os.environ.get("OTP_STORE", "database")
+OTP_REQUESTS_PER_HOUR = 4
+OTP_RATE_WINDOW_SECONDS = 60 * 60
+OTP_REAP_INTERVAL_SECONDS = int(os.environ.get("OTP_REAP_INTERVAL", 600))
+OTP_REAP_BATCH_SIZE = 1000
+
+OTP_VALID = "valid"
+OTP_MISSING = "missing"
+OTP_EXPIRED = "expired"
+OTP_INVALID = "invalid"
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+def _normalize(email):
+    return (email or "").strip().lower()
+
+
+def generate_otp(length=6):
+    return "".join(secrets.choice(string.digits) for _ in range(length))
+
+
+def hash_otp(email, purpose, code):
+    """
+    HMAC of the code bound to its email and purpose, so a leaked row cannot
+    be replayed for another address and the table never holds live codes.
+    """
+    key = current_app.config["SECRET_KEY"].encode("utf-8")
+    message = f"{purpose}:{_normalize(email)}:{code}".encode("utf-8")
+    return hmac.new(key, message, hashlib.sha256).hexdigest()
+
+
+class DatabaseOTPStore:
+    """
+    At most one unused row per (email, purpose): issuing a code retires the
+    previous ones, so verification is one lookup on
+    idx_otp_email_purpose_used. Changes are left on db.session for the
+    route to commit together with whatever the code unlocks.
+
+    Retired rows keep used_at NULL, which only a verified code sets, so the
+    rate limit can still count the codes that were never verified.
+    """
+
+    def recent_requests(self, email, purpose):
+        """Codes issued within the rate window that were never verified."""
+        since = (_utcnow() - timedelta(seconds=OTP_RATE_WINDOW_SECONDS)).replace(tzinfo=None)
+        return OTP.query.filter(
+            OTP.email == email,
+            OTP.purpose == purpose,
+            OTP.created_at >= since,
+            OTP.used_at.is_(None),
+        ).count()
+
+    def issue(self, email, purpose, code_hash, expires_at):
+        OTP.query.filter_by(email=email, purpose=purpose, is_used=False).update(
+            {"is_used": True}, synchronize_session=False
+        )
+        db.session.add(
+            OTP(
+                email=email,
+                otp_code=code_hash,
+                expires_at=expires_at,
+                is_used=False,
+                purpose=purpose,
+            )
+        )
+
+    def verify(self, email, purpose, code_hash):
+        otp_record = (
+            OTP.query.filter_by(email=email, purpose=purpose, is_used=False)
+            .order_by(OTP.id.desc())
+            .first()
+        )
+        if not otp_record:
+            return OTP_MISSING
+
+        if _utcnow() > otp_record.expires_at.replace(tzinfo=timezone.utc):
+            return OTP_EXPIRED
+
+        if not hmac.compare_digest(otp_record.otp_code, code_hash):
+            return OTP_INVALID
+
+        otp_record.is_used = True
+        otp_record.used_at = _utcnow()
+        return OTP_VALID
+
+
+class CacheOTPStore:
+    """
+    Keeps each (purpose, email) code hash in Redis and nothing in the
+    database. A code is dropped as soon as it verifies. Only used when a
+    Redis client is configured: a per-process cache would reject codes
+    verified on a different worker than the one that issued them.
+
+    A verified code leaves nothing behind, so the rate limit counts every
+    code issued, in the (equally Redis-backed) rate limit store.
+    """
+
+    def __init__(self):
+        self.cache = create_cache("otp", max_entries=10000, ttl_seconds=600)
+
+    @staticmethod
+    def _rate_key(email, purpose):
+        return f"otp:{purpose}:{_normalize(email)}"
+
+    def recent_requests(self, email, purpose):
+        """Codes issued within the rate window."""
+        return len(
+            get_rate_limit_store().recent(
+                self._rate_key(email, purpose), OTP_RATE_WINDOW_SECONDS
+            )
+        )
+
+    def issue(self, email, purpose, code_hash, expires_at):
+        ttl_seconds = max(1, int((expires_at - _utcnow()).total_seconds()))
+        self.cache.set(
+            (purpose, _normalize(email)),
+            {"hash": code_hash, "expires_at": expires_at.timestamp()},
+            ttl_seconds=ttl_seconds,
+        )
+        get_rate_limit_store().hit(
+            self._rate_key(email, purpose),
+            OTP_RATE_WINDOW_SECONDS,
+            keep=OTP_REQUESTS_PER_HOUR,
+        )
+
+    def verify(self, email, purpose, code_hash):
+        key = (purpose, _normalize(email))
+        entry = self.cache.get(key)
+        if entry is None:
+            return OTP_MISSING
+
+        if time.time() > entry["expires_at"]:
+            return OTP_EXPIRED
+
+        if not hmac.compare_digest(entry["hash"], code_hash):
+            return OTP_INVALID
+
+        self.cache.delete(key)
+        return OTP_VALID
+
+
+def _uses_cache_backend():
+    return OTP_STORE_BACKEND == "cache" and get_redis_client() is not None
+
+
+def get_otp_store():
+    """
+    CacheOTPStore for OTP_STORE=cache with Redis configured, otherwise
+    DatabaseOTPStore.
+    """
+    global _store
+
+    with _store_lock:
+        if _store is None:
+            if _uses_cache_backend():
+                _store = CacheOTPStore()
+            else:
+                if OTP_STORE_BACKEND == "cache":
+                    print("[otp_store] OTP_STORE=cache needs REDIS_URL; using the database")
+                _store = DatabaseOTPStore()
+        return _store
+
+
+def check_otp_rate_limit(email, purpose="general"):
+    """
+    True while the store reports fewer than OTP_REQUESTS_PER_HOUR recent
+    codes: unverified ones counted in otp_tbl (shared by every worker), or
+    every issued one in Redis for the cache store.
+    """
+    return get_otp_store().recent_requests(email, purpose) < OTP_REQUESTS_PER_HOUR
+
+
+def issue_otp(email, purpose="general", ttl_minutes=10):
+    """Creates a code for (email, purpose) and returns it in plain text for sending."""
+    code = generate_otp()
+    expires_at = _utcnow() + timedelta(minutes=ttl_minutes)
+    get_otp_store().issue(email, purpose, hash_otp(email, purpose, code), expires_at)
+    return code
+
+
+def verify_otp_code(email, purpose, code):
+    """Returns OTP_VALID (and consumes the code), OTP_MISSING, OTP_EXPIRED or OTP_INVALID."""
+    return get_otp_store().verify(email, purpose, hash_otp(email, purpose, str(code)))
+
+
+def reap_expired_otps(batch_size=OTP_REAP_BATCH_SIZE):
+    """
+    Deletes rows that expired more than a rate window ago, in chunks of
+    `batch_size`, one short transaction each, walking idx_otp_expires_at.
+    Used rows are covered too: every code expires within minutes of being
+    issued. Rows are kept that long so check_otp_rate_limit still sees
+    them. Returns the rows deleted.
+    """
+    cutoff = (_utcnow() - timedelta(seconds=OTP_RATE_WINDOW_SECONDS)).replace(tzinfo=None)
+    deleted = 0
+
+    with Session(db.engine) as session:
+        while True:
+            ids = [
+                otp_id
+                for (otp_id,) in session.query(OTP.id)
+                .filter(OTP.expires_at < cutoff)
+                .limit(batch_size)
+            ]
+            if not ids:
+                break
+
+            session.query(OTP).filter(OTP.id.in_(ids)).delete(synchronize_session=False)
+            session.commit()
+            deleted += len(ids)
+
+            if len(ids) < batch_size:
+                break
+
+    return deleted
+
+
+def init_otp_reaper(app):
+    """
+    Runs reap_expired_otps every OTP_REAP_INTERVAL seconds from a daemon
+    thread started on the first request. Set OTP_REAP_INTERVAL=0 to leave
+    reaping to an external job.
+    """
+    if OTP_REAP_INTERVAL_SECONDS <= 0 or _uses_cache_backend():
+        return
+
+    state = {"started": False}
+    lock = threading.Lock()
+
+    def reap_forever():
+        while True:
+            try:
+                with app.app_context():
+                    deleted = reap_expired_otps()
+                if deleted:
+                    print(f"[otp_store] Reaped {deleted} expired OTP rows")
+            except Exception as e:
+                print(f"[otp_store] OTP reaper failed: {e}")
+            time.sleep(OTP_REAP_INTERVAL_SECONDS)
+
+    @app.before_request
+    def start_otp_reaper():
+        if state["started"]:
+            return
+        with lock:
+            if state["started"]:
+                return
+            state["started"] = True
+        threading.Thread(target=reap_forever, name="otp-reaper", daemon=True).start()
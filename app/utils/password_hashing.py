@@ -0,0 +1,105 @@
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+import bcrypt
+
+from app.utils.metrics import counter, gauge
+from app.utils.responses import error_response
+
+
+# Cost factor for new hashes. Raising it makes every stored hash with a
+# lower cost get rehashed on that guardian's next successful login.
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", 12))
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", os.cpu_count() or 2))
+# Requests allowed to hold hashing capacity at once, running or waiting.
+PASSWORD_HASH_MAX_PENDING = int(
+    os.environ.get("PASSWORD_HASH_MAX_PENDING", PASSWORD_HASH_WORKERS * 4)
+)
+PASSWORD_HASH_RETRY_AFTER_SECONDS = 2
+
+_BCRYPT_HASH = re.compile(r"^\$2[aby]?\$(\d\d)\$")
+
+PASSWORD_HASH_IN_FLIGHT = gauge(
+    "password_hash_requests_in_flight",
+    "Requests currently holding password hashing capacity.",
+)
+PASSWORD_HASH_REJECTED = counter(
+    "password_hash_rejected_total",
+    "Requests turned away with 503 because password hashing was saturated.",
+)
+
+_executor = None
+_executor_lock = threading.Lock()
+_capacity = threading.BoundedSemaphore(PASSWORD_HASH_MAX_PENDING)
+
+
+def _get_executor():
+    """
+    bcrypt releases the GIL while it works, so a thread pool spreads hashes
+    over every core. Created on first use so forked workers each get their
+    own threads.
+    """
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt"
+            )
+        return _executor
+
+
+def _hashpw(password, rounds):
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def _checkpw(password, hashed):
+    return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+
+
+def hash_password(password, rounds=None):
+    return _get_executor().submit(_hashpw, password, rounds or BCRYPT_ROUNDS).result()
+
+
+def verify_password(password, hashed):
+    return _get_executor().submit(_checkpw, password, hashed).result()
+
+
+def is_bcrypt_hash(hashed):
+    return bool(hashed) and _BCRYPT_HASH.match(hashed) is not None
+
+
+def needs_rehash(hashed):
+    """True for legacy non-bcrypt values and hashes below BCRYPT_ROUNDS' cost."""
+    match = _BCRYPT_HASH.match(hashed or "")
+    return match is None or int(match.group(1)) < BCRYPT_ROUNDS
+
+
+def hashing_capacity_required(f):
+    """
+    Reserves password hashing capacity for the request, or answers 503 with
+    Retry-After straight away when PASSWORD_HASH_MAX_PENDING requests
+    already hold it. Place it directly under the route decorator so a
+    saturated server sheds load before doing any other work.
+    """
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not _capacity.acquire(blocking=False):
+            PASSWORD_HASH_REJECTED.inc()
+            body, status_code = error_response(
+                "Server is busy. Please try again shortly.", 503
+            )
+            return body, status_code, {"Retry-After": str(PASSWORD_HASH_RETRY_AFTER_SECONDS)}
+
+        PASSWORD_HASH_IN_FLIGHT.inc()
+        try:
+            return f(*args, **kwargs)
+        finally:
+            PASSWORD_HASH_IN_FLIGHT.dec()
+            _capacity.release()
+
+    return decorated_function
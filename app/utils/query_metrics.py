@@ -0,0 +1,224 @@
+import re
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from flask import current_app, g, has_request_context, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.utils.metrics import metrics_request_authorized
+
+
+# A statement shape repeated this many times in one request is reported
+# as a likely N+1.
+REPEATED_STATEMENT_THRESHOLD = 5
+TOP_FINGERPRINTS = 10
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\?|:\w+")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+_endpoint_stats = {}
+_stats_lock = threading.Lock()
+_listeners_installed = False
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def fingerprint(statement):
+    """
+    Reduces a statement to its shape: literals and bind parameters become
+    `?` and expanded IN lists collapse, so the per-row queries of an N+1
+    loop share one fingerprint.
+    """
+    shape = _STRING_LITERAL.sub("?", statement)
+    shape = _PLACEHOLDER.sub("?", shape)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    shape = _PLACEHOLDER_LIST.sub("(?+)", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+class RequestQueryStats:
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.fingerprints = Counter()
+
+    def record(self, statement, elapsed):
+        self.count += 1
+        self.total_seconds += elapsed
+        self.fingerprints[fingerprint(statement)] += 1
+
+    def repeated(self):
+        return {
+            shape: count
+            for shape, count in self.fingerprints.most_common()
+            if count >= REPEATED_STATEMENT_THRESHOLD
+        }
+
+
+def _current_stats():
+    if not has_request_context():
+        return None
+    return g.get("_query_stats")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_stats() is not None:
+        conn.info.setdefault("_query_started_at", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats()
+    started = conn.info.get("_query_started_at")
+    if stats is None or not started:
+        return
+    stats.record(statement, time.perf_counter() - started.pop())
+
+
+def _install_listeners():
+    global _listeners_installed
+    if _listeners_installed:
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    _listeners_installed = True
+
+
+def _record_endpoint(endpoint, stats):
+    with _stats_lock:
+        entry = _endpoint_stats.setdefault(
+            endpoint,
+            {
+                "requests": 0,
+                "queries": 0,
+                "max_queries": 0,
+                "db_time_ms": 0.0,
+                "repeated_statements": Counter(),
+            },
+        )
+        entry["requests"] += 1
+        entry["queries"] += stats.count
+        entry["max_queries"] = max(entry["max_queries"], stats.count)
+        entry["db_time_ms"] += stats.total_seconds * 1000
+        entry["repeated_statements"].update(stats.repeated())
+
+
+def snapshot():
+    """Per-endpoint aggregates, worst offenders (by max queries) first."""
+    with _stats_lock:
+        items = [
+            {
+                "endpoint": endpoint,
+                "requests": entry["requests"],
+                "avg_queries": round(entry["queries"] / entry["requests"], 2),
+                "max_queries": entry["max_queries"],
+                "avg_db_time_ms": round(entry["db_time_ms"] / entry["requests"], 3),
+                "repeated_statements": [
+                    {"statement": shape, "occurrences": count}
+                    for shape, count in entry["repeated_statements"].most_common(
+                        TOP_FINGERPRINTS
+                    )
+                ],
+            }
+            for endpoint, entry in _endpoint_stats.items()
+        ]
+    return sorted(items, key=lambda item: item["max_queries"], reverse=True)
+
+
+def reset():
+    with _stats_lock:
+        _endpoint_stats.clear()
+
+
+def query_budget(max_queries):
+    """
+    Caps the statements an endpoint may issue, auth lookups included, so
+    place it directly under the route decorator. Over budget it raises
+    QueryBudgetExceeded when QUERY_BUDGET_STRICT is on (the default under
+    TESTING), otherwise it only logs. Streamed bodies are not counted.
+    """
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            response = f(*args, **kwargs)
+
+            stats = _current_stats()
+            if stats is not None and stats.count > max_queries:
+                message = (
+                    f"{request.endpoint} issued {stats.count} queries "
+                    f"(budget {max_queries})"
+                )
+                strict = current_app.config.get("QUERY_BUDGET_STRICT")
+                if strict is None:
+                    strict = current_app.testing
+                if strict:
+                    raise QueryBudgetExceeded(message)
+                print(f"[query-budget] {message}")
+
+            return response
+
+        return decorated_function
+
+    return decorator
+
+
+def init_query_metrics(app):
+    """
+    Counts the SQL statements behind every request when QUERY_METRICS_ENABLED
+    is set, adds X-Query-Count / X-Query-Time-Ms headers and serves the
+    per-endpoint aggregates at /api/_metrics.
+    """
+    if not app.config.get("QUERY_METRICS_ENABLED"):
+        return
+
+    _install_listeners()
+
+    @app.before_request
+    def start_query_stats():
+        g._query_stats = RequestQueryStats()
+
+    @app.after_request
+    def finish_query_stats(response):
+        stats = g.pop("_query_stats", None)
+        if stats is None:
+            return response
+
+        if request.endpoint and request.endpoint != "query_metrics":
+            _record_endpoint(request.endpoint, stats)
+
+        repeated = stats.repeated()
+        if repeated:
+            shape, count = next(iter(repeated.items()))
+            print(
+                f"[query-metrics] possible N+1 in {request.endpoint}: "
+                f"{count}x {shape[:160]}"
+            )
+
+        response.headers["X-Query-Count"] = str(stats.count)
+        response.headers["X-Query-Time-Ms"] = f"{stats.total_seconds * 1000:.2f}"
+        return response
+
+    @app.route("/api/_metrics", methods=["GET", "DELETE"], endpoint="query_metrics")
+    def query_metrics():
+        if not metrics_request_authorized():
+            return jsonify({"success": False, "message": "Unauthorized"}), 401
+
+        if request.method == "DELETE":
+            reset()
+            return jsonify({"success": True, "message": "Query metrics reset"})
+
+        return jsonify(
+            {
+                "success": True,
+                "repeated_statement_threshold": REPEATED_STATEMENT_THRESHOLD,
+                "endpoints": snapshot(),
+            }
+        )
@@ -0,0 +1,179 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+from app.utils.cache import get_redis_client
+
+
+SWEEP_INTERVAL_SECONDS = 60
+MAX_TRACKED_KEYS = 10000
+
+_store = None
+_store_lock = threading.Lock()
+
+
+class MemoryRateLimitStore:
+    """
+    Per-process sliding-window log: each key keeps the timestamps of its
+    hits inside the window. The number of keys is capped (least recently
+    hit keys are evicted first) and a daemon thread sweeps keys whose
+    window has passed, so memory stays flat under a steady stream of new
+    clients.
+    """
+
+    def __init__(self, max_keys=MAX_TRACKED_KEYS, sweep_interval=SWEEP_INTERVAL_SECONDS):
+        self.max_keys = max_keys
+        self.sweep_interval = sweep_interval
+        # key -> (deque of hit timestamps, expires_at)
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+        self._sweeper = None
+
+    def _start_sweeper(self):
+        if self._sweeper is not None:
+            return
+        self._sweeper = threading.Thread(
+            target=self._sweep_forever, name="rate-limit-sweeper", daemon=True
+        )
+        self._sweeper.start()
+
+    def _sweep_forever(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"[rate_limit] Sweep failed: {e}")
+
+    def sweep(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            expired = [key for key, (_, expires_at) in self._windows.items() if expires_at <= now]
+            for key in expired:
+                del self._windows[key]
+        return len(expired)
+
+    def hit(self, key, window_seconds, now=None, keep=None):
+        """
+        Records a hit for `key` and returns how many hits fall inside the
+        window, this one included. `keep` caps the timestamps stored per
+        key when callers only care about the most recent few.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self._start_sweeper()
+
+            hits, _ = self._windows.pop(key, (deque(), None))
+            while hits and hits[0] <= now - window_seconds:
+                hits.popleft()
+            hits.append(now)
+            if keep:
+                while len(hits) > keep:
+                    hits.popleft()
+
+            self._windows[key] = (hits, now + window_seconds)
+            while len(self._windows) > self.max_keys:
+                self._windows.popitem(last=False)
+            return len(hits)
+
+    def recent(self, key, window_seconds, now=None):
+        """Timestamps of the hits for `key` inside the window, oldest first."""
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._windows.get(key)
+            if entry is None:
+                return []
+            return [ts for ts in entry[0] if ts > now - window_seconds]
+
+    def clear(self, key):
+        with self._lock:
+            self._windows.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {"keys": len(self._windows)}
+
+
+class RedisRateLimitStore:
+    """
+    Sliding-window log shared by every worker, one sorted set per key with
+    the hit timestamps as scores. Redis expires idle keys itself, so there
+    is nothing to sweep. Works with any redis-py compatible client.
+    """
+
+    def __init__(self, client, prefix="ratelimit"):
+        self.client = client
+        self.prefix = prefix
+
+    def _redis_key(self, key):
+        return f"{self.prefix}:{key}"
+
+    def hit(self, key, window_seconds, now=None, keep=None):
+        now = time.time() if now is None else now
+        redis_key = self._redis_key(key)
+
+        pipe = self.client.pipeline()
+        pipe.zremrangebyscore(redis_key, "-inf", now - window_seconds)
+        pipe.zadd(redis_key, {f"{now:.6f}:{uuid.uuid4().hex[:8]}": now})
+        if keep:
+            pipe.zremrangebyrank(redis_key, 0, -(keep + 1))
+        pipe.zcard(redis_key)
+        pipe.expire(redis_key, int(window_seconds) + 1)
+        return int(pipe.execute()[-2])
+
+    def recent(self, key, window_seconds, now=None):
+        now = time.time() if now is None else now
+        entries = self.client.zrangebyscore(
+            self._redis_key(key), f"({now - window_seconds}", "+inf", withscores=True
+        )
+        return [score for _, score in entries]
+
+    def clear(self, key):
+        self.client.delete(self._redis_key(key))
+
+    def sweep(self, now=None):
+        return 0
+
+    def stats(self):
+        return {"keys": None}
+
+
+def get_rate_limit_store():
+    """
+    Returns the process-wide store: Redis-backed when cache.get_redis_client()
+    has a client (REDIS_URL, or one installed with cache.set_redis_client
+    before the first call), otherwise in memory.
+    """
+    global _store
+
+    with _store_lock:
+        if _store is None:
+            client = get_redis_client()
+            if client is not None:
+                _store = RedisRateLimitStore(client)
+            else:
+                _store = MemoryRateLimitStore()
+        return _store
+
+
+def set_rate_limit_store(store):
+    """Replaces the process-wide store, e.g. with one built on fakeredis."""
+    global _store
+    with _store_lock:
+        _store = store
+
+
+def configure_limiter(app):
+    """
+    Points Flask-Limiter at REDIS_URL (or memory://) and uses the
+    moving-window (sliding log) strategy, so route limits hold across
+    workers and cannot be doubled at a fixed-window boundary. Flask-Limiter
+    only takes a storage URI, so a client installed with
+    cache.set_redis_client does not reach it.
+    """
+    app.config.setdefault(
+        "RATELIMIT_STORAGE_URI", os.environ.get("REDIS_URL") or "memory://"
+    )
+    app.config.setdefault("RATELIMIT_STRATEGY", "moving-window")
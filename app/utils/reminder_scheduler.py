@@ -0,0 +1,549 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from datetime import datetime, time as dtime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import event, insert, text
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import Device, DeviceLog, NoteReminder, PushSubscription, RollupState
+from app.utils.metrics import counter, gauge
+from app.utils.web_push import EVENT_DELIVERY
+
+
+# reminder_time is a wall-clock time in this zone, repeated every day.
+REMINDER_TIMEZONE = ZoneInfo(os.environ.get("REMINDER_TIMEZONE", "Asia/Manila"))
+REMINDER_BATCH_SIZE = 500
+# Rows changed by other processes are picked up by polling updated_at this
+# often; changes made in this process reach the heap on commit.
+REMINDER_RESYNC_SECONDS = int(os.environ.get("REMINDER_RESYNC_SECONDS", 60))
+RESYNC_OVERLAP = timedelta(seconds=5)
+# After a failed pass the loop waits at least this long before retrying,
+# and a batch that failed to fire is retried this often.
+REMINDER_RETRY_SECONDS = 5
+# A reminder is still fired this late: when retries keep failing, or when it
+# fell due while no scheduler was running (a restart or leader failover).
+# Later than this it is skipped until its next day.
+REMINDER_MAX_DELAY_SECONDS = int(os.environ.get("REMINDER_MAX_DELAY_SECONDS", 3600))
+# Name of the MySQL lock whose holder is the one process that fires reminders.
+REMINDER_LOCK_NAME = "smart_cane.reminder_scheduler"
+
+_PENDING_CHANGES = "reminder_changes"
+# rollup_state_tbl row whose high_water_at is the time up to which every
+# due reminder has been fired.
+_STATE_NAME = "reminder_scheduler"
+
+REMINDERS_FIRED = counter(
+    "reminders_fired_total",
+    "Reminders dispatched by the scheduler, by outcome.",
+    ("outcome",),
+)
+REMINDERS_SCHEDULED = gauge(
+    "reminders_scheduled",
+    "Active reminders currently held in the scheduler heap.",
+)
+
+
+def parse_reminder_time(value):
+    """Accepts a time or an "HH:MM[:SS]" string. Raises ValueError otherwise."""
+    if isinstance(value, dtime):
+        return value
+    if isinstance(value, timedelta):  # how some MySQL drivers return TIME
+        return (datetime.min + value).time()
+    try:
+        return dtime.fromisoformat(str(value))
+    except ValueError:
+        raise ValueError("reminder_time must be formatted as HH:MM or HH:MM:SS")
+
+
+def _to_naive_utc(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).replace(tzinfo=None)
+
+
+def next_fire_at(reminder_time, now=None):
+    """Epoch seconds of the next local occurrence of reminder_time after `now`."""
+    now = now if now is not None else time.time()
+    local_now = datetime.fromtimestamp(now, REMINDER_TIMEZONE)
+    fire_at = datetime.combine(local_now.date(), reminder_time, tzinfo=REMINDER_TIMEZONE)
+    if fire_at.timestamp() <= now:
+        fire_at = datetime.combine(
+            local_now.date() + timedelta(days=1), reminder_time, tzinfo=REMINDER_TIMEZONE
+        )
+    return fire_at.timestamp()
+
+
+class SchedulerLock:
+    """
+    Elects one scheduler across workers and replicas with a MySQL named lock
+    (GET_LOCK), held on a connection checked out for as long as this process
+    leads. The lock is released by the server if that connection drops, and
+    another process takes over on its next attempt. Other databases have no
+    named locks and are treated as single-process.
+    """
+
+    def __init__(self, engine, name=REMINDER_LOCK_NAME):
+        self.engine = engine
+        self.name = name
+        self._connection = None
+
+    def _release_connection(self):
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Exception:
+                pass
+            self._connection = None
+
+    def held(self):
+        """True while this process holds the lock, acquiring it if it is free."""
+        if self.engine.dialect.name != "mysql":
+            return True
+
+        if self._connection is not None:
+            try:
+                owned = self._connection.execute(
+                    text("SELECT IS_USED_LOCK(:name) = CONNECTION_ID()"),
+                    {"name": self.name},
+                ).scalar()
+                # Named locks outlive transactions; end this one so the
+                # connection does not sit idle inside it.
+                self._connection.commit()
+                if owned:
+                    return True
+            except Exception:
+                pass
+            self._release_connection()
+
+        connection = self.engine.connect()
+        try:
+            acquired = connection.execute(
+                text("SELECT GET_LOCK(:name, 0)"), {"name": self.name}
+            ).scalar()
+            connection.commit()
+        except Exception:
+            connection.close()
+            raise
+        if acquired != 1:
+            connection.close()
+            return False
+        self._connection = connection
+        return True
+
+
+class ReminderScheduler:
+    """
+    Keeps every active reminder in a min-heap keyed by its next fire time.
+    Changes bump a per-reminder version and push a fresh heap entry; stale
+    entries are skipped when they surface, so updates and deletes never
+    search the heap. Due reminders are re-read from the database in one
+    batch before firing, which makes the database the source of truth and
+    the heap only an index of when to look.
+
+    Heap entries are (when, reminder_id, version, due_at): `when` is the
+    next attempt, later than due_at for a retry. The time up to which
+    everything has fired is stored in rollup_state_tbl, so a scheduler that
+    takes over fires what came due while none was running.
+    """
+
+    def __init__(self, app, batch_size=REMINDER_BATCH_SIZE):
+        self.app = app
+        self.batch_size = batch_size
+        self._heap = []
+        self._versions = {}
+        self._version_counter = itertools.count(1)
+        self._condition = threading.Condition()
+        self._started = False
+        self._synced_at = None
+        self._lock = None
+        # reminder_id -> due_at of entries waiting for a retry.
+        self._retrying = {}
+
+    def start(self):
+        with self._condition:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._run, name="reminder-scheduler", daemon=True).start()
+
+    def schedule(self, reminder_id, reminder_time, is_active=True, now=None):
+        with self._condition:
+            version = next(self._version_counter)
+            if not is_active:
+                self._versions.pop(reminder_id, None)
+            else:
+                reminder_time = parse_reminder_time(reminder_time)
+                self._versions[reminder_id] = (version, reminder_time)
+                fire_at = next_fire_at(reminder_time, now)
+                heapq.heappush(self._heap, (fire_at, reminder_id, version, fire_at))
+            self._retrying.pop(reminder_id, None)
+            REMINDERS_SCHEDULED.set(len(self._versions))
+            self._condition.notify()
+
+    def unschedule(self, reminder_id):
+        with self._condition:
+            self._versions.pop(reminder_id, None)
+            self._retrying.pop(reminder_id, None)
+            REMINDERS_SCHEDULED.set(len(self._versions))
+
+    def pop_due(self, now=None):
+        """
+        Removes and returns up to batch_size due entries as
+        (reminder_id, reminder_time, version, due_at) tuples.
+        """
+        now = now if now is not None else time.time()
+        due = []
+        with self._condition:
+            while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+                _, reminder_id, version, due_at = heapq.heappop(self._heap)
+                current = self._versions.get(reminder_id)
+                if current is None or current[0] != version:
+                    continue
+                due.append((reminder_id, current[1], version, due_at))
+        return due
+
+    def reschedule(self, due, now=None):
+        """Queues the next occurrence of fired entries that have not changed since."""
+        with self._condition:
+            for reminder_id, reminder_time, version, _ in due:
+                self._retrying.pop(reminder_id, None)
+                current = self._versions.get(reminder_id)
+                if current is not None and current[0] == version:
+                    fire_at = next_fire_at(reminder_time, now)
+                    heapq.heappush(self._heap, (fire_at, reminder_id, version, fire_at))
+
+    def retry(self, due, now=None):
+        """
+        Queues a batch that failed to fire for another attempt in
+        REMINDER_RETRY_SECONDS. Entries already REMINDER_MAX_DELAY_SECONDS
+        past due are dropped and wait for their next day instead.
+        """
+        now = now if now is not None else time.time()
+        expired = [entry for entry in due if now - entry[3] >= REMINDER_MAX_DELAY_SECONDS]
+        if expired:
+            print(f"[reminder_scheduler] Skipped {len(expired)} reminders after failed retries")
+            REMINDERS_FIRED.inc(len(expired), outcome="missed")
+            self.reschedule(expired, now)
+
+        with self._condition:
+            for reminder_id, _, version, due_at in due:
+                if now - due_at >= REMINDER_MAX_DELAY_SECONDS:
+                    continue
+                current = self._versions.get(reminder_id)
+                if current is not None and current[0] == version:
+                    self._retrying[reminder_id] = due_at
+                    heapq.heappush(
+                        self._heap,
+                        (now + REMINDER_RETRY_SECONDS, reminder_id, version, due_at),
+                    )
+
+    def fired_through(self, now=None):
+        """
+        Epoch seconds up to which every due reminder has fired: `now`, or
+        just before the oldest occurrence still waiting for a retry.
+        """
+        now = now if now is not None else time.time()
+        with self._condition:
+            if self._retrying:
+                return min(now, min(self._retrying.values()) - 0.001)
+        return now
+
+    def save_progress(self, fired_through):
+        with Session(db.engine) as session:
+            state = session.get(RollupState, _STATE_NAME)
+            if state is None:
+                state = RollupState(name=_STATE_NAME, high_water_log_id=0)
+                session.add(state)
+            state.high_water_at = _to_naive_utc(fired_through)
+            session.commit()
+
+    def catch_up(self, now=None):
+        """
+        Queues for immediate firing every occurrence that fell due since the
+        stored progress mark, up to REMINDER_MAX_DELAY_SECONDS back. Run
+        once the heap holds all active reminders. Returns how many were
+        queued; nothing is queued before the mark is first written.
+        """
+        now = now if now is not None else time.time()
+        state = db.session.get(RollupState, _STATE_NAME)
+        if state is None or state.high_water_at is None:
+            return 0
+        since = max(
+            state.high_water_at.replace(tzinfo=timezone.utc).timestamp(),
+            now - REMINDER_MAX_DELAY_SECONDS,
+        )
+
+        queued = 0
+        with self._condition:
+            for reminder_id, (_, reminder_time) in list(self._versions.items()):
+                due_at = next_fire_at(reminder_time, now - 24 * 60 * 60)
+                if not since < due_at <= now:
+                    continue
+                # A new version retires the entry for the next occurrence,
+                # which reschedule() queues again once this one fires.
+                version = next(self._version_counter)
+                self._versions[reminder_id] = (version, reminder_time)
+                heapq.heappush(self._heap, (now, reminder_id, version, due_at))
+                queued += 1
+            self._condition.notify()
+        return queued
+
+    def seconds_until_next(self, now=None):
+        now = now if now is not None else time.time()
+        with self._condition:
+            while self._heap:
+                _, reminder_id, version, _ = self._heap[0]
+                current = self._versions.get(reminder_id)
+                if current is not None and current[0] == version:
+                    return max(0.0, self._heap[0][0] - now)
+                heapq.heappop(self._heap)
+        return None
+
+    def sync(self):
+        """
+        Loads active reminders changed since the last sync (all of them the
+        first time) and reschedules them. Deactivated rows are dropped here;
+        deleted rows are dropped when they come due and are no longer found.
+        """
+        query = db.session.query(
+            NoteReminder.note_reminder_id,
+            NoteReminder.reminder_time,
+            NoteReminder.is_active,
+            NoteReminder.updated_at,
+        )
+        synced_at = datetime.now(timezone.utc).replace(tzinfo=None)
+        if self._synced_at is not None:
+            query = query.filter(NoteReminder.updated_at >= self._synced_at - RESYNC_OVERLAP)
+        else:
+            query = query.filter(NoteReminder.is_active.is_(True))
+
+        for reminder_id, reminder_time, is_active, _ in query.yield_per(1000):
+            current = self._versions.get(reminder_id)
+            if is_active and current is not None:
+                if current[1] == parse_reminder_time(reminder_time):
+                    continue
+            self.schedule(reminder_id, reminder_time, bool(is_active))
+
+        self._synced_at = synced_at
+        db.session.remove()
+
+    def fire(self, due):
+        """
+        Writes one REMINDER device log per device of each due reminder's VIP
+        and pushes the message to the guardian who set it. Reminders that
+        were deleted, deactivated or moved since they were scheduled are
+        skipped. Everything is loaded and written in a fixed number of
+        queries per batch.
+        """
+        scheduled = {reminder_id: reminder_time for reminder_id, reminder_time, *_ in due}
+        found = NoteReminder.query.filter(
+            NoteReminder.note_reminder_id.in_(scheduled),
+            NoteReminder.is_active.is_(True),
+        ).all()
+
+        for reminder_id in scheduled.keys() - {r.note_reminder_id for r in found}:
+            self.unschedule(reminder_id)
+
+        reminders = [
+            reminder
+            for reminder in found
+            if parse_reminder_time(reminder.reminder_time)
+            == scheduled[reminder.note_reminder_id]
+        ]
+        if not reminders:
+            REMINDERS_FIRED.inc(len(due), outcome="stale")
+            return 0
+
+        devices_by_vip = {}
+        for device_id, vip_id in db.session.query(Device.device_id, Device.vip_id).filter(
+            Device.vip_id.in_({reminder.vip_id for reminder in reminders})
+        ):
+            devices_by_vip.setdefault(vip_id, []).append(device_id)
+
+        now = datetime.now(timezone.utc)
+        rows = [
+            {
+                "device_id": device_id,
+                "guardian_id": reminder.guardian_id,
+                "activity_type": "REMINDER",
+                "status": "sent",
+                "message": reminder.message,
+                "metadata_json": {"note_reminder_id": reminder.note_reminder_id},
+                "created_at": now,
+            }
+            for reminder in reminders
+            for device_id in devices_by_vip.get(reminder.vip_id, [])
+        ]
+        if rows:
+            with Session(db.engine) as session:
+                session.execute(insert(DeviceLog), rows)
+                session.commit()
+
+        # The device logs are the durable record and are committed; a push
+        # failure must not make a retry write them twice.
+        try:
+            self._push(reminders)
+        except Exception as e:
+            print(f"[reminder_scheduler] Reminder push failed: {e}")
+
+        REMINDERS_FIRED.inc(len(reminders), outcome="fired")
+        REMINDERS_FIRED.inc(len(due) - len(reminders), outcome="stale")
+        return len(reminders)
+
+    def _push(self, reminders):
+        sender = self.app.extensions.get("web_push")
+        if sender is None:
+            return
+
+        subscriptions_by_guardian = {}
+        for subscription in PushSubscription.query.filter(
+            PushSubscription.guardian_id.in_({r.guardian_id for r in reminders})
+        ):
+            subscriptions_by_guardian.setdefault(subscription.guardian_id, []).append(
+                subscription
+            )
+
+        sender.send_many(
+            [
+                (
+                    subscription,
+                    {
+                        "type": "reminder",
+                        "title": "Reminder",
+                        "body": reminder.message,
+                        "noteReminderId": reminder.note_reminder_id,
+                        "vipId": reminder.vip_id,
+                    },
+                )
+                for reminder in reminders
+                for subscription in subscriptions_by_guardian.get(reminder.guardian_id, [])
+            ],
+            **EVENT_DELIVERY["reminder"],
+        )
+
+    def _run(self):
+        next_sync = 0
+        leading = False
+        catching_up = False
+        while True:
+            failed = False
+            try:
+                with self.app.app_context():
+                    if self._lock is None:
+                        self._lock = SchedulerLock(db.engine)
+                    if not self._lock.held():
+                        if leading:
+                            print("[reminder_scheduler] Lost the scheduler lock; standing by")
+                        leading = False
+                        with self._condition:
+                            self._condition.wait(REMINDER_RESYNC_SECONDS)
+                        continue
+                    if not leading:
+                        # Reload everything: edits made elsewhere while this
+                        # process stood by were never polled.
+                        leading = True
+                        catching_up = True
+                        self._synced_at = None
+                        next_sync = 0
+
+                    if time.monotonic() >= next_sync:
+                        # Set first, so a failing sync is retried on the
+                        # resync interval rather than in a tight loop.
+                        next_sync = time.monotonic() + REMINDER_RESYNC_SECONDS
+                        self.sync()
+                        if catching_up:
+                            queued = self.catch_up()
+                            catching_up = False
+                            if queued:
+                                print(f"[reminder_scheduler] Catching up on {queued} missed reminders")
+
+                    pass_started = time.time()
+                    due = self.pop_due(pass_started)
+                    while due:
+                        try:
+                            self.fire(due)
+                        except Exception:
+                            self.retry(due)
+                            raise
+                        else:
+                            self.reschedule(due)
+                        finally:
+                            db.session.remove()
+                        due = self.pop_due(pass_started)
+                    self.save_progress(self.fired_through(pass_started))
+            except Exception as e:
+                failed = True
+                print(f"[reminder_scheduler] Dispatch failed: {e}")
+
+            wait = self.seconds_until_next()
+            until_sync = max(0.0, next_sync - time.monotonic())
+            timeout = until_sync if wait is None else min(wait, until_sync)
+            if failed:
+                timeout = max(timeout, REMINDER_RETRY_SECONDS)
+            with self._condition:
+                self._condition.wait(timeout)
+
+
+@event.listens_for(NoteReminder, "after_insert")
+@event.listens_for(NoteReminder, "after_update")
+def _stage_reminder_change(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault(_PENDING_CHANGES, []).append(
+            (target.note_reminder_id, target.reminder_time, bool(target.is_active))
+        )
+
+
+@event.listens_for(NoteReminder, "after_delete")
+def _stage_reminder_delete(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault(_PENDING_CHANGES, []).append(
+            (target.note_reminder_id, None, False)
+        )
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_reminder_changes(session):
+    changes = session.info.pop(_PENDING_CHANGES, None)
+    scheduler = _scheduler
+    if not changes or scheduler is None:
+        return
+    for reminder_id, reminder_time, is_active in changes:
+        try:
+            scheduler.schedule(reminder_id, reminder_time, is_active)
+        except ValueError as e:
+            print(f"[reminder_scheduler] Reminder {reminder_id} not scheduled: {e}")
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_reminder_changes(session, previous_transaction):
+    session.info.pop(_PENDING_CHANGES, None)
+
+
+_scheduler = None
+
+
+def init_reminder_scheduler(app):
+    """
+    Attaches the scheduler and starts it on the first request. Every
+    worker and replica may start one; on MySQL they elect a single runner
+    through SchedulerLock and the rest stand by to take over. Set
+    REMINDER_SCHEDULER=0 to keep a process out of the election entirely.
+    """
+    global _scheduler
+
+    if os.environ.get("REMINDER_SCHEDULER", "1") != "1":
+        return None
+
+    _scheduler = ReminderScheduler(app)
+    app.extensions["reminder_scheduler"] = _scheduler
+
+    @app.before_request
+    def start_reminder_scheduler():
+        _scheduler.start()
+
+    return _scheduler
@@ -0,0 +1,102 @@
+import numpy as np
+
+
+EARTH_RADIUS_M = 6371008.8
+
+
+def project_to_meters(lat, lng):
+    """
+    Equirectangular projection around the track's first point. Accurate to
+    well under a metre over the few kilometres a cane covers in a day, and
+    cheap enough to run over every fix.
+    """
+    lat0 = np.radians(lat[0])
+    x = np.radians(lng - lng[0]) * np.cos(lat0) * EARTH_RADIUS_M
+    y = np.radians(lat - lat[0]) * EARTH_RADIUS_M
+    return np.column_stack((x, y))
+
+
+def douglas_peucker(xy, tolerance_m):
+    """
+    Returns the sorted indices of the points kept by Douglas-Peucker. The
+    recursion is unrolled onto a stack and each step measures the distance
+    of a whole segment's interior points to the chord in one vector pass.
+    """
+    count = len(xy)
+    if count <= 2 or tolerance_m <= 0:
+        return np.arange(count)
+
+    keep = np.zeros(count, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+
+        a = xy[start]
+        ab = xy[end] - a
+        interior = xy[start + 1 : end] - a
+        length_sq = ab @ ab
+
+        if length_sq == 0:
+            offsets = interior
+        else:
+            t = np.clip(interior @ ab / length_sq, 0.0, 1.0)
+            offsets = interior - t[:, None] * ab
+
+        distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        farthest = int(np.argmax(distances))
+
+        if distances[farthest] > tolerance_m:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+
+    return np.flatnonzero(keep)
+
+
+def bucket_downsample(epoch_seconds, max_points):
+    """
+    Keeps the first point of each of `max_points - 1` equal time buckets
+    plus the final point, so long stationary gaps do not eat the budget.
+    `max_points` must be at least 2.
+    """
+    count = len(epoch_seconds)
+    if count <= max_points:
+        return np.arange(count)
+
+    span = epoch_seconds[-1] - epoch_seconds[0]
+    if span <= 0:
+        return np.array([0, count - 1])
+
+    buckets = ((epoch_seconds - epoch_seconds[0]) / span * (max_points - 1)).astype(
+        np.int64
+    )
+    # Points at the final timestamp would get a bucket of their own, whose
+    # first point plus the final one would overrun the budget by one.
+    buckets = np.minimum(buckets, max_points - 2)
+    _, first_in_bucket = np.unique(buckets, return_index=True)
+    return np.union1d(first_in_bucket, [count - 1])
+
+
+def simplify_track(lat, lng, epoch_seconds, tolerance_m, max_points):
+    """
+    Douglas-Peucker at `tolerance_m`, then time-bucket downsampling if the
+    result still exceeds `max_points`. Returns indices into the inputs.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lng = np.asarray(lng, dtype=np.float64)
+    epoch_seconds = np.asarray(epoch_seconds, dtype=np.float64)
+
+    if len(lat) == 0:
+        return np.arange(0)
+
+    kept = douglas_peucker(project_to_meters(lat, lng), tolerance_m)
+
+    if len(kept) > max_points:
+        kept = kept[bucket_downsample(epoch_seconds[kept], max_points)]
+
+    return kept
@@ -0,0 +1,372 @@
+import base64
+import ipaddress
+import json
+import os
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from requests.adapters import HTTPAdapter
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import DeviceGuardian, PushSubscription
+from app.utils.metrics import counter
+
+
+WEB_PUSH_WORKERS = int(os.environ.get("WEB_PUSH_WORKERS", 16))
+WEB_PUSH_TIMEOUT_SECONDS = 10
+VAPID_TOKEN_LIFETIME_SECONDS = 12 * 60 * 60
+
+# A push message body is capped at 4096 bytes; the aes128gcm header takes 86
+# of them, the GCM tag 16 and the record delimiter 1.
+RECORD_SIZE = 4096
+MAX_PAYLOAD_BYTES = RECORD_SIZE - 86 - 16 - 1
+
+# Browsers only hand out endpoints on their vendors' push services. Anything
+# else is refused, so a subscription cannot aim the server's requests at
+# internal hosts.
+PUSH_SERVICE_HOSTS = ("fcm.googleapis.com", "web.push.apple.com")
+PUSH_SERVICE_DOMAINS = (".push.services.mozilla.com", ".notify.windows.com")
+
+EVENT_DELIVERY = {
+    "emergency": {"urgency": "high", "ttl": 60 * 60},
+    "fall": {"urgency": "high", "ttl": 60 * 60},
+    "reminder": {"urgency": "normal", "ttl": 6 * 60 * 60},
+}
+
+WEB_PUSH_RESULTS = counter(
+    "web_push_messages_total",
+    "Web push deliveries by outcome (sent, expired, failed).",
+    ("outcome",),
+)
+
+
+def b64url_encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def b64url_decode(value):
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+
+def _hkdf(salt, ikm, info, length):
+    return HKDF(algorithm=hashes.SHA256(), length=length, salt=salt, info=info).derive(ikm)
+
+
+def _public_bytes(public_key):
+    return public_key.public_bytes(
+        serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint
+    )
+
+
+def validate_push_endpoint(endpoint):
+    """
+    Raises ValueError unless `endpoint` is an https URL on a known push
+    service, with no credentials, custom port or IP-literal host.
+    """
+    if not isinstance(endpoint, str):
+        raise ValueError("Push endpoint must be a string")
+
+    try:
+        parts = urlsplit(endpoint)
+        port = parts.port
+    except ValueError:
+        raise ValueError("Push endpoint is not a valid URL")
+
+    if parts.scheme != "https":
+        raise ValueError("Push endpoint must use https")
+    if parts.username is not None or parts.password is not None:
+        raise ValueError("Push endpoint must not carry credentials")
+    if port not in (None, 443):
+        raise ValueError("Push endpoint must use the default https port")
+
+    host = (parts.hostname or "").rstrip(".").lower()
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        address = None
+    if address is not None:
+        kind = "a private" if address.is_private or address.is_link_local else "an IP"
+        raise ValueError(f"Push endpoint must not be {kind} address")
+
+    if host not in PUSH_SERVICE_HOSTS and not host.endswith(PUSH_SERVICE_DOMAINS):
+        raise ValueError("Push endpoint is not on a known push service")
+
+
+def encrypt_payload(payload, p256dh, auth):
+    """
+    Encrypts `payload` (bytes) for one subscription as a single aes128gcm
+    record (RFC 8188) keyed as RFC 8291 describes. Returns the request body.
+    """
+    if len(payload) > MAX_PAYLOAD_BYTES:
+        raise ValueError(f"Push payload exceeds {MAX_PAYLOAD_BYTES} bytes")
+
+    ua_public = b64url_decode(p256dh)
+    auth_secret = b64url_decode(auth)
+
+    as_private = ec.generate_private_key(ec.SECP256R1())
+    as_public = _public_bytes(as_private.public_key())
+    shared_secret = as_private.exchange(
+        ec.ECDH(), ec.EllipticCurvePublicKey.from_encoded_point(ec.SECP256R1(), ua_public)
+    )
+
+    ikm = _hkdf(
+        auth_secret, shared_secret, b"WebPush: info\x00" + ua_public + as_public, 32
+    )
+    salt = os.urandom(16)
+    cek = _hkdf(salt, ikm, b"Content-Encoding: aes128gcm\x00", 16)
+    nonce = _hkdf(salt, ikm, b"Content-Encoding: nonce\x00", 12)
+
+    ciphertext = AESGCM(cek).encrypt(nonce, payload + b"\x02", None)
+    header = salt + struct.pack("!IB", RECORD_SIZE, len(as_public)) + as_public
+    return header + ciphertext
+
+
+def load_vapid_key(value):
+    """Accepts a PEM private key or the base64url raw scalar web-push tools print."""
+    if value.strip().startswith("-----BEGIN"):
+        return serialization.load_pem_private_key(value.encode("utf-8"), password=None)
+    return ec.derive_private_key(
+        int.from_bytes(b64url_decode(value.strip()), "big"), ec.SECP256R1()
+    )
+
+
+class VapidSigner:
+    """Signs one ES256 VAPID token per push-service origin and reuses it until near expiry."""
+
+    def __init__(self, private_key, subject):
+        self.private_key = private_key
+        self.subject = subject
+        self.public_key = b64url_encode(_public_bytes(private_key.public_key()))
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def _sign(self, audience, expires_at):
+        header = b64url_encode(json.dumps({"typ": "JWT", "alg": "ES256"}).encode())
+        claims = b64url_encode(
+            json.dumps({"aud": audience, "exp": expires_at, "sub": self.subject}).encode()
+        )
+        signing_input = f"{header}.{claims}".encode("ascii")
+        r, s = decode_dss_signature(
+            self.private_key.sign(signing_input, ec.ECDSA(hashes.SHA256()))
+        )
+        signature = r.to_bytes(32, "big") + s.to_bytes(32, "big")
+        return f"{header}.{claims}.{b64url_encode(signature)}"
+
+    def authorization(self, endpoint):
+        parts = urlsplit(endpoint)
+        audience = f"{parts.scheme}://{parts.netloc}"
+        now = int(time.time())
+
+        with self._lock:
+            token, expires_at = self._tokens.get(audience, (None, 0))
+            if expires_at - now < VAPID_TOKEN_LIFETIME_SECONDS // 4:
+                expires_at = now + VAPID_TOKEN_LIFETIME_SECONDS
+                token = self._sign(audience, expires_at)
+                self._tokens[audience] = (token, expires_at)
+
+        return f"vapid t={token}, k={self.public_key}"
+
+
+class WebPushSender:
+    """
+    Delivers push messages over one pooled HTTP session, at most
+    WEB_PUSH_WORKERS requests at a time. Subscriptions the push service
+    reports gone (404/410) are deleted in one statement per batch.
+    Endpoints are checked with validate_push_endpoint before each request;
+    benchmarks that point at a local push service turn that off with
+    allow_any_endpoint.
+    """
+
+    allow_any_endpoint = False
+
+    def __init__(self, app, signer, workers=WEB_PUSH_WORKERS):
+        self.app = app
+        self.signer = signer
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=workers)
+        self.http.mount("https://", adapter)
+        self.http.mount("http://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="web-push")
+        # Fan-outs wait on deliveries, so they get their own threads rather
+        # than occupying the delivery pool.
+        self._fanout = ThreadPoolExecutor(max_workers=2, thread_name_prefix="web-push-fanout")
+
+    def _deliver(self, endpoint, body, ttl, urgency):
+        if not self.allow_any_endpoint:
+            try:
+                validate_push_endpoint(endpoint)
+            except ValueError as e:
+                print(f"[web_push] Delivery refused: {e}")
+                return "failed"
+
+        try:
+            response = self.http.post(
+                endpoint,
+                data=body,
+                headers={
+                    "Authorization": self.signer.authorization(endpoint),
+                    "Content-Encoding": "aes128gcm",
+                    "Content-Type": "application/octet-stream",
+                    "TTL": str(ttl),
+                    "Urgency": urgency,
+                },
+                timeout=WEB_PUSH_TIMEOUT_SECONDS,
+                # A redirect could lead anywhere; push services do not send them.
+                allow_redirects=False,
+            )
+        except requests.RequestException as e:
+            print(f"[web_push] Delivery to {urlsplit(endpoint).netloc} failed: {e}")
+            return "failed"
+
+        if response.status_code in (404, 410):
+            return "expired"
+        if response.status_code >= 300:
+            print(f"[web_push] {urlsplit(endpoint).netloc} answered {response.status_code}")
+            return "failed"
+        return "sent"
+
+    def send_many(self, messages, ttl=24 * 60 * 60, urgency="normal"):
+        """
+        Sends each (subscription, payload) pair, where payload is a dict, and
+        waits for the batch. A subscription endpoint is sent each distinct
+        payload once even if it appears several times. Returns counts by
+        outcome.
+        """
+        encoded = {}
+        jobs = {}
+        for subscription, payload in messages:
+            key = id(payload)
+            if key not in encoded:
+                encoded[key] = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+            jobs.setdefault(
+                (subscription.endpoint, key),
+                (
+                    subscription.subscription_id,
+                    subscription.endpoint,
+                    subscription.p256dh,
+                    subscription.auth,
+                    encoded[key],
+                ),
+            )
+
+        futures = []
+        for subscription_id, endpoint, p256dh, auth, payload in jobs.values():
+            try:
+                body = encrypt_payload(payload, p256dh, auth)
+            except ValueError as e:
+                print(f"[web_push] Subscription {subscription_id} skipped: {e}")
+                WEB_PUSH_RESULTS.inc(outcome="failed")
+                continue
+            futures.append(
+                (
+                    subscription_id,
+                    self._executor.submit(self._deliver, endpoint, body, ttl, urgency),
+                )
+            )
+
+        results = {"sent": 0, "expired": 0, "failed": 0}
+        expired_ids = set()
+        for subscription_id, future in futures:
+            outcome = future.result()
+            results[outcome] += 1
+            WEB_PUSH_RESULTS.inc(outcome=outcome)
+            if outcome == "expired":
+                expired_ids.add(subscription_id)
+
+        if expired_ids:
+            self.prune(expired_ids)
+
+        return results
+
+    def prune(self, subscription_ids):
+        with self.app.app_context(), Session(db.engine) as session:
+            session.query(PushSubscription).filter(
+                PushSubscription.subscription_id.in_(subscription_ids)
+            ).delete(synchronize_session=False)
+            session.commit()
+
+    def send_device_event(self, device_ids, event_type, payload):
+        """
+        Pushes `payload` to every subscription of every guardian linked to
+        the devices, resolved in one query. Returns counts by outcome.
+        """
+        delivery = EVENT_DELIVERY.get(event_type, EVENT_DELIVERY["reminder"])
+        with self.app.app_context(), Session(db.engine) as session:
+            subscriptions = (
+                session.query(PushSubscription)
+                .join(
+                    DeviceGuardian,
+                    DeviceGuardian.guardian_id == PushSubscription.guardian_id,
+                )
+                .filter(DeviceGuardian.device_id.in_(list(device_ids)))
+                .distinct()
+                .all()
+            )
+            session.expunge_all()
+
+        message = {"type": event_type, **payload}
+        return self.send_many(
+            [(subscription, message) for subscription in subscriptions],
+            ttl=delivery["ttl"],
+            urgency=delivery["urgency"],
+        )
+
+    def send_guardian_event(self, guardian_ids, event_type, payload):
+        """send_device_event for an already resolved set of guardians."""
+        delivery = EVENT_DELIVERY.get(event_type, EVENT_DELIVERY["reminder"])
+        with self.app.app_context(), Session(db.engine) as session:
+            subscriptions = (
+                session.query(PushSubscription)
+                .filter(PushSubscription.guardian_id.in_(list(guardian_ids)))
+                .all()
+            )
+            session.expunge_all()
+
+        message = {"type": event_type, **payload}
+        return self.send_many(
+            [(subscription, message) for subscription in subscriptions],
+            ttl=delivery["ttl"],
+            urgency=delivery["urgency"],
+        )
+
+    def publish_device_event(self, device_ids, event_type, payload):
+        """send_device_event in the background, so a request never waits on push services."""
+        return self._fanout.submit(
+            self._run_logged, self.send_device_event, device_ids, event_type, payload
+        )
+
+    @staticmethod
+    def _run_logged(fn, *args):
+        try:
+            return fn(*args)
+        except Exception as e:
+            print(f"[web_push] Fan-out failed: {e}")
+
+
+def init_web_push(app):
+    """
+    Registers app.extensions["web_push"] when VAPID_PRIVATE_KEY is set.
+    VAPID_SUBJECT is the contact URI push services see (mailto: or https:).
+    """
+    private_key = app.config.get("VAPID_PRIVATE_KEY")
+    if not private_key:
+        print("[web_push] VAPID_PRIVATE_KEY not set; push notifications are disabled")
+        return None
+
+    signer = VapidSigner(
+        load_vapid_key(private_key),
+        app.config.get("VAPID_SUBJECT") or "mailto:admin@icane.org",
+    )
+    sender = WebPushSender(app, signer)
+    app.extensions["web_push"] = sender
+    return sender
@@ -0,0 +1,59 @@
+"""
+Micro-benchmark for email rendering cost per send.
+
+Compares rendering a precompiled template from app/utils/email_templates.py
+with building the whole document on every send (compile + render), which is
+what the old send functions did with their inline f-string bodies.
+
+    python benchmarks/email_templates.py [iterations]
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.email_templates import (  # noqa: E402
+    TEMPLATE_SOURCES,
+    CompiledTemplate,
+    render_email,
+)
+
+
+SAMPLE_VALUES = {
+    "otp": {"otp_code": "482913", "guardian_name": "Maria Santos"},
+    "password_reset": {"otp_code": "482913", "guardian_name": "Maria Santos"},
+    "guardian_invite": {
+        "guardian_name": "Maria Santos",
+        "vip_name": "Juan Dela Cruz",
+        "invite_link": "https://icane.example/invite/3f2a9c1e?token=abc&ref=mail",
+    },
+    "email_change_otp": {"otp_code": "482913", "guardian_name": "Maria Santos"},
+    "profile_update_otp": {"otp_code": "482913", "guardian_name": "Maria Santos"},
+}
+
+
+def per_call_us(statement, iterations):
+    return timeit.timeit(statement, number=iterations) / iterations * 1_000_000
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    print(f"{'template':<20} {'compile':>10} {'render':>10} {'uncached':>10}")
+    for name, values in SAMPLE_VALUES.items():
+        source = TEMPLATE_SOURCES[name]
+        compile_us = per_call_us(lambda: CompiledTemplate(name, source), iterations // 10)
+        render_us = per_call_us(lambda: render_email(name, **values), iterations)
+        uncached_us = per_call_us(
+            lambda: CompiledTemplate(name, source).render(**values), iterations // 10
+        )
+
+        print(
+            f"{name:<20} {compile_us:>8.1f}us {render_us:>8.1f}us {uncached_us:>8.1f}us"
+        )
+
+
+if __name__ == "__main__":
+    main()
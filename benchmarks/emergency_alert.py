@@ -0,0 +1,221 @@
+"""
+End-to-end latency benchmark for the emergency alert fast path.
+
+Seeds a throwaway VIP, device and guardians (with push subscriptions on a
+local fake push service) in the configured DATABASE_URL, posts emergency
+reports to POST /api/device/emergency and measures, per alert:
+
+  * ingest:  report received -> 201 response (alert committed)
+  * push:    report received -> last guardian push delivered
+  * repeat:  a retrigger inside the dedupe window -> 200 response
+
+and checks push latency against the sub-second budget and that repeats
+push nothing. Each alert's dedupe window is closed before the next one,
+as an acknowledgement would. The seeded rows are deleted afterwards.
+
+    python benchmarks/emergency_alert.py [alerts] [guardians] [push-latency-ms]
+"""
+
+import json
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cryptography.hazmat.primitives.asymmetric import ec  # noqa: E402
+
+from web_push import make_server  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+from app.models import (  # noqa: E402
+    VIP,
+    Device,
+    DeviceGuardian,
+    DeviceLog,
+    EmergencyAlert,
+    Guardian,
+    PushSubscription,
+)
+from app.utils.web_push import (  # noqa: E402
+    VapidSigner,
+    WebPushSender,
+    _public_bytes,
+    b64url_encode,
+)
+
+
+LATENCY_BUDGET_MS = 1000
+SUBSCRIPTIONS_PER_GUARDIAN = 2
+
+
+class Arrivals(list):
+    """Collects (arrival time, alertId) for every decrypted push message."""
+
+    def append(self, message):
+        super().append((time.perf_counter(), json.loads(message)["alertId"]))
+
+
+def seed(tag, guardians, base_url, keys):
+    vip = VIP(first_name="Bench", last_name=tag)
+    device = Device(device_serial_number=f"BENCH-{tag}", vip=vip, is_paired=True)
+    db.session.add(device)
+
+    for index in range(guardians):
+        guardian = Guardian(
+            username=f"bench-{tag}-{index}",
+            email=f"bench-{tag}-{index}@example.com",
+            password="x",
+            first_name="Bench",
+            last_name=str(index),
+        )
+        db.session.add(
+            DeviceGuardian(
+                device=device,
+                guardian=guardian,
+                role="primary" if index == 0 else "guardian",
+                is_emergency_contact=index == 0,
+            )
+        )
+        for slot in range(SUBSCRIPTIONS_PER_GUARDIAN):
+            name = f"{tag}-{index}-{slot}"
+            ua_private = ec.generate_private_key(ec.SECP256R1())
+            auth_secret = os.urandom(16)
+            keys[name] = (ua_private, auth_secret)
+            db.session.add(
+                PushSubscription(
+                    guardian=guardian,
+                    endpoint=base_url + name,
+                    p256dh=b64url_encode(_public_bytes(ua_private.public_key())),
+                    auth=b64url_encode(auth_secret),
+                )
+            )
+
+    db.session.commit()
+    return SimpleNamespace(
+        serial=device.device_serial_number,
+        device_id=device.device_id,
+        vip_id=vip.vip_id,
+    )
+
+
+def cleanup(seeded, tag):
+    guardian_ids = [
+        guardian_id
+        for (guardian_id,) in db.session.query(Guardian.guardian_id).filter(
+            Guardian.username.like(f"bench-{tag}-%")
+        )
+    ]
+    EmergencyAlert.query.filter_by(device_id=seeded.device_id).delete()
+    DeviceLog.query.filter_by(device_id=seeded.device_id).delete()
+    PushSubscription.query.filter(PushSubscription.guardian_id.in_(guardian_ids)).delete()
+    DeviceGuardian.query.filter_by(device_id=seeded.device_id).delete()
+    Device.query.filter_by(device_id=seeded.device_id).delete()
+    Guardian.query.filter(Guardian.guardian_id.in_(guardian_ids)).delete()
+    VIP.query.filter_by(vip_id=seeded.vip_id).delete()
+    db.session.commit()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main(app=None):
+    alerts = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    guardians = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    push_latency = (float(sys.argv[3]) if len(sys.argv) > 3 else 30) / 1000
+
+    app = app or create_app()
+    app.config.setdefault("DEVICE_GATEWAY_KEY", None)
+    gateway_key = app.config["DEVICE_GATEWAY_KEY"] or "bench-gateway-key"
+    app.config["DEVICE_GATEWAY_KEY"] = gateway_key
+
+    keys = {}
+    arrivals = Arrivals()
+    server = make_server(keys, push_latency, arrivals)
+    base_url = f"http://127.0.0.1:{server.server_port}/"
+
+    signer = VapidSigner(ec.generate_private_key(ec.SECP256R1()), "mailto:bench@example.com")
+    sender = WebPushSender(app, signer)
+    # The stand-in push service listens on plain http on localhost.
+    sender.allow_any_endpoint = True
+    app.extensions["web_push"] = sender
+
+    tag = str(int(time.time()))
+    expected = guardians * SUBSCRIPTIONS_PER_GUARDIAN
+    client = app.test_client()
+
+    with app.app_context():
+        seeded = seed(tag, guardians, base_url, keys)
+
+    deduper = app.extensions["emergency_deduper"]
+    report = {
+        "device_serial_number": seeded.serial,
+        "type": "SOS",
+        "lat": 14.6760,
+        "lng": 121.0437,
+        "location": "Brgy. Bagbag, Novaliches, Quezon City",
+    }
+
+    def post_report():
+        return client.post(
+            "/api/device/emergency", json=report, headers={"X-Device-Key": gateway_key}
+        )
+
+    ingest_ms, push_ms, repeat_ms = [], [], []
+    try:
+        for _ in range(alerts):
+            started = time.perf_counter()
+            response = post_report()
+            ingest_ms.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 201, response.get_json()
+            alert_id = response.get_json()["data"]["alertId"]
+
+            deadline = time.perf_counter() + 10
+            while time.perf_counter() < deadline:
+                delivered = [at for at, aid in list(arrivals) if aid == alert_id]
+                if len(delivered) >= expected:
+                    push_ms.append((max(delivered) - started) * 1000)
+                    break
+                time.sleep(0.002)
+            else:
+                push_ms.append(float("inf"))
+
+            started = time.perf_counter()
+            response = post_report()
+            repeat_ms.append((time.perf_counter() - started) * 1000)
+            assert response.get_json()["data"]["deduplicated"], response.get_json()
+            deduper.close(alert_id)
+
+        # Any push a repeat had triggered would have landed by now.
+        time.sleep(push_latency * 3)
+        repeat_pushes = len(arrivals) - alerts * expected
+    finally:
+        server.shutdown()
+        with app.app_context():
+            cleanup(seeded, tag)
+
+    print(
+        f"alerts={alerts} guardians={guardians} subscriptions={expected} "
+        f"push_service_latency_ms={push_latency * 1000:.0f}"
+    )
+    print(f"{'stage':<8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    for stage, values in (("ingest", ingest_ms), ("push", push_ms), ("repeat", repeat_ms)):
+        print(
+            f"{stage:<8} {statistics.median(values):>8.1f} "
+            f"{percentile(values, 0.95):>8.1f} {max(values):>8.1f}"
+        )
+
+    worst_p95 = percentile(push_ms, 0.95)
+    verdict = "PASS" if worst_p95 <= LATENCY_BUDGET_MS and not repeat_pushes else "FAIL"
+    print(
+        f"{verdict}: push p95 {worst_p95:.1f} ms against a {LATENCY_BUDGET_MS} ms budget, "
+        f"{repeat_pushes} pushes from repeats"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Login throughput benchmark for password verification.
+
+Measures bcrypt verifications per second at several cost factors, once on
+the calling thread and once spread over the pool in
+app/utils/password_hashing.py, and reports logins/sec per core.
+
+    python benchmarks/password_hashing.py [seconds-per-run] [rounds ...]
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.password_hashing import (  # noqa: E402
+    PASSWORD_HASH_WORKERS,
+    _checkpw,
+    _hashpw,
+    verify_password,
+)
+
+
+PASSWORD = "correct horse battery staple"
+
+
+def verifications_per_second(verify, hashed, seconds, clients):
+    deadline = time.perf_counter() + seconds
+    done = [0] * clients
+
+    def client(index):
+        while time.perf_counter() < deadline:
+            verify(PASSWORD, hashed)
+            done[index] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(client, range(clients)))
+    return sum(done) / (time.perf_counter() - started)
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    rounds_list = [int(arg) for arg in sys.argv[2:]] or [10, 11, 12]
+    cores = os.cpu_count() or 1
+    clients = PASSWORD_HASH_WORKERS * 2
+
+    print(f"cores={cores} pool_workers={PASSWORD_HASH_WORKERS} clients={clients}")
+    print(f"{'rounds':>6} {'1 thread/s':>12} {'pool/s':>10} {'per core/s':>11} {'verify ms':>10}")
+    for rounds in rounds_list:
+        hashed = _hashpw(PASSWORD, rounds)
+
+        started = time.perf_counter()
+        verify_password(PASSWORD, hashed)
+        single_ms = (time.perf_counter() - started) * 1000
+
+        serial = verifications_per_second(_checkpw, hashed, seconds, 1)
+        pooled = verifications_per_second(verify_password, hashed, seconds, clients)
+        print(
+            f"{rounds:>6} {serial:>12.1f} {pooled:>10.1f} "
+            f"{pooled / cores:>11.1f} {single_ms:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Web push fan-out benchmark against a local fake push service.
+
+Starts an HTTP server that plays the push service: it decrypts every body
+with the subscriber's key (so a bad RFC 8291 encoding fails loudly),
+checks the VAPID header, sleeps to mimic network latency and answers 201,
+or 410 for endpoints marked gone. Then it times WebPushSender.send_many
+for a fan-out of N subscriptions.
+
+    python benchmarks/web_push.py [subscriptions] [latency-ms]
+"""
+
+import os
+import struct
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cryptography.hazmat.primitives.asymmetric import ec  # noqa: E402
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM  # noqa: E402
+
+from app.utils.web_push import (  # noqa: E402
+    WEB_PUSH_WORKERS,
+    VapidSigner,
+    WebPushSender,
+    _hkdf,
+    _public_bytes,
+    b64url_encode,
+)
+
+
+def decrypt(body, ua_private, auth_secret):
+    salt, _, key_length = body[:16], *struct.unpack("!IB", body[16:21])
+    as_public = body[21 : 21 + key_length]
+    ua_public = _public_bytes(ua_private.public_key())
+    shared_secret = ua_private.exchange(
+        ec.ECDH(), ec.EllipticCurvePublicKey.from_encoded_point(ec.SECP256R1(), as_public)
+    )
+    ikm = _hkdf(
+        auth_secret, shared_secret, b"WebPush: info\x00" + ua_public + as_public, 32
+    )
+    cek = _hkdf(salt, ikm, b"Content-Encoding: aes128gcm\x00", 16)
+    nonce = _hkdf(salt, ikm, b"Content-Encoding: nonce\x00", 12)
+    plaintext = AESGCM(cek).decrypt(nonce, body[21 + key_length :], None)
+    return plaintext.rstrip(b"\x00")[:-1]
+
+
+def make_server(keys, latency, received):
+    class PushService(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            assert self.headers["Authorization"].startswith("vapid t=")
+            time.sleep(latency)
+
+            name = self.path.strip("/")
+            status = 410 if name.startswith("gone") else 201
+            if status == 201:
+                received.append(decrypt(body, *keys[name]))
+
+            self.send_response(status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PushService)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class BenchmarkSender(WebPushSender):
+    # The stand-in push service listens on plain http on localhost.
+    allow_any_endpoint = True
+
+    def prune(self, subscription_ids):
+        self.pruned = sorted(subscription_ids)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 50) / 1000
+
+    keys = {}
+    subscriptions = []
+    for i in range(count):
+        name = f"gone-{i}" if i % 20 == 0 else f"sub-{i}"
+        ua_private = ec.generate_private_key(ec.SECP256R1())
+        auth_secret = os.urandom(16)
+        keys[name] = (ua_private, auth_secret)
+        subscriptions.append(
+            SimpleNamespace(
+                subscription_id=i,
+                endpoint=name,
+                p256dh=b64url_encode(_public_bytes(ua_private.public_key())),
+                auth=b64url_encode(auth_secret),
+            )
+        )
+
+    received = []
+    server = make_server(keys, latency, received)
+    base = f"http://127.0.0.1:{server.server_port}/"
+    for subscription in subscriptions:
+        subscription.endpoint = base + subscription.endpoint
+
+    signer = VapidSigner(ec.generate_private_key(ec.SECP256R1()), "mailto:bench@example.com")
+    sender = BenchmarkSender(None, signer)
+    payload = {"type": "emergency", "title": "Emergency", "body": "Cane S1 triggered SOS"}
+
+    started = time.perf_counter()
+    results = sender.send_many([(subscription, payload) for subscription in subscriptions])
+    elapsed = time.perf_counter() - started
+
+    assert all(message.startswith(b'{"type":"emergency"') for message in received)
+    print(f"subscriptions={count} latency_ms={latency * 1000:.0f} workers={WEB_PUSH_WORKERS}")
+    print(f"results={results} pruned={len(sender.pruned)}")
+    print(
+        f"elapsed={elapsed:.2f}s  {count / elapsed:.0f} msgs/s  "
+        f"(serial estimate {count * latency:.2f}s)"
+    )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -10,7 +10,10 @@ DROP TABLE IF EXISTS admin_audit_log_tbl;
 DROP TABLE IF EXISTS notification_reads_tbl;
 DROP TABLE IF EXISTS notifications_tbl;
 DROP TABLE IF EXISTS guardian_concerns_tbl;
+DROP TABLE IF EXISTS email_outbox_tbl;
 DROP TABLE IF EXISTS push_subscription_tbl;
+DROP TABLE IF EXISTS rollup_state_tbl;
+DROP TABLE IF EXISTS device_activity_rollup_tbl;
 DROP TABLE IF EXISTS device_logs_tbl;
 DROP TABLE IF EXISTS device_route_tbl;
 DROP TABLE IF EXISTS device_last_location_tbl;
@@ -129,8 +132,13 @@ CREATE TABLE otp_tbl (
     purpose VARCHAR(50) DEFAULT 'general'
 ) ENGINE=InnoDB;
 
-CREATE INDEX idx_otp_email
-    ON otp_tbl (email);
+-- otp_code holds an HMAC of the code. Verification is one lookup on
+-- (email, purpose, is_used); the reaper deletes by expires_at.
+CREATE INDEX idx_otp_email_purpose_used
+    ON otp_tbl (email, purpose, is_used);
+
+CREATE INDEX idx_otp_expires_at
+    ON otp_tbl (expires_at);
 
 -- =========================
 -- device_tbl (Device)
@@ -181,19 +189,32 @@ CREATE TABLE device_guardian_tbl (
 -- gps_location_tbl (GPSLocation)
 -- =========================
 CREATE TABLE gps_location_tbl (
-    location_id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
-    vip_id INT NOT NULL,
+    location_id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    device_id INT NOT NULL,
+    vip_id INT NULL,
     latitude DECIMAL(10,8) NOT NULL,
     longitude DECIMAL(11,8) NOT NULL,
-    location TEXT NOT NULL,
-    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    sats INT NULL,
+    hdop DECIMAL(6,2) NULL,
+    location TEXT NULL,
+    timestamp DATETIME NOT NULL,
+
+    CONSTRAINT fk_gps_device
+        FOREIGN KEY (device_id) REFERENCES device_tbl(device_id)
+        ON DELETE CASCADE
+        ON UPDATE CASCADE,
 
     CONSTRAINT fk_gps_vip
         FOREIGN KEY (vip_id) REFERENCES vip_tbl(vip_id)
-        ON DELETE CASCADE
+        ON DELETE SET NULL
         ON UPDATE CASCADE
 ) ENGINE=InnoDB;
 
+-- Track replay reads a device's fixes in time order; location_id makes the
+-- (timestamp, location_id) keyset cursor resolvable from the index alone.
+CREATE INDEX idx_gps_device_timestamp
+    ON gps_location_tbl (device_id, timestamp, location_id);
+
 -- =========================
 -- note_reminder_tbl (NoteReminder)
 -- =========================
@@ -218,27 +239,100 @@ CREATE TABLE note_reminder_tbl (
         ON UPDATE CASCADE
 ) ENGINE=InnoDB;
 
+-- The reminder scheduler loads every active reminder once at startup and
+-- then only rows whose updated_at moved since its last poll.
+CREATE INDEX idx_note_reminder_updated_at
+    ON note_reminder_tbl (updated_at);
+
 -- =========================
 -- emergency_alert_tbl (EmergencyAlert)
 -- =========================
+-- Replaces the earlier shape (vip_id NOT NULL, location_id, acknowledged).
+-- Existing databases migrate with the statements below. Old rows take their
+-- device and coordinates from the gps_location_tbl row they pointed at and
+-- keep acknowledged as status; rows whose location row is gone have no
+-- device and are removed. fk_alert_log is added after device_logs_tbl.
+--   ALTER TABLE emergency_alert_tbl
+--       DROP FOREIGN KEY fk_alert_location,
+--       DROP FOREIGN KEY fk_alert_vip;
+--   ALTER TABLE emergency_alert_tbl
+--       ADD COLUMN device_id INT NULL AFTER alert_id,
+--       MODIFY vip_id INT NULL,
+--       ADD COLUMN log_id INT NULL AFTER vip_id,
+--       ADD COLUMN alert_type VARCHAR(30) NOT NULL DEFAULT 'EMERGENCY' AFTER log_id,
+--       ADD COLUMN message TEXT NULL AFTER alert_type,
+--       ADD COLUMN lat DECIMAL(10,7) NULL AFTER message,
+--       ADD COLUMN lng DECIMAL(10,7) NULL AFTER lat,
+--       ADD COLUMN location_label VARCHAR(255) NULL AFTER lng,
+--       MODIFY triggered_at DATETIME NOT NULL,
+--       ADD COLUMN status ENUM('triggered', 'notified', 'acknowledged')
+--           NOT NULL DEFAULT 'triggered' AFTER triggered_at,
+--       ADD COLUMN trigger_count INT NOT NULL DEFAULT 1 AFTER status,
+--       ADD COLUMN last_triggered_at DATETIME NULL AFTER trigger_count,
+--       ADD COLUMN notified_at DATETIME NULL AFTER last_triggered_at,
+--       ADD COLUMN acknowledged_at DATETIME NULL AFTER notified_at,
+--       ADD COLUMN acknowledged_by_guardian_id INT NULL AFTER acknowledged_at,
+--       ADD COLUMN created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP;
+--   UPDATE emergency_alert_tbl a
+--       JOIN gps_location_tbl l ON l.location_id = a.location_id
+--       SET a.device_id = l.device_id, a.lat = l.latitude, a.lng = l.longitude;
+--   UPDATE emergency_alert_tbl SET status = 'acknowledged' WHERE acknowledged = 1;
+--   DELETE FROM emergency_alert_tbl WHERE device_id IS NULL;
+--   ALTER TABLE emergency_alert_tbl
+--       DROP COLUMN location_id,
+--       DROP COLUMN acknowledged,
+--       MODIFY device_id INT NOT NULL,
+--       ALTER COLUMN alert_type DROP DEFAULT,
+--       ADD CONSTRAINT fk_alert_acknowledged_by
+--           FOREIGN KEY (acknowledged_by_guardian_id) REFERENCES guardian_tbl(guardian_id)
+--           ON DELETE SET NULL ON UPDATE CASCADE,
+--       ADD CONSTRAINT fk_alert_device
+--           FOREIGN KEY (device_id) REFERENCES device_tbl(device_id)
+--           ON DELETE CASCADE ON UPDATE CASCADE,
+--       ADD CONSTRAINT fk_alert_vip
+--           FOREIGN KEY (vip_id) REFERENCES vip_tbl(vip_id)
+--           ON DELETE SET NULL ON UPDATE CASCADE;
+--   CREATE INDEX idx_alert_device_triggered
+--       ON emergency_alert_tbl (device_id, triggered_at, alert_id);
 CREATE TABLE emergency_alert_tbl (
     alert_id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
-    vip_id INT NOT NULL,
-    location_id INT NOT NULL,
-    triggered_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-    acknowledged TINYINT(1) DEFAULT 0,
+    device_id INT NOT NULL,
+    vip_id INT NULL,
+    log_id INT NULL,
+    alert_type VARCHAR(30) NOT NULL,
+    message TEXT NULL,
+    lat DECIMAL(10,7) NULL,
+    lng DECIMAL(10,7) NULL,
+    location_label VARCHAR(255) NULL,
+    triggered_at DATETIME NOT NULL,
+    status ENUM('triggered', 'notified', 'acknowledged') NOT NULL DEFAULT 'triggered',
+    trigger_count INT NOT NULL DEFAULT 1,
+    last_triggered_at DATETIME NULL,
+    notified_at DATETIME NULL,
+    acknowledged_at DATETIME NULL,
+    acknowledged_by_guardian_id INT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
 
-    CONSTRAINT fk_alert_vip
-        FOREIGN KEY (vip_id) REFERENCES vip_tbl(vip_id)
-        ON DELETE CASCADE
+    CONSTRAINT fk_alert_acknowledged_by
+        FOREIGN KEY (acknowledged_by_guardian_id) REFERENCES guardian_tbl(guardian_id)
+        ON DELETE SET NULL
         ON UPDATE CASCADE,
 
-    CONSTRAINT fk_alert_location
-        FOREIGN KEY (location_id) REFERENCES gps_location_tbl(location_id)
+    CONSTRAINT fk_alert_device
+        FOREIGN KEY (device_id) REFERENCES device_tbl(device_id)
         ON DELETE CASCADE
+        ON UPDATE CASCADE,
+
+    CONSTRAINT fk_alert_vip
+        FOREIGN KEY (vip_id) REFERENCES vip_tbl(vip_id)
+        ON DELETE SET NULL
         ON UPDATE CASCADE
 ) ENGINE=InnoDB;
 
+-- fk_alert_log is added after device_logs_tbl is created.
+CREATE INDEX idx_alert_device_triggered
+    ON emergency_alert_tbl (device_id, triggered_at, alert_id);
+
 -- =========================
 -- guardian_invitations (GuardianInvitation)
 -- =========================
@@ -357,11 +451,23 @@ CREATE TABLE account_history_tbl (
         ON UPDATE CASCADE
 ) ENGINE=InnoDB;
 
-CREATE INDEX idx_history_guardian_created
-    ON account_history_tbl (guardian_id, created_at);
-
+-- History pages are a UNION of newest-first keyset scans: one per device
+-- on idx_history_device_created and one for the guardian's device-less
+-- rows (device_id IS NULL) on idx_history_guardian_device_created.
+-- Existing databases migrate with the statements below. Each foreign key
+-- keeps an index on its column throughout; the device index is rebuilt in
+-- one ALTER for that reason.
+--   CREATE INDEX idx_history_guardian_device_created
+--       ON account_history_tbl (guardian_id, device_id, created_at, history_id);
+--   DROP INDEX idx_history_guardian_created ON account_history_tbl;
+--   ALTER TABLE account_history_tbl
+--       DROP INDEX idx_history_device_created,
+--       ADD INDEX idx_history_device_created (device_id, created_at, history_id);
 CREATE INDEX idx_history_device_created
-    ON account_history_tbl (device_id, created_at);
+    ON account_history_tbl (device_id, created_at, history_id);
+
+CREATE INDEX idx_history_guardian_device_created
+    ON account_history_tbl (guardian_id, device_id, created_at, history_id);
 
 -- =========================
 -- device_logs_tbl (DeviceLog)
@@ -387,14 +493,64 @@ CREATE TABLE device_logs_tbl (
         ON UPDATE CASCADE
 ) ENGINE=InnoDB;
 
-CREATE INDEX idx_device_logs_device_id
-    ON device_logs_tbl (device_id);
+-- Device log pages and exports are keyset scans over
+-- (created_at, log_id) within one device. The composite index also backs
+-- fk_device_logs_device. Existing databases migrate with:
+--   CREATE INDEX idx_device_logs_device_created
+--       ON device_logs_tbl (device_id, created_at, log_id);
+--   DROP INDEX idx_device_logs_device_id ON device_logs_tbl;
+-- idx_device_logs_created_at is replaced by idx_device_logs_created below.
+CREATE INDEX idx_device_logs_device_created
+    ON device_logs_tbl (device_id, created_at, log_id);
 
 CREATE INDEX idx_device_logs_guardian_id
     ON device_logs_tbl (guardian_id);
 
-CREATE INDEX idx_device_logs_created_at
-    ON device_logs_tbl (created_at);
+-- The activity rollup job reads logs across all devices past its
+-- (created_at, log_id) high-water mark. Existing databases replace the
+-- single-column index with:
+--   CREATE INDEX idx_device_logs_created
+--       ON device_logs_tbl (created_at, log_id);
+--   DROP INDEX idx_device_logs_created_at ON device_logs_tbl;
+CREATE INDEX idx_device_logs_created
+    ON device_logs_tbl (created_at, log_id);
+
+-- Existing databases run this statement too, after migrating
+-- emergency_alert_tbl above.
+ALTER TABLE emergency_alert_tbl
+    ADD CONSTRAINT fk_alert_log
+        FOREIGN KEY (log_id) REFERENCES device_logs_tbl(log_id)
+        ON DELETE SET NULL
+        ON UPDATE CASCADE;
+
+-- =========================
+-- device_activity_rollup_tbl (DeviceActivityRollup)
+-- =========================
+-- The primary key serves the per-device day-range reads of the stats
+-- endpoint.
+CREATE TABLE device_activity_rollup_tbl (
+    device_id INT NOT NULL,
+    day DATE NOT NULL,
+    activity_type VARCHAR(50) NOT NULL,
+    count INT NOT NULL DEFAULT 0,
+
+    PRIMARY KEY (device_id, day, activity_type),
+
+    CONSTRAINT fk_activity_rollup_device
+        FOREIGN KEY (device_id) REFERENCES device_tbl(device_id)
+        ON DELETE CASCADE
+        ON UPDATE CASCADE
+) ENGINE=InnoDB;
+
+-- =========================
+-- rollup_state_tbl (RollupState)
+-- =========================
+CREATE TABLE rollup_state_tbl (
+    name VARCHAR(50) NOT NULL PRIMARY KEY,
+    high_water_at DATETIME NULL,
+    high_water_log_id INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB;
 
 -- =========================
 -- push_subscription_tbl (PushSubscription)
@@ -418,6 +574,33 @@ CREATE TABLE push_subscription_tbl (
 CREATE INDEX idx_push_subscription_guardian
     ON push_subscription_tbl (guardian_id);
 
+-- =========================
+-- email_outbox_tbl (EmailOutbox)
+-- =========================
+CREATE TABLE email_outbox_tbl (
+    email_id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    recipient VARCHAR(255) NOT NULL,
+    subject VARCHAR(255) NOT NULL,
+    html_body MEDIUMTEXT NULL,
+    text_body MEDIUMTEXT NULL,
+    template VARCHAR(50) NOT NULL,
+    status ENUM('pending', 'sending', 'sent', 'failed') NOT NULL DEFAULT 'pending',
+    attempts INT NOT NULL DEFAULT 0,
+    last_error TEXT NULL,
+    next_attempt_at DATETIME NOT NULL,
+    locked_at DATETIME NULL,
+    sent_at DATETIME NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB;
+
+-- The dispatcher polls for due pending rows in next_attempt_at order, and
+-- the retention reaper for finished rows by status and last attempt.
+-- Bodies are cleared once a row is sent or failed; existing databases
+-- allow that with:
+--   ALTER TABLE email_outbox_tbl MODIFY html_body MEDIUMTEXT NULL;
+CREATE INDEX idx_email_outbox_status_next
+    ON email_outbox_tbl (status, next_attempt_at);
+
 -- =========================
 -- guardian_concerns_tbl (GuardianConcern)
 -- =========================
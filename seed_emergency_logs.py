@@ -23,6 +23,7 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from app import create_app, db
 from app.models import Device, DeviceLog
+from app.utils.activity_rollup import reset_device_activity_rollup
 
 # ─────────────────────────────────────────────────────────────────────────────
 #  Your existing paired device serials
@@ -193,6 +194,10 @@ def main():
 
         db.session.commit()
 
+        # The logs are backdated behind the rollup's high-water mark, so
+        # have the next rollup pass recount everything.
+        reset_device_activity_rollup()
+
         print(f"\n  ✔  {inserted} log(s) committed successfully.")
         print("\n══════════════════════════════════════════")
         print("  Done! Check your Emergency Logs page.")